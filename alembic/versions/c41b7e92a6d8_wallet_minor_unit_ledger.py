@@ -0,0 +1,58 @@
+"""wallet minor unit ledger
+
+Revision ID: c41b7e92a6d8
+Revises: 9f2d6b3e8c51
+Create Date: 2026-10-19 18:41:27.610943
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41b7e92a6d8'
+down_revision: Union[str, None] = '9f2d6b3e8c51'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('wallets', sa.Column('balance_minor', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('company_wallet', sa.Column('balance_minor', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('transactions', sa.Column('amount_minor', sa.BigInteger(), nullable=True))
+    op.add_column('transactions', sa.Column('balance_after_minor', sa.BigInteger(), nullable=True))
+
+    # Carry float balances and amounts over as whole kobo/cents
+    op.execute("UPDATE wallets SET balance_minor = ROUND(COALESCE(balance, 0) * 100)::bigint")
+    op.execute("UPDATE company_wallet SET balance_minor = ROUND(COALESCE(balance, 0) * 100)::bigint")
+    op.execute("UPDATE transactions SET amount_minor = ROUND(ABS(COALESCE(amount, 0)) * 100)::bigint")
+    op.alter_column('transactions', 'amount_minor', nullable=False)
+
+    op.drop_column('wallets', 'balance')
+    op.drop_column('company_wallet', 'balance')
+    op.drop_column('transactions', 'amount')
+
+    # NOT VALID: enforced for every write from now on without failing on historic overdrafts
+    op.execute(
+        "ALTER TABLE wallets ADD CONSTRAINT ck_wallets_balance_minor_non_negative "
+        "CHECK (balance_minor >= 0) NOT VALID"
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('ck_wallets_balance_minor_non_negative', 'wallets', type_='check')
+
+    op.add_column('transactions', sa.Column('amount', sa.Float(), nullable=True))
+    op.add_column('company_wallet', sa.Column('balance', sa.Float(), nullable=True))
+    op.add_column('wallets', sa.Column('balance', sa.Float(), nullable=True))
+
+    op.execute("UPDATE transactions SET amount = amount_minor / 100.0")
+    op.execute("UPDATE company_wallet SET balance = balance_minor / 100.0")
+    op.execute("UPDATE wallets SET balance = balance_minor / 100.0")
+
+    op.drop_column('transactions', 'balance_after_minor')
+    op.drop_column('transactions', 'amount_minor')
+    op.drop_column('company_wallet', 'balance_minor')
+    op.drop_column('wallets', 'balance_minor')
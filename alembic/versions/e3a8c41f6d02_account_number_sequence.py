@@ -0,0 +1,31 @@
+"""account number sequence
+
+Revision ID: e3a8c41f6d02
+Revises: 5c1e0d7a9b24
+Create Date: 2026-10-19 17:20:41.902315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a8c41f6d02'
+down_revision: Union[str, None] = '5c1e0d7a9b24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence(
+        'account_number_seq',
+        start=100000000,
+        increment=100,
+        maxvalue=999999900,
+    )))
+
+
+def downgrade() -> None:
+    op.execute(sa.schema.DropSequence(sa.Sequence('account_number_seq')))
@@ -43,6 +43,12 @@ class WalletTransactionEnum(str, Enum):
     REFERRAL_BONUS = 'REFERRALBONUS'
 
 
+class SettlementJobStatusEnum(str, Enum):
+    PENDING = "PENDING"
+    DONE = "DONE"
+    DEAD = "DEAD"
+
+
 class OTPTypeEnum(str, Enum):
     EMAIL = "email"
     SMS = "sms"
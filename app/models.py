@@ -1,8 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Enum as SQLAEnum, TIMESTAMP, Date, LargeBinary, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Enum as SQLAEnum, TIMESTAMP, Date, LargeBinary, DateTime, Sequence, Index, BigInteger, CheckConstraint, UniqueConstraint
 from sqlalchemy.orm import relationship
 from .database import Base
 from sqlalchemy.sql.expression import text
-from .enums import UserType, UserStatusEnum, PaymentMethodEnum, RideStatusEnum, RideTypeEnum, WalletTransactionEnum, OTPTypeEnum, GenderEnum
+from .enums import UserType, UserStatusEnum, PaymentMethodEnum, RideStatusEnum, RideTypeEnum, WalletTransactionEnum, OTPTypeEnum, GenderEnum, SettlementJobStatusEnum
 from datetime import datetime, timedelta
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func  # Import func to use for timestamp
@@ -64,6 +64,27 @@ class Referral(Base):
     referred_rider = relationship("Rider", foreign_keys=[referred_rider_id], back_populates="referred_by")
 
 
+# Referral Code Pool
+# Codes are generated ahead of time; an unassigned row (no rider_id or driver_id) is
+# free to hand out, and resolving a code is one primary-key lookup for either owner.
+class ReferralCode(Base):
+    __tablename__ = "referral_codes"
+
+    code = Column(String(10), primary_key=True)
+    rider_id = Column(Integer, ForeignKey("riders.id"), unique=True, nullable=True)
+    driver_id = Column(Integer, ForeignKey("drivers.id"), unique=True, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    assigned_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_referral_codes_unassigned",
+            "code",
+            postgresql_where=text("rider_id IS NULL AND driver_id IS NULL"),
+        ),
+    )
+
+
 class Rider(Base):
     __tablename__ = "riders"
 
@@ -109,6 +130,11 @@ class Driver(Base):
     ssn_number = Column(String, nullable=True, unique=True) 
     ssn_photo = Column(String, nullable=True) 
     rating = Column(Float, default=100, nullable=True,)
+    # Running rating aggregates, kept up to date by utils/driver_ratings.py
+    rating_count = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_sum = Column(Float, default=0, server_default="0", nullable=False)
+    rating_recent = Column(Float, nullable=True)  # Exponentially decayed average, in stars
+    rating_tier = Column(Integer, default=1, server_default="1", nullable=False, index=True)
     vehicle_inspection_approval = Column(String, nullable=True)
      # Coordinates for driver location
     latitude = Column(Float, default=0.00, nullable=True)  
@@ -166,6 +192,12 @@ class Ride(Base):
     dropoff_latitude = Column(Float, nullable=True)  
     dropoff_longitude = Column(Float, nullable=True)  
 
+    # Trip timing, which the ETA estimator learns speeds from
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True, index=True)
+    # How the rider pays, fixed when the ride is confirmed; settlement depends on it
+    payment_method = Column(SQLAEnum(PaymentMethodEnum), nullable=True)
+
     rider = relationship("Rider", back_populates="rides")
     driver = relationship("Driver", back_populates="rides")
     rating = relationship("Rating", uselist=False, back_populates="ride")
@@ -174,15 +206,57 @@ class Ride(Base):
 
 
 
-# OTP Verification Model
+# Ride Settlement
+# One row per settled ride; the primary key makes settling a ride idempotent
+class RideSettlement(Base):
+    __tablename__ = "ride_settlements"
+
+    ride_id = Column(Integer, ForeignKey("rides.id"), primary_key=True)
+    fare_minor = Column(BigInteger, nullable=False)
+    commission_minor = Column(BigInteger, nullable=False)
+    driver_earnings_minor = Column(BigInteger, nullable=False)
+    referral_bonus_minor = Column(BigInteger, nullable=False, default=0)
+    # Commission on a cash ride that the driver's wallet could not cover
+    commission_uncollected_minor = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # Fare on a wallet ride that the rider's wallet could not cover
+    fare_uncollected_minor = Column(BigInteger, nullable=False, default=0, server_default="0")
+    settled_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+# Settlement Job
+# Written with the ride's completion; utils/settlement_queue.py settles them in batches
+class SettlementJob(Base):
+    __tablename__ = "settlement_jobs"
+
+    ride_id = Column(Integer, ForeignKey("rides.id"), primary_key=True)
+    driver_id = Column(Integer, ForeignKey("drivers.id"), nullable=False)
+    status = Column(SQLAEnum(SettlementJobStatusEnum), default=SettlementJobStatusEnum.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    # When a worker may next pick the job up; claiming pushes it out by the lease
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_settlement_jobs_pending_next_attempt_at",
+            "next_attempt_at",
+            postgresql_where=text("status = 'PENDING'"),
+        ),
+    )
+
+
+
+# OTP Verification Model (audit log only; pending OTPs live in utils/otp_store.py)
 class OTPVerification(Base):
     __tablename__ = "otp_verifications"
 
     id = Column(Integer, primary_key=True, index=True)
     full_name = Column(String, nullable=False)
     user_name = Column(String, nullable=False)
-    phone_number = Column(String, unique=True, nullable=False)
-    email = Column(String, unique=True, nullable=False)
+    phone_number = Column(String, index=True, nullable=False)
+    email = Column(String, nullable=False)
     otp_code = Column(String, nullable=False)
     expires_at = Column(DateTime, nullable=False)
     is_verified = Column(Boolean, default=False)
@@ -243,6 +317,10 @@ class Rating(Base):
     rating = Column(Float, nullable=False)
     comment = Column(String, nullable=True)
 
+    __table_args__ = (
+        UniqueConstraint("ride_id", name="uq_ratings_ride_id"),
+    )
+
     ride = relationship("Ride", back_populates="rating")
     driver = relationship("Driver", back_populates="ratings")
     rider = relationship("Rider", back_populates="ratings")
@@ -261,19 +339,38 @@ class PaymentMethod(Base):
 
     rider = relationship("Rider", back_populates="payment_methods")
 
+# Wallet and company wallet account numbers are allocated from this sequence;
+# each nextval reserves a block of ACCOUNT_NUMBER_BLOCK_SIZE numbers
+ACCOUNT_NUMBER_BLOCK_SIZE = 100
+account_number_seq = Sequence(
+    "account_number_seq",
+    start=100000000,
+    increment=ACCOUNT_NUMBER_BLOCK_SIZE,
+    maxvalue=999999900,
+    metadata=Base.metadata,
+)
+
 # Wallet Model
 class Wallet(Base):
     __tablename__ = "wallets"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), unique=True)
-    balance = Column(Float, default=0.0)
+    balance_minor = Column(BigInteger, nullable=False, default=0, server_default="0")  # Balance in kobo/cents
     account_number = Column(String, unique=True, nullable=False)  # Add this field
 
     
     user = relationship("User", back_populates="wallet")
     transactions = relationship("Transaction", back_populates="wallet")
 
+    __table_args__ = (
+        CheckConstraint("balance_minor >= 0", name="ck_wallets_balance_minor_non_negative"),
+    )
+
+    @property
+    def balance(self) -> float:
+        return (self.balance_minor or 0) / 100
+
 
 # Transaction Model
 class Transaction(Base):
@@ -281,7 +378,8 @@ class Transaction(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     wallet_id = Column(Integer, ForeignKey('wallets.id'))
-    amount = Column(Float)
+    amount_minor = Column(BigInteger, nullable=False)  # Always positive; transaction_type gives the direction
+    balance_after_minor = Column(BigInteger, nullable=True)  # Wallet balance right after this transaction
     transaction_type = Column(SQLAEnum(WalletTransactionEnum, name='wallet_transaction_enum'))
     created_at = Column(DateTime, default=datetime.utcnow)
     
@@ -289,6 +387,34 @@ class Transaction(Base):
     company_wallet = relationship("CompanyWallet", back_populates="transactions")
     company_wallet_id = Column(Integer, ForeignKey("company_wallet.id"), nullable=True)
 
+    __table_args__ = (
+        # Serves keyset-paginated history and date-range statements per wallet
+        Index("ix_transactions_wallet_id_created_at_id", "wallet_id", "created_at", "id"),
+    )
+
+    @property
+    def amount(self) -> float:
+        return self.amount_minor / 100
+
+
+# Wallet Balance Checkpoint
+# The wallet balance after every transaction up to last_transaction_id, whose
+# created_at is as_of. A statement starts from the latest checkpoint before its
+# start date and only sums the transactions after it.
+class WalletBalanceCheckpoint(Base):
+    __tablename__ = "wallet_balance_checkpoints"
+
+    id = Column(Integer, primary_key=True, index=True)
+    wallet_id = Column(Integer, ForeignKey("wallets.id"), nullable=False)
+    as_of = Column(DateTime, nullable=False)
+    last_transaction_id = Column(Integer, nullable=False)
+    balance_minor = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_wallet_balance_checkpoints_wallet_id_as_of", "wallet_id", "as_of"),
+    )
+
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
@@ -310,13 +436,17 @@ class CompanyWallet(Base):
     __tablename__ = 'company_wallet'
     
     id = Column(Integer, primary_key=True, index=True)
-    balance = Column(Float, default=0.0)
+    balance_minor = Column(BigInteger, nullable=False, default=0, server_default="0")  # Balance in kobo/cents
     account_number = Column(String, unique=True, nullable=False)  # New column for account numberdriver
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, onupdate=datetime.utcnow)
 
     # Relationship with transactions
-    transactions = relationship("Transaction", back_populates="company_wallet")    
+    transactions = relationship("Transaction", back_populates="company_wallet")
+
+    @property
+    def balance(self) -> float:
+        return (self.balance_minor or 0) / 100    
 
 
 
@@ -348,6 +478,11 @@ class TemporaryUserPhoto(Base):
     driver = relationship("Driver", back_populates="temporary_photos")
     rider = relationship("Rider", back_populates="temporary_photos")
 
+    # The expiry sweep pages through expired photos in (expires_at, id) order
+    __table_args__ = (
+        Index("ix_temporary_user_photos_expires_at_id", "expires_at", "id"),
+    )
+
 
 
 class PanicButton(Base):
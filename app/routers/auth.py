@@ -8,8 +8,7 @@ from ..schemas import pwd_context
 from dotenv import load_dotenv
 from datetime import datetime
 import os
-import requests
-from ..utils.sendchampservices import Sendchamp
+from ..utils.otp_delivery import deliver_otp_email, deliver_otp_sms
 from sqlalchemy.future import select
 from ..utils.otp import generate_otp, OTPVerification, generate_otp_expiration
 from ..utils.schemas_utils import OtpSMSRequest
@@ -20,9 +19,6 @@ from ..utils.security import (
     decode_refresh_token
 )
 from sqlalchemy.orm import joinedload
-from ..utils.sendchamp_http_client import CUSTOM_HTTP_CLIENT
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
 from typing import Optional
 from app.database import get_async_db   # Replace 'app.database' with the correct path
 from fastapi.encoders import jsonable_encoder
@@ -38,14 +34,6 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 
-# Configure SendGrid API key
-SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
-SENDGRID_EMAIL_SENDER = "Delevia <no-reply@delevia.com>"  # Use your verified SendGrid sender email
-
-# Configue Sendchamp
-SENDCHAMP_API_URL = os.getenv("SENDCHAMP_API_URL")
-SENDCHAMP_PUBLIC_KEY = os.getenv("SENDCHAMP_PUBLIC_KEY")
-
 router = APIRouter()
 
 # Reusable function to verify password
@@ -248,38 +236,8 @@ async def logout(request: LogoutRequest, db: AsyncSession = Depends(get_async_db
 # SendGrid Email OTp
 @router.post("/send-otp-email")
 async def send_otp_email(to_email: str, otp_code: str):
-    if not SENDGRID_API_KEY:
-        raise HTTPException(status_code=500, detail="SendGrid API key not configured")
-
-    # Create the OTP email content
-    subject = "Your OTP Code for Verification"
-    html_content = f"""
-    <html>
-        <body>
-            <h3>Your OTP Code</h3>
-            <p>Your Delevia OTP code is <strong>{otp_code}</strong>. It expires in 5 minutes.</p>
-        </body>
-    </html>
-    """
-
-    # Create the email message
-    message = Mail(
-        from_email=SENDGRID_EMAIL_SENDER,
-        to_emails=to_email,
-        subject=subject,
-        html_content=html_content
-    )
-
-    try:
-        sg = SendGridAPIClient(SENDGRID_API_KEY)
-        response = sg.send(message)
-
-        if response.status_code not in (200, 202):
-            raise HTTPException(status_code=400, detail="Failed to send OTP email")
-
-    except Exception as e:
-        print("SendGrid Error:", str(e))
-        raise HTTPException(status_code=500, detail="An error occurred while sending the OTP email")
+    # Queue the email; the outbox delivers it in the background and retries failures
+    await deliver_otp_email(to_email, otp_code)
 
     return {"message": "OTP sent successfully via email"}
 
@@ -288,25 +246,8 @@ async def send_otp_email(to_email: str, otp_code: str):
 # SEndchamp OTP Sms
 @router.post("/send-otp/v1/messaging/send_sms")
 async def send_otp_sms(phone_number: str, otp_code: str):
-    sms_data = {
-        "to": [phone_number],
-        "message": f"Your Delevia OTP code is {otp_code}. It expires in 5 minutes.",
-        "sender_name": "Sendchamp",
-        "route": "dnd"
-    }
-
-    headers = {
-        "Authorization": f"Bearer {SENDCHAMP_PUBLIC_KEY}",
-        "Accept": "application/json",
-        "Content-Type": "application/json"
-    }
-
-    response = requests.post(SENDCHAMP_API_URL, json=sms_data, headers=headers)
-
-    if response.status_code != 200:
-        error_details = response.text
-        print("Error details:", error_details)
-        raise HTTPException(status_code=400, detail="Failed to send OTP SMS")
+    # Sent over the shared, pooled Sendchamp connection instead of a blocking request
+    await deliver_otp_sms(phone_number, otp_code)
 
     return {"message": "OTP sent successfully via SMS"}
 
@@ -7,6 +7,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from ..utils.coordinate_schema import CoordinatesUpdateRequest
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.future import select
+from ..utils.surge import surge_tracker
+from ..utils.query_budget import query_budget
 
 
 
@@ -15,6 +17,7 @@ router = APIRouter()
 
 
 @router.put("/coordinates/")
+@query_budget(2)
 async def update_driver_coordinates(
     payload: CoordinatesUpdateRequest,
     db: AsyncSession = Depends(get_async_db),
@@ -34,10 +37,13 @@ async def update_driver_coordinates(
                 status_code=400, detail="No driver coordinates provided in the request"
             )
 
+        # Fetch every driver in the batch in one query
+        driver_ids = {driver_coord.driver_id for driver_coord in payload.driver_coordinates}
+        result = await db.execute(select(Driver).filter(Driver.id.in_(driver_ids)))
+        drivers = {driver.id: driver for driver in result.scalars()}
+
         for driver_coord in payload.driver_coordinates:
-            # Fetch the driver asynchronously
-            result = await db.execute(select(Driver).filter(Driver.id == driver_coord.driver_id))
-            driver = result.scalars().first()
+            driver = drivers.get(driver_coord.driver_id)
 
             if not driver:
                 raise HTTPException(
@@ -51,6 +57,10 @@ async def update_driver_coordinates(
 
         # Commit changes to the database
         await db.commit()
+
+        # Count the drivers as available supply where they now are
+        for driver_coord in payload.driver_coordinates:
+            surge_tracker.record_driver_location(driver_coord.driver_id, driver_coord.latitude, driver_coord.longitude)
         return {"message": "Driver coordinates updated successfully"}
 
     except SQLAlchemyError as e:
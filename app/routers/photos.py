@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Request, Response, status
+import anyio
+import os
+from ..utils.photo_serving import (
+    PHOTO_CACHE_CONTROL,
+    PhotoFileResponse,
+    etag_matches,
+    get_photo_etag,
+    parse_range_header,
+    resolve_photo_path,
+)
+
+
+router = APIRouter()
+
+
+@router.api_route("/{photo_path:path}", methods=["GET", "HEAD"])
+async def get_photo(photo_path: str, request: Request):
+    """
+    Serve a stored profile, driver or temporary photo. Identity and vehicle
+    documents are not served.
+
+    Responses carry a strong content-hash ETag and immutable cache headers, so a
+    client that already holds the photo gets a bodyless 304, and partial downloads
+    can resume with a Range request.
+
+    Args:
+        photo_path (str): Path as stored on the rider/driver record, e.g.
+            'assets/riders/profile_photos/<file>.jpg' or 'profile_photos/<file>.jpg'.
+
+    Returns:
+        Response: 200/206 with the photo bytes, or 304 if the client copy is current.
+    """
+    path = resolve_photo_path(photo_path)
+    stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    etag = await get_photo_etag(path, stat_result)
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": PHOTO_CACHE_CONTROL,
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # Only honour the range if the client's copy is the version we are about to send
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == etag:
+        byte_range = parse_range_header(request.headers.get("range"), stat_result.st_size)
+
+    return PhotoFileResponse(path, stat_result, headers=headers, byte_range=byte_range)
@@ -1,21 +1,25 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from sqlalchemy.orm import Session
 from ..database import get_async_db
-from ..models import  Ride, Rating, Driver, Rider, PaymentMethod, Wallet, Referral, Transaction
-from ..utils.rides_utility_functions import find_drivers_nearby, categorize_drivers_by_rating, update_driver_rating, tokenize_card
+from ..models import  Ride, Rating, Driver, Rider, PaymentMethod
+from ..utils.rides_utility_functions import find_drivers_nearby, categorize_drivers_by_rating, tokenize_card, estimate_nearest_pickup_eta
 from ..enums import RideStatusEnum, PaymentMethodEnum
 from ..utils.rides_schemas import RatingRequest, PaymentMethodRequest, RideRequest, ModifyRidePriceRequest, ModifyRideResponse, Location
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..utils.rides_utility_functions import calculate_estimated_price
+from ..utils.pricing import pricing_engine
+from ..utils.surge import surge_tracker
+from ..utils.quote_store import quote_store
 from .. utils.panic_button import send_panic_notification_email
 from sqlalchemy.future import select
 import traceback
 from sqlalchemy import update
 import logging  # Added logging for debugging
 from datetime import datetime
-from ..enums import WalletTransactionEnum
+from ..utils.settlement_queue import settlement_queue
+from ..utils.query_budget import query_budget
+from ..utils.driver_ratings import record_rating
+from ..utils.driver_profile_cache import driver_profile_cache
 from ..models import User
-from geopy.distance import geodesic
 import math
 
 
@@ -56,28 +60,28 @@ async def request_ride(
     if not rider:
         raise HTTPException(status_code=404, detail="Rider not found")
 
-    # Calculate the estimated prices for both STANDARD and VIP rides
+    # Quote STANDARD and VIP together from distance, trip time and pickup zone
+    pickup = (request.pickup_location.latitude, request.pickup_location.longitude)
+    dropoff = (request.dropoff_location.latitude, request.dropoff_location.longitude)
     try:
-        standard_price = calculate_estimated_price(
-            request.pickup_location, request.dropoff_location, ride_type="STANDARD"
-        )
-        logging.info(f"Calculated STANDARD price: {standard_price}")  # Logging for debug
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error calculating STANDARD price: {e}")
-
-    try:
-        vip_price = calculate_estimated_price(
-            request.pickup_location, request.dropoff_location, ride_type="VIP"
-        )
-        logging.info(f"Calculated VIP price: {vip_price}")  # Logging for debug
+        quote = pricing_engine.quote(pickup, dropoff)
+        logging.info(f"Calculated prices: {quote.prices}")  # Logging for debug
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error calculating VIP price: {e}")
+        raise HTTPException(status_code=500, detail=f"Error calculating prices: {e}")
+    standard_price = quote.prices["STANDARD"]
+    vip_price = quote.prices["VIP"]
+    pickup_eta_minutes = await estimate_nearest_pickup_eta(db, pickup)
 
     # Store the ride as 'INITIATED' in the database
     new_ride = Ride(
         rider_id=rider_id,
-        pickup_location=request.pickup_location,
-        dropoff_location=request.dropoff_location,
+        pickup_location=request.pickup_location.address,
+        dropoff_location=request.dropoff_location.address,
+        # Kept so the price can be worked out again once a ride type is selected
+        pickup_latitude=pickup[0],
+        pickup_longitude=pickup[1],
+        dropoff_latitude=dropoff[0],
+        dropoff_longitude=dropoff[1],
         status=RideStatusEnum.INITIATED,  # Set status to INITIATED
         estimated_price=None,  # No price yet because the rider has not selected the ride type
         booking_for=request.booking_for,
@@ -92,6 +96,9 @@ async def request_ride(
             await db.commit()  # Commit the transaction
 
         await db.refresh(new_ride)  # Refresh to get the updated ride data
+        surge_tracker.record_ride_requested(new_ride.id, *pickup)
+        # Lock the quoted fares so selection and confirmation charge what the rider was shown
+        quote_store.lock(new_ride.id, rider_id, pickup, dropoff, quote)
 
         # Log final ride details
         logging.info(f"Ride after commit: {new_ride}")
@@ -103,7 +110,9 @@ async def request_ride(
             "estimated_prices": {
                 "STANDARD": standard_price,  # Corrected typo
                 "VIP": vip_price  # Corrected key name to uppercase
-            }
+            },
+            # Minutes for the nearest available driver to arrive; None if no driver is nearby
+            "pickup_eta_minutes": round(pickup_eta_minutes, 1) if pickup_eta_minutes is not None else None,
         }
     except Exception as e:
         await db.rollback()  # Ensure the transaction is rolled back on error
@@ -123,30 +132,41 @@ async def select_ride_type(
     if ride_type not in ["VIP", "STANDARD"]:
         raise HTTPException(status_code=400, detail="Invalid ride type. Must be 'VIP' or 'STANDARD'.")
 
-    # Calculate estimated price based on the selected ride type
-    estimated_price = 300 if ride_type == "VIP" else 200  # Static prices
-
-    # Fetch the rider to ensure it exists
-    result = await db.execute(select(Rider).filter(Rider.id == rider_id))
-    rider = result.scalars().first()
-    if not rider:
-        raise HTTPException(status_code=404, detail="Rider not found.")
-
-    # Fetch the ride by ride_id
-    result = await db.execute(select(Ride).filter(Ride.id == ride_id))
-    ride = result.scalars().first()
-
-    # Check if the ride exists
-    if not ride:
+    # Use the fare locked at request time; only an expired quote means reading the ride and pricing again
+    locked = quote_store.get(ride_id)
+    if locked is not None:
+        if locked.rider_id != rider_id:
+            raise HTTPException(status_code=403, detail="Unauthorized: You cannot select a ride type for this ride.")
+        estimated_price = locked.quote.prices[ride_type]
+    else:
+        result = await db.execute(select(Ride).filter(Ride.id == ride_id))
+        ride = result.scalars().first()
+        if not ride:
+            raise HTTPException(status_code=404, detail="Ride not found")
+        if ride.rider_id != rider_id:
+            raise HTTPException(status_code=403, detail="Unauthorized: You cannot select a ride type for this ride.")
+
+        # Price the selected ride type from the coordinates stored with the request
+        if None in (ride.pickup_latitude, ride.pickup_longitude, ride.dropoff_latitude, ride.dropoff_longitude):
+            estimated_price = pricing_engine.minimum_fare(ride_type)
+        else:
+            pickup = (ride.pickup_latitude, ride.pickup_longitude)
+            dropoff = (ride.dropoff_latitude, ride.dropoff_longitude)
+            quote = pricing_engine.quote(pickup, dropoff)
+            quote_store.lock(ride_id, rider_id, pickup, dropoff, quote)
+            estimated_price = quote.prices[ride_type]
+
+    # Update the ride with the selected ride type and estimated price in one statement
+    updated = (await db.execute(
+        update(Ride)
+        .where(Ride.id == ride_id, Ride.rider_id == rider_id)
+        .values(ride_type=ride_type, estimated_price=estimated_price)
+        .returning(Ride.id)
+        .execution_options(synchronize_session=False)
+    )).first()
+    if updated is None:
         raise HTTPException(status_code=404, detail="Ride not found")
-
-    # Update the ride with the selected ride type and estimated price
-    ride.ride_type = ride_type
-    ride.estimated_price = estimated_price
-
-    # Commit the changes to the database
     await db.commit()
-    await db.refresh(ride)
 
     # Assign a default driver (driver_id = 1) if needed
 
@@ -190,6 +210,7 @@ async def accept_ride(
         db.add(ride)
         await db.commit()  # Commit the transaction to save changes
         await db.refresh(ride)  # Refresh the ride instance after committing
+        surge_tracker.record_ride_closed(ride.id)
 
         return {
             "message": "Ride accepted successfully",
@@ -265,8 +286,20 @@ async def confirm_ride(
             detail="No payment method selected. Please add a payment method before confirming the ride."
         )
 
+    # Keep the locked fare if the trip is the one quoted; otherwise price it again
+    pickup = (pickup_latitude, pickup_longitude)
+    dropoff = (dropoff_latitude, dropoff_longitude)
+    if ride.estimated_price is not None:  # A ride type has been selected
+        ride_type = ride.ride_type.name
+        locked = quote_store.get(ride_id)
+        if locked is not None and locked.matches(pickup, dropoff):
+            ride.estimated_price = locked.quote.prices[ride_type]
+        else:
+            ride.estimated_price = pricing_engine.quote(pickup, dropoff).prices[ride_type]
+
     # Update the ride details with the provided coordinates
     ride.status = RideStatusEnum.PENDING
+    ride.payment_method = payment_method.payment_type
     ride.pickup_latitude = pickup_latitude
     ride.pickup_longitude = pickup_longitude
     ride.dropoff_latitude = dropoff_latitude
@@ -276,12 +309,16 @@ async def confirm_ride(
         db.add(ride)
         await db.commit()
         await db.refresh(ride)
+        surge_tracker.record_ride_requested(ride.id, pickup_latitude, pickup_longitude)
+        # The fare now lives on the ride
+        quote_store.discard(ride.id)
 
         # Include pickup and dropoff coordinates in the response
         return {
             "message": "Ride confirmed, waiting to be matched with a driver.",
             "ride_id": ride.id,
             "status": ride.status,
+            "estimated_price": ride.estimated_price,
             "payment_method": payment_method.payment_type,
             "pickup_location": {
                 "latitude": ride.pickup_latitude,
@@ -323,6 +360,7 @@ async def start_ride(
 
         # Update the ride status to ONGOING
         ride.status = RideStatusEnum.ONGOING
+        ride.started_at = datetime.utcnow()
 
         # Save the updated ride status
         db.add(ride)
@@ -351,93 +389,20 @@ from datetime import datetime
 
 # Complete Ride Endpoint
 @router.post("/ride/complete/{ride_id}", status_code=status.HTTP_200_OK)
+@query_budget(4)
 async def complete_ride(
     ride_id: int,
     driver_id: int,
     db: AsyncSession = Depends(get_async_db)
 ):
+    """
+    Complete a ride. Driver earnings, commission and referral bonuses are settled
+    in the background by the settlement queue; completing the same ride again
+    returns its existing settlement job.
+    """
     try:
-        # Retrieve the ride from the database
+        job = await settlement_queue.enqueue(db, ride_id, driver_id)
         ride = await db.get(Ride, ride_id)
-        if not ride:
-            raise HTTPException(status_code=404, detail="Ride not found")
-
-        # Ensure the ride is in the ONGOING status before completing
-        if ride.status != RideStatusEnum.ONGOING:
-            raise HTTPException(status_code=400, detail="Ride is not currently ongoing and cannot be completed")
-
-        # Ensure the driver completing the ride is the one assigned to the ride
-        if ride.driver_id != driver_id:
-            raise HTTPException(status_code=403, detail="You are not authorized to complete this ride")
-
-        # Update the ride status to COMPLETED and set the fare to the estimated price
-        ride.status = RideStatusEnum.COMPLETED
-        ride.fare = ride.estimated_price  # Set fare to the estimated price
-
-        # Save the updated ride status
-        db.add(ride)
-        await db.commit()  # Commit the transaction to save changes
-        await db.refresh(ride)  # Refresh the ride instance after committing
-
-        # Check if the rider was referred by another rider
-        referral_query = select(Referral).filter(Referral.referred_rider_id == ride.rider_id)
-        referral = (await db.execute(referral_query)).scalars().first()
-
-        if referral:
-            # Calculate 3% of the fare for the rider's referrer
-            referral_bonus = ride.fare * 0.03
-
-            # Fetch the referrer's wallet
-            wallet_query = select(Wallet).filter(Wallet.user_id == referral.referrer_driver_id)
-            referrer_wallet = (await db.execute(wallet_query)).scalars().first()
-
-            if referrer_wallet:
-                # Add the bonus to the referrer's wallet balance
-                referrer_wallet.balance += referral_bonus
-                db.add(referrer_wallet)  # Update the referrer's wallet
-
-                # Create a transaction history for the referral bonus
-                transaction = Transaction(
-                    wallet_id=referrer_wallet.id,
-                    amount=referral_bonus,
-                    transaction_type=WalletTransactionEnum.REFERRAL_BONUS,
-                    created_at=datetime.utcnow()
-                )
-                
-                db.add(transaction)  # Add the transaction to the session
-
-                # Commit the changes
-                await db.commit()
-
-        # Check if the ride was booked through a driver's referral code
-        driver_referral_query = select(Referral).filter(Referral.referrer_driver_id == driver_id, Referral.referred_rider_id == ride.rider_id)
-        driver_referral = (await db.execute(driver_referral_query)).scalars().first()
-
-        if driver_referral:
-            # Calculate a similar bonus for the driver
-            driver_referral_bonus = ride.fare * 0.03  # Example: 2% bonus for the driver
-
-            # Fetch the driver's wallet
-            driver_wallet_query = select(Wallet).filter(Wallet.user_id == driver_id)
-            driver_wallet = (await db.execute(driver_wallet_query)).scalars().first()
-
-            if driver_wallet:
-                # Add the bonus to the driver's wallet balance
-                driver_wallet.balance += driver_referral_bonus
-                db.add(driver_wallet)  # Update the driver's wallet
-
-                # Create a transaction history for the driver's referral bonus
-                driver_transaction = Transaction(
-                    wallet_id=driver_wallet.id,
-                    amount=driver_referral_bonus,
-                    transaction_type=WalletTransactionEnum.REFERRAL_BONUS,
-                    created_at=datetime.utcnow()
-                )
-
-                db.add(driver_transaction)  # Add the transaction to the session
-
-                # Commit the changes for the driver's bonus
-                await db.commit()
 
         return {
             "message": "Ride completed successfully",
@@ -448,10 +413,14 @@ async def complete_ride(
                 "status": ride.status,
                 "pickup_location": ride.pickup_location,
                 "dropoff_location": ride.dropoff_location,
-                "fare": ride.fare  
-            }
+                "fare": ride.fare
+            },
+            "settlement_status": job.status
         }
 
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         # Rollback in case of an error
         await db.rollback()
@@ -486,6 +455,8 @@ async def cancel_ride(
         db.add(ride)
         await db.commit()  # Commit the transaction to save changes
         await db.refresh(ride)  # Refresh the ride instance after committing
+        surge_tracker.record_ride_closed(ride.id)
+        quote_store.discard(ride.id)
 
         return {
             "message": "Ride canceled successfully",
@@ -507,46 +478,59 @@ async def cancel_ride(
 
 # Endpoint to submit a rating for a driver
 @router.post("/ride/{ride_id}/rate_driver", status_code=status.HTTP_201_CREATED)
-async def rate_driver(ride_id: int, rating_data: RatingRequest, db: Session = Depends(get_async_db
-)):
+async def rate_driver(ride_id: int, rating_data: RatingRequest, db: AsyncSession = Depends(get_async_db)):
     # Check if the ride exists
-    ride = db.query(Ride).filter(Ride.id == ride_id).first()
+    ride = await db.get(Ride, ride_id)
     if not ride:
         raise HTTPException(status_code=404, detail="Ride not found")
-    
-    # Check if the driver exists
-    driver = db.query(Driver).filter(Driver.id == rating_data.driver_id).first()
-    if not driver:
-        raise HTTPException(status_code=404, detail="Driver not found")
-    
-    # Create the new rating
-    new_rating = Rating(
+
+    # Only the driver who drove the ride can be rated for it
+    if ride.driver_id != rating_data.driver_id:
+        raise HTTPException(status_code=400, detail="Driver did not drive this ride")
+
+    # Store the rating and update the driver's running aggregates
+    summary = await record_rating(
+        db,
         ride_id=ride_id,
+        rider_id=ride.rider_id,
         driver_id=rating_data.driver_id,
-        rating=rating_data.rating,
+        stars=rating_data.rating,
         comment=rating_data.comment
     )
-    db.add(new_rating)
-    
-    # Update the driver's overall rating
-    update_driver_rating(driver, rating_data.rating, db)
-    
-    db.commit()
-    
-    return {"message": "Driver rated successfully"}
+    await db.commit()
+    driver_profile_cache.invalidate(rating_data.driver_id)
+
+    return {
+        "message": "Driver rated successfully",
+        "num_of_ratings": summary.rating_count,
+        "overall_rating": summary.average_stars
+    }
 
 
-# Display Driver Rating Optional
+# Display Driver Profile (rider-facing; served from the driver profile cache)
 @router.get("/driver/{driver_id}/profile", status_code=status.HTTP_200_OK)
-async def get_driver_profile(driver_id: int, db: Session = Depends(get_async_db)):
-    driver = db.query(Driver).filter(Driver.id == driver_id).first()
-    if not driver:
+async def get_driver_profile(driver_id: int):
+    """
+    A driver's public profile. Ratings show immediately; other driver, vehicle
+    and photo changes can take up to DRIVER_PROFILE_TTL_SECONDS to appear.
+    """
+    profile = await driver_profile_cache.get(driver_id)
+    if not profile:
         raise HTTPException(status_code=404, detail="Driver not found")
-    
+
     return {
-        "driver_name": driver.name,
-        "overall_rating": driver.overall_rating,
-        "num_of_ratings": driver.num_of_ratings
+        "driver_name": profile.driver_name,
+        "photo_url": profile.photo_url,
+        "rating": profile.rating,
+        "overall_rating": profile.overall_rating,
+        "num_of_ratings": profile.num_of_ratings,
+        "vehicle": {
+            "name": profile.vehicle_name,
+            "model": profile.vehicle_model,
+            "exterior_color": profile.vehicle_exterior_color,
+            "interior_color": profile.vehicle_interior_color,
+            "license_plate": profile.license_plate
+        }
     }
 
 # Select Payment Method
@@ -761,29 +745,11 @@ async def activate_panic_button(
 
 @router.post("/calculate_distance_standard/")
 async def calculate_distance(pickup: Location, dropoff: Location):
-    # Use geodesic from geopy to calculate the distance
-    pickup_coords = (pickup.latitude, pickup.longitude)
-    dropoff_coords = (dropoff.latitude, dropoff.longitude)
-    
-    # Calculate the distance in kilometers
-    distance = geodesic(pickup_coords, dropoff_coords).kilometers
-    
-    # Calculate the price: $2 per kilometer
-    price = distance * 2
-    
-    return {"distance_km": distance, "price_usd": price}
+    quote = pricing_engine.quote((pickup.latitude, pickup.longitude), (dropoff.latitude, dropoff.longitude))
+    return {"distance_km": quote.distance_km, "price_usd": quote.prices["STANDARD"]}
 
 
 @router.post("/calculate_distance_vip/")
-async def calculate_distance(pickup: Location, dropoff: Location):
-    # Use geodesic from geopy to calculate the distance
-    pickup_coords = (pickup.latitude, pickup.longitude)
-    dropoff_coords = (dropoff.latitude, dropoff.longitude)
-    
-    # Calculate the distance in kilometers
-    distance = geodesic(pickup_coords, dropoff_coords).kilometers
-    
-    # Calculate the price: $2 per kilometer
-    price = distance * 5
-    
-    return {"distance_km": distance, "price_usd": price}
\ No newline at end of file
+async def calculate_distance_vip(pickup: Location, dropoff: Location):
+    quote = pricing_engine.quote((pickup.latitude, pickup.longitude), (dropoff.latitude, dropoff.longitude))
+    return {"distance_km": quote.distance_km, "price_usd": quote.prices["VIP"]}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Form, UploadFile, File
+from fastapi import APIRouter, HTTPException, status, Depends, Form, UploadFile, File, Request, Response
 from typing import Any, Optional, Union
 from pathlib import Path
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -9,14 +9,19 @@ from ..database import get_async_db
 from ..models import User, Rider, Driver, KYC, Admin, Wallet, Referral, PasswordReset, TemporaryUserPhoto, PanicButton
 from ..schemas import KycCreate, AdminCreate, get_password_hash, pwd_context
 from ..utils.schemas_utils import RiderProfileUpdate, RiderProfile, PreRegisterRequest, DriverPreRegisterRequest, RiderProfileUpdateus, RiderProfileus
-from ..utils.utils_dependencies_files import get_current_user, generate_hashed_referral_code
+from ..utils.utils_dependencies_files import get_current_user
+from ..utils.referral_codes import referral_code_service
+from ..utils.credential_filter import credential_filter, ensure_credentials_available, find_taken_credentials
+from ..utils.rate_limiter import TokenBucketLimiter
+from ..utils.rider_profile_cache import rider_profile_cache
+from ..utils.photo_serving import etag_matches
 from ..utils.wallet_utilitity_functions import generate_global_unique_account_number
 import logging
 import os
 from fastapi.encoders import jsonable_encoder
-from ..utils.otp import generate_otp, OTPVerification, generate_otp_expiration
+from ..utils.otp import generate_otp, generate_otp_expiration, record_otp_issued, record_otp_verified
+from ..utils.otp_store import get_otp_store, new_pending_registration, OTP_AUDIT_LOG
 from uuid import uuid4
-import random
 from sqlalchemy.future import select
 from fastapi import HTTPException
 from ..enums import UserType
@@ -24,7 +29,7 @@ from pydantic import BaseModel, Field, EmailStr, ValidationError
 from app.utils.security import hash_password
 import aiofiles
 from sqlalchemy.orm import joinedload
-import httpx
+from ..utils.otp_delivery import deliver_otp_email
 from fastapi import HTTPException, Query
 
 router = APIRouter()
@@ -46,6 +51,54 @@ logger = logging.getLogger(__name__)
 
 
 
+# Sign-up forms check as the user types: allow a burst, then a few checks a second per client
+availability_limiter = TokenBucketLimiter(rate=5, burst=20)
+
+
+@router.get(
+    "/availability",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(availability_limiter.dependency())],
+)
+async def check_availability(
+    user_name: Optional[str] = None,
+    email: Optional[str] = None,
+    phone_number: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Whether a username, email and/or phone number is still free to register with.
+
+    Best effort, for form hints only: the in-memory credential index is per
+    process and rebuilt on a schedule, so a credential registered through
+    another instance within the last rebuild interval can still show as free.
+    The database is only asked while the index is loading at startup; pending
+    registrations held in the OTP store count as taken. Completion re-checks
+    against the database either way.
+    """
+    credentials = {"user_name": user_name, "email": email, "phone_number": phone_number}
+    credentials = {name: value for name, value in credentials.items() if value}
+    if not credentials:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide a user_name, email or phone_number to check."
+        )
+
+    available = {name: credential_filter.is_available(name, value) for name, value in credentials.items()}
+    if None in available.values():
+        taken = await find_taken_credentials(db, **credentials)
+        available = {name: name not in taken for name in credentials}
+
+    # Credentials reserved by a registration still waiting on its OTP
+    pending = await get_otp_store().find(**credentials)
+    if pending is not None:
+        for name, value in credentials.items():
+            if getattr(pending, name) == value:
+                available[name] = False
+
+    return {"available": available}
+
+
 @router.post("/pre-register/rider/new/", status_code=status.HTTP_200_OK)
 async def pre_register_rider(
     request: PreRegisterRequest,
@@ -69,42 +122,14 @@ async def pre_register_rider(
 
     async with db as session:
         # Check if phone number, email, or username is already registered in the User table
-        user_query = await session.execute(
-            select(User).filter(
-                (User.phone_number == phone_number) |
-                (User.email == email) |
-                (User.user_name == user_name)
-            )
+        await ensure_credentials_available(
+            session, phone_number=phone_number, email=email, user_name=user_name
         )
-        existing_user = user_query.scalars().first()
 
-        if existing_user:
-            # If any of the values exist, raise an exception with relevant message
-            if existing_user.phone_number == phone_number:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Phone number is already associated with another user."
-                )
-            elif existing_user.email == email:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Email address is already associated with another user."
-                )
-            elif existing_user.user_name == user_name:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Username is already taken by another user."
-                )
-
-        # Check if the credentials already exist in the OTPVerification table
-        otp_query = await session.execute(
-            select(OTPVerification).filter(
-                (OTPVerification.phone_number == phone_number) |
-                (OTPVerification.email == email) |
-                (OTPVerification.user_name == user_name)
-            )
+        # Check if an OTP is already pending for any of these credentials
+        existing_otp = await get_otp_store().find(
+            phone_number=phone_number, email=email, user_name=user_name
         )
-        existing_otp = otp_query.scalars().first()
 
         if existing_otp:
             # If OTP is already sent for the credentials, raise an exception
@@ -114,57 +139,40 @@ async def pre_register_rider(
             )
 
         # Handle referral code validation
-        referrer_rider = None
-        referrer_driver = None
         if referral_code:
-            referrer_rider_query = await session.execute(
-                select(Rider).filter(Rider.referral_code == referral_code)
-            )
-            referrer_rider = referrer_rider_query.scalars().first()
-
-            if not referrer_rider:
-                referrer_driver_query = await session.execute(
-                    select(Driver).filter(Driver.referral_code == referral_code)
-                )
-                referrer_driver = referrer_driver_query.scalars().first()
-
-            if not referrer_rider and not referrer_driver:
+            if not await referral_code_service.resolve(session, referral_code):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Invalid referral code."
                 )
 
-        # Generate OTP and expiration time
+        # Generate OTP and hold the pending registration until it expires
         otp_code = generate_otp()
-        expiration_time = generate_otp_expiration()
-
-        # Send OTP via email
-        async with httpx.AsyncClient(base_url="http://localhost:8000") as client:
-            email_response = await client.post(
-                "/auth/send-otp-email",
-                params={"to_email": email, "otp_code": otp_code}
-            )
-            if email_response.status_code != 200:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to send OTP email."
-                )
-
-        # Handle country-specific fields and save OTP data
-        otp_entry = OTPVerification(
+        otp_entry = new_pending_registration(
             full_name=full_name,
             user_name=user_name,
             phone_number=phone_number,
             email=email,
             otp_code=otp_code,
-            expires_at=expiration_time,
-            is_verified=False,
             hashed_password=hash_password(password),
             referral_code=referral_code
         )
-        session.add(otp_entry)
-        await session.commit()
-        await session.refresh(otp_entry)
+        if not await get_otp_store().add(otp_entry):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="OTP has already been sent to your email. Please check your inbox."
+            )
+
+        # Send OTP via email, releasing the credentials if it cannot be queued
+        try:
+            await deliver_otp_email(email, otp_code)
+        except HTTPException:
+            await get_otp_store().delete(phone_number)
+            raise
+
+        if OTP_AUDIT_LOG:
+            record_otp_issued(session, otp_entry)
+            await session.commit()
 
     return {
         "message": "Pre-registration successful. OTP sent via email.",
@@ -213,26 +221,27 @@ async def complete_registration(
     db: AsyncSession = Depends(get_async_db)
 ):
     async with db as session:
-        # Validate OTP
-        otp_query = await session.execute(
-            select(OTPVerification).filter(
-                OTPVerification.phone_number == phone_number,
-                OTPVerification.otp_code == otp_code,
-                OTPVerification.expires_at > datetime.utcnow(),
-                OTPVerification.is_verified == False
-            )
-        )
-        otp_entry = otp_query.scalar()
+        # Validate OTP and mark it as verified
+        otp_entry = await get_otp_store().verify(phone_number, otp_code)
 
         if not otp_entry:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or expired OTP.")
 
-        # Mark OTP as verified
-        otp_entry.is_verified = True
-        await session.commit()
+        if OTP_AUDIT_LOG:
+            await record_otp_verified(session, phone_number, otp_code)
+            await session.commit()
 
-        # Generate a unique account number
-        account_number = f"{random.randint(1000000000, 9999999999)}"
+        # Another registration may have taken these credentials since the OTP was sent
+        await ensure_credentials_available(
+            session,
+            use_filter=False,
+            phone_number=otp_entry.phone_number,
+            email=otp_entry.email,
+            user_name=otp_entry.user_name,
+        )
+
+        # Allocate a unique account number
+        account_number = await generate_global_unique_account_number(session)
 
         # Create User
         user = User(
@@ -257,40 +266,30 @@ async def complete_registration(
         # Create Wallet associated with the User
         wallet = Wallet(
             user_id=user.id,  # Use the user.id as a foreign key in the Wallet
-            balance=0.0,
             account_number=account_number
         )
         session.add(wallet)
 
         # Handle referral code if provided
         if referral_code:
-            # Check if referral code belongs to a rider
-            referrer_rider_query = await session.execute(
-                select(Rider).filter(Rider.referral_code == referral_code)
-            )
-            referrer_rider = referrer_rider_query.scalars().first()
-
-            # Check if referral code belongs to a driver if not found in riders
-            referrer_driver = None
-            if not referrer_rider:
-                referrer_driver_query = await session.execute(
-                    select(Driver).filter(Driver.referral_code == referral_code)
-                )
-                referrer_driver = referrer_driver_query.scalars().first()
+            # Resolve the referral code to the rider or driver who owns it
+            referrer = await referral_code_service.resolve(session, referral_code)
 
             # Raise an error if the referral code is invalid
-            if not referrer_rider and not referrer_driver:
+            if not referrer:
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid referral code.")
 
             # Create a referral relationship based on the referrer type
             referral = Referral(
-                referrer_rider_id=referrer_rider.id if referrer_rider else None,
-                referrer_driver_id=referrer_driver.id if referrer_driver else None,
+                referrer_rider_id=referrer.rider_id,
+                referrer_driver_id=referrer.driver_id,
                 referred_rider_id=rider.id  # Use the new rider's id
             )
             session.add(referral)
 
         await session.commit()  # Commit the User, Rider, Wallet, and Referral entries
+        await get_otp_store().delete(phone_number)
+        credential_filter.add(user.phone_number, user.email, user.user_name)
 
         # Prepare user data
         user_data = jsonable_encoder(user)
@@ -339,42 +338,14 @@ async def pre_register_driver(
 
     async with db as session:
         # Check if phone number, email, or username is already registered by any user (driver or rider)
-        existing_user_query = await session.execute(
-            select(User)
-            .filter(
-                (User.phone_number == phone_number) |
-                (User.email == email) |
-                (User.user_name == user_name)
-            )
+        await ensure_credentials_available(
+            session, phone_number=phone_number, email=email, user_name=user_name
         )
-        existing_user = existing_user_query.scalars().first()
-
-        if existing_user:
-            if existing_user.phone_number == phone_number:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Phone number is already associated with another user."
-                )
-            elif existing_user.email == email:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Email address is already associated with another user."
-                )
-            elif existing_user.user_name == user_name:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Username is already taken by another user."
-                )
 
-        # Check if the credentials already exist in the OTPVerification table
-        otp_query = await session.execute(
-            select(OTPVerification).filter(
-                (OTPVerification.phone_number == phone_number) |
-                (OTPVerification.email == email) |
-                (OTPVerification.user_name == user_name)
-            )
+        # Check if an OTP is already pending for any of these credentials
+        existing_otp = await get_otp_store().find(
+            phone_number=phone_number, email=email, user_name=user_name
         )
-        existing_otp = otp_query.scalars().first()
 
         if existing_otp:
             # If OTP is already sent for the credentials, raise an exception
@@ -383,44 +354,35 @@ async def pre_register_driver(
                 detail="OTP has already been sent to your email. Please check your inbox."
             )
 
-        # Generate OTP and expiration time
+        # Generate OTP and hold the pending registration until it expires
         otp_code = generate_otp()
-        expiration_time = generate_otp_expiration()
-
-        # Store the user data along with the OTP in the OTPVerification table
-        otp_entry = OTPVerification(
+        otp_entry = new_pending_registration(
             full_name=full_name,
             user_name=user_name,
             phone_number=phone_number,
             email=email,
             otp_code=otp_code,
-            expires_at=expiration_time,
-            is_verified=False,
             hashed_password=hash_password(password),  # Hash the password for storage
         )
-        session.add(otp_entry)
-        await session.commit()
-        await session.refresh(otp_entry)
-
-    # Send OTP via email
-    async with httpx.AsyncClient(base_url="http://localhost:8000") as client:
-        email_response = await client.post(
-            "/auth/send-otp-email",
-            params={"to_email": email, "otp_code": otp_code}
-        )
-        if email_response.status_code != 200:
+        if not await get_otp_store().add(otp_entry):
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to send OTP email."
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="OTP has already been sent to your email. Please check your inbox."
             )
+
+        if OTP_AUDIT_LOG:
+            record_otp_issued(session, otp_entry)
+            await session.commit()
+
+    # Send OTP via email, releasing the credentials if it cannot be queued
+    try:
+        await deliver_otp_email(email, otp_code)
+    except HTTPException:
+        await get_otp_store().delete(phone_number)
+        raise
     
     # Optionally, send OTP via SMS (if you want to include this functionality)
-    # async with httpx.AsyncClient(base_url="http://localhost:8000") as client:
-    #     sms_response = await client.post(
-    #         "/auth/send-otp/v1/messaging/send_sms", params={"phone_number": phone_number, "otp_code": otp_code}
-    #     )
-    #     if sms_response.status_code != 200:
-    #         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to send OTP SMS.")
+    # await deliver_otp_sms(phone_number, otp_code)
 
     # Return the created OTP entry data in the response
     return {
@@ -445,21 +407,14 @@ async def verify_driver_otp(
     db: AsyncSession = Depends(get_async_db)
 ):
     async with db as session:
-        otp_query = await session.execute(
-            select(OTPVerification).where(
-                OTPVerification.phone_number == phone_number,
-                OTPVerification.otp_code == otp_code,
-                OTPVerification.expires_at > datetime.utcnow(),
-                OTPVerification.is_verified == False
-            )
-        )
-        otp_entry = otp_query.scalar()
+        otp_entry = await get_otp_store().verify(phone_number, otp_code)
 
         if not otp_entry:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or expired OTP.")
 
-        otp_entry.is_verified = True
-        await session.commit()
+        if OTP_AUDIT_LOG:
+            await record_otp_verified(session, phone_number, otp_code)
+            await session.commit()
     
     return {"message": "OTP verified. Please proceed to complete the registration."}
 
@@ -502,38 +457,23 @@ async def complete_driver_registration(
     db: AsyncSession = Depends(get_async_db)
 ) -> Any:
     async with db.begin():
-        otp_query = await db.execute(
-            select(OTPVerification).where(
-                OTPVerification.phone_number == phone_number,
-                OTPVerification.is_verified == True
-            )
-        )
-        otp_entry = otp_query.scalar()
+        otp_entry = await get_otp_store().get_verified(phone_number)
         if not otp_entry:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Pre-registration not found or OTP not verified."
             )
 
-        user_query = await db.execute(
-            select(User).where(User.phone_number == otp_entry.phone_number)
+        # The user's credentials, NIN and license number, all checked in one query
+        await ensure_credentials_available(
+            db,
+            use_filter=False,
+            phone_number=otp_entry.phone_number,
+            email=otp_entry.email,
+            user_name=otp_entry.user_name,
+            nin_number=nin_number,
+            license_number=license_number,
         )
-        if user_query.scalar():
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="User already exists."
-            )
-
-        if await db.scalar(select(Driver).where(Driver.nin_number == nin_number)):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Driver with this NIN already exists."
-            )
-        if await db.scalar(select(Driver).where(Driver.license_number == license_number)):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Driver with this license number already exists."
-            )
 
         user = User(
             full_name=otp_entry.full_name,
@@ -574,11 +514,13 @@ async def complete_driver_registration(
 
         wallet = Wallet(
             user_id=user.id,
-            balance=0.0,
-            account_number=f"{random.randint(1000000000, 9999999999)}"
+            account_number=await generate_global_unique_account_number(db)
         )
         db.add(wallet)
 
+    await get_otp_store().delete(phone_number)
+    credential_filter.add(user.phone_number, user.email, user.user_name)
+
     await db.refresh(user)
     await db.refresh(driver)
     await db.refresh(wallet)
@@ -637,38 +579,23 @@ async def complete_driver_registration(
     db: AsyncSession = Depends(get_async_db)
 ) -> Any:
     async with db.begin():
-        otp_query = await db.execute(
-            select(OTPVerification).where(
-                OTPVerification.phone_number == phone_number,
-                OTPVerification.is_verified == True
-            )
-        )
-        otp_entry = otp_query.scalar()
+        otp_entry = await get_otp_store().get_verified(phone_number)
         if not otp_entry:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Pre-registration not found or OTP not verified."
             )
 
-        user_query = await db.execute(
-            select(User).where(User.phone_number == otp_entry.phone_number)
+        # The user's credentials, NIN and license number, all checked in one query
+        await ensure_credentials_available(
+            db,
+            use_filter=False,
+            phone_number=otp_entry.phone_number,
+            email=otp_entry.email,
+            user_name=otp_entry.user_name,
+            nin_number=ssn_number,
+            license_number=license_number,
         )
-        if user_query.scalar():
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="User already exists."
-            )
-
-        if await db.scalar(select(Driver).where(Driver.nin_number == ssn_number)):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Driver with this NIN already exists."
-            )
-        if await db.scalar(select(Driver).where(Driver.license_number == license_number)):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Driver with this license number already exists."
-            )
 
         user = User(
             full_name=otp_entry.full_name,
@@ -710,11 +637,13 @@ async def complete_driver_registration(
 
         wallet = Wallet(
             user_id=user.id,
-            balance=0.0,
-            account_number=f"{random.randint(1000000000, 9999999999)}"
+            account_number=await generate_global_unique_account_number(db)
         )
         db.add(wallet)
 
+    await get_otp_store().delete(phone_number)
+    credential_filter.add(user.phone_number, user.email, user.user_name)
+
     await db.refresh(user)
     await db.refresh(driver)
     await db.refresh(wallet)
@@ -821,17 +750,10 @@ async def get_referral_code(rider_id: int, db: AsyncSession = Depends(get_async_
             "referral_code": rider.referral_code
         }
 
-    # Generate a new referral code
-    referral_code = generate_hashed_referral_code()
-
-    # Set the new referral code
-    rider.referral_code = referral_code
-
-    # Commit the changes to the database
+    # Take a code from the pre-generated pool and store it on the rider
     try:
-        db.add(rider)  # Mark the rider instance for update
+        rider.referral_code = await referral_code_service.assign(db, rider_id=rider.id)
         await db.commit()  # Commit the transaction
-        await db.refresh(rider)  # Refresh the rider instance
     except Exception as e:
         await db.rollback()  # Rollback in case of error
         raise HTTPException(status_code=500, detail=f"An error occurred while saving the referral code: {e}")
@@ -857,17 +779,10 @@ async def get_driver_referral_code(driver_id: int, db: AsyncSession = Depends(ge
             "referral_code": driver.referral_code
         }
 
-    # Generate a new referral code
-    referral_code = generate_hashed_referral_code()
-
-    # Set the new referral code
-    driver.referral_code = referral_code
-
-    # Commit the changes to the database
+    # Take a code from the pre-generated pool and store it on the driver
     try:
-        db.add(driver)  # Mark the driver instance for update
+        driver.referral_code = await referral_code_service.assign(db, driver_id=driver.id)
         await db.commit()  # Commit the transaction
-        await db.refresh(driver)  # Refresh the driver instance
     except Exception as e:
         await db.rollback()  # Rollback in case of error
         raise HTTPException(status_code=500, detail=f"An error occurred while saving the referral code: {e}")
@@ -914,11 +829,14 @@ async def update_rider_profile_ng(
     nin_photo: Optional[UploadFile] = File(None, description="NIN photo for verification"),
     db: AsyncSession = Depends(get_async_db)
 ):
-    # Retrieve the rider
-    result = await db.execute(select(Rider).where(Rider.id == rider_id))
-    rider = result.scalar_one_or_none()
-    if not rider:
+    # Retrieve the rider and its user together
+    result = await db.execute(
+        select(Rider, User).join(User, User.id == Rider.user_id).where(Rider.id == rider_id)
+    )
+    row = result.first()
+    if not row:
         raise HTTPException(status_code=404, detail="Rider not found")
+    rider, user = row
 
     # Update NIN only if it's not empty
     if nin and nin.strip():
@@ -933,11 +851,7 @@ async def update_rider_profile_ng(
         profile_photo_path = await save_image(profile_photo, "profile_photos")
         rider.rider_photo = profile_photo_path  # Save file path
 
-    # Retrieve and update associated user
-    user = await db.get(User, rider.user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="Associated user not found")
-
+    # Update the associated user
     if gender:
         user.gender = gender
     if address:
@@ -959,6 +873,7 @@ async def update_rider_profile_ng(
     # Commit changes
     await db.commit()
     await db.refresh(rider)
+    rider_profile_cache.invalidate(rider.id)
 
     return {
         "message": "Profile updated successfully",
@@ -977,11 +892,14 @@ async def update_rider_profile_us(
     profile_photo: Optional[UploadFile] = File(None),
     db: AsyncSession = Depends(get_async_db)
 ):
-    # Retrieve the rider
-    result = await db.execute(select(Rider).where(Rider.id == rider_id))
-    rider = result.scalar_one_or_none()
-    if not rider:
+    # Retrieve the rider and its user together
+    result = await db.execute(
+        select(Rider, User).join(User, User.id == Rider.user_id).where(Rider.id == rider_id)
+    )
+    row = result.first()
+    if not row:
         raise HTTPException(status_code=404, detail="Rider not found")
+    rider, user = row
 
     # Update SSN if provided
     if ssn:
@@ -992,11 +910,7 @@ async def update_rider_profile_us(
         profile_photo_path = await save_image(profile_photo, "profile_photos")
         rider.rider_photo = profile_photo_path  # Save file path
 
-    # Retrieve and update associated user
-    user = await db.get(User, rider.user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="Associated user not found")
-
+    # Update the associated user
     if gender:
         user.gender = gender
     if address:
@@ -1018,6 +932,7 @@ async def update_rider_profile_us(
     # Commit changes
     await db.commit()
     await db.refresh(rider)
+    rider_profile_cache.invalidate(rider.id)
 
     return {
         "message": "Profile updated successfully",
@@ -1027,75 +942,63 @@ async def update_rider_profile_us(
     }
 
 
-# Get Rider Profile
-@router.get("/riders/{rider_id}/profile/ng", response_model=RiderProfile)
-async def get_rider_profile(
-    rider_id: int,
-    db: AsyncSession = Depends(get_async_db)
-):
-    # Retrieve the rider profile
-    result = await db.execute(select(Rider).where(Rider.id == rider_id))
-    rider = result.scalar_one_or_none()
+async def read_rider_profile(rider_id: int, request: Request, response: Response):
+    """
+    Load a rider's profile through the profile cache and handle conditional GETs.
 
-    if not rider:
+    Returns the cached record, or a 304 response when the client's If-None-Match
+    already names the current version; a cached profile costs no query either way.
+    """
+    profile = await rider_profile_cache.get(rider_id)
+    if profile is None:
         raise HTTPException(status_code=404, detail="Rider not found")
 
-    # Retrieve associated User information
-    user_result = await db.execute(select(User).where(User.id == rider.user_id))
-    user = user_result.scalar_one_or_none()
+    headers = {"ETag": profile.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), profile.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return profile
 
-    if not user:
-        raise HTTPException(status_code=404, detail="Associated user not found")
 
-    # Combine selected profile details from Rider and User, returning only the profile photo path
-    profile_data = {
-        "rider_id": rider.id,
-        "gender": user.gender,
-        "address": user.address,
-        "nin": rider.nin,
-        "profile_photo": rider.rider_photo,  # Return the file path instead of Base64
-        "email": user.email,
-        "phone_number": user.phone_number,
-        "full_name": user.full_name,
-    }
+# Get Rider Profile
+@router.get("/riders/{rider_id}/profile/ng", response_model=RiderProfile)
+async def get_rider_profile(rider_id: int, request: Request, response: Response):
+    profile = await read_rider_profile(rider_id, request, response)
+    if isinstance(profile, Response):
+        return profile
 
-    return profile_data
+    return {
+        "rider_id": profile.rider_id,
+        "gender": profile.gender,
+        "address": profile.address,
+        "nin": profile.nin,
+        "profile_photo": profile.profile_photo,  # Return the file path instead of Base64
+        "email": profile.email,
+        "phone_number": profile.phone_number,
+        "full_name": profile.full_name,
+        "wallet_balance": profile.wallet_balance,
+    }
 
 
 # Get Rider Profile Us
 @router.get("/riders/{rider_id}/profile/us", response_model=RiderProfileus)
-async def get_rider_profile(
-    rider_id: int,
-    db: AsyncSession = Depends(get_async_db)
-):
-    # Retrieve the rider profile
-    result = await db.execute(select(Rider).where(Rider.id == rider_id))
-    rider = result.scalar_one_or_none()
-
-    if not rider:
-        raise HTTPException(status_code=404, detail="Rider not found")
-
-    # Retrieve associated User information
-    user_result = await db.execute(select(User).where(User.id == rider.user_id))
-    user = user_result.scalar_one_or_none()
+async def get_rider_profile(rider_id: int, request: Request, response: Response):
+    profile = await read_rider_profile(rider_id, request, response)
+    if isinstance(profile, Response):
+        return profile
 
-    if not user:
-        raise HTTPException(status_code=404, detail="Associated user not found")
-
-    # Combine selected profile details from Rider and User, returning only the profile photo path
-    profile_data = {
-        "rider_id": rider.id,
-        "gender": user.gender,
-        "address": user.address,
-        "ssn": rider.ssn_number,
-        "profile_photo": rider.rider_photo,  # Return the file path instead of Base64
-        "email": user.email,
-        "phone_number": user.phone_number,
-        "full_name": user.full_name,
+    return {
+        "rider_id": profile.rider_id,
+        "gender": profile.gender,
+        "address": profile.address,
+        "ssn": profile.ssn,
+        "profile_photo": profile.profile_photo,  # Return the file path instead of Base64
+        "email": profile.email,
+        "phone_number": profile.phone_number,
+        "full_name": profile.full_name,
+        "wallet_balance": profile.wallet_balance,
     }
 
-    return profile_data
-
 
 @router.post("/password-reset/request", status_code=status.HTTP_200_OK)
 async def request_password_reset(
@@ -1124,21 +1027,8 @@ async def request_password_reset(
         session.add(password_reset)
         await session.commit()
 
-        # Send OTP via email as query parameters
-        async with httpx.AsyncClient(base_url="http://localhost:8000") as client:
-            params = {
-                "to_email": email,
-                "otp_code": otp_code
-            }
-            email_response = await client.post(
-                "/auth/send-otp-email",
-                params=params  # Use params instead of data
-            )
-            if email_response.status_code != 200:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to send OTP email."
-                )
+        # Send OTP via email
+        await deliver_otp_email(email, otp_code)
 
     return {"message": "Password reset OTP sent. Please check your email."}
 
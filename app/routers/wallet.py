@@ -1,12 +1,16 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from ..database import get_async_db  # Ensure to update this to get the async session
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import datetime
 from sqlalchemy.orm import Session
 from app.models import Wallet, Transaction, CompanyWallet
-from ..utils.wallet_schema import  WalletResponse, TransactionCreate, TransactionResponse, TransactionHistoryResponse
+from ..utils.wallet_schema import  WalletResponse, TransactionCreate, TransactionResponse, TransactionHistoryResponse, WalletStatementResponse
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..utils.wallet_utilitity_functions import generate_global_unique_account_number
+from ..utils import ledger, wallet_history
 router = APIRouter()
 
 
@@ -26,104 +30,126 @@ async def get_wallet_balance(user_id: int, db: AsyncSession = Depends(get_async_
 # Add funds (credit) to the wallet
 @router.post("/wallets/credit/", response_model=TransactionResponse)
 async def credit_wallet(account_number: str, transaction: TransactionCreate, db: AsyncSession = Depends(get_async_db)):
-    # Find the wallet by the account number using select
-    query = select(Wallet).filter(Wallet.account_number == account_number)
-    result = await db.execute(query)  # Execute the query asynchronously
-    wallet = result.scalars().first()  # Get the first result
-
-    if not wallet:
-        raise HTTPException(status_code=404, detail="Wallet not found")
-    
     if transaction.transaction_type != "CREDIT":
         raise HTTPException(status_code=400, detail="Transaction type must be CREDIT to add funds")
 
-    # Add the amount to the wallet balance
-    wallet.balance += transaction.amount
-    db.add(wallet)  # Mark wallet for updating
-    
-    # Record the transaction
-    new_transaction = Transaction(wallet_id=wallet.id, amount=transaction.amount, transaction_type=transaction.transaction_type)
-    db.add(new_transaction)  # Mark transaction for adding
-    await db.commit()  # Commit the changes asynchronously
-    await db.refresh(new_transaction)  # Refresh the transaction to get updated data
-    
-    # Prepare the response including the account number
-    response = TransactionResponse(
-        amount=new_transaction.amount,
-        transaction_type=new_transaction.transaction_type,
-        created_at=new_transaction.created_at,
-        account_number=wallet.account_number  # Include account number from wallet
+    # Add the amount to the wallet balance and record the transaction in one statement
+    entry = await ledger.credit_wallet(db, ledger.to_minor(transaction.amount), account_number=account_number)
+    await db.commit()
+
+    return TransactionResponse(
+        amount=entry.amount,
+        transaction_type=entry.transaction_type,
+        created_at=entry.created_at,
+        account_number=entry.account_number,
+        balance=entry.balance_after
     )
-    
-    return response  # Return the response with account number
 
 
 # Deduct funds (debit) from the wallet
 @router.post("/wallets/{account_number}/deduct_funds", response_model=TransactionResponse)
 async def deduct_funds(account_number: str, transaction: TransactionCreate, db: AsyncSession = Depends(get_async_db)):
-    # Query the wallet by account number
-    result = await db.execute(select(Wallet).filter(Wallet.account_number == account_number))
-    wallet = result.scalars().first()
-
-    if not wallet:
-        raise HTTPException(status_code=404, detail="Wallet not found")
-    
     # Check if the transaction type is DEBIT
     if transaction.transaction_type != "DEBIT":
         raise HTTPException(status_code=400, detail="Transaction type must be DEBIT to deduct funds")
-    
-    # Check if the wallet has sufficient balance
-    if wallet.balance < transaction.amount:
-        raise HTTPException(status_code=400, detail="Insufficient balance")
 
-    # Deduct the amount from the wallet balance
-    wallet.balance -= transaction.amount
-    db.add(wallet)
-    
-    # Record the transaction
-    new_transaction = Transaction(
-        wallet_id=wallet.id, 
-        amount=transaction.amount, 
-        transaction_type=transaction.transaction_type
-    )
-    db.add(new_transaction)
+    # Deduct the amount only if the balance covers it, recording the transaction in the same statement
+    entry = await ledger.debit_wallet(db, ledger.to_minor(transaction.amount), account_number=account_number)
     await db.commit()
-    await db.refresh(new_transaction)
-    
-    # Manually include account_number in the response
-    response = TransactionResponse(
-        id=new_transaction.id,
-        amount=new_transaction.amount,
-        transaction_type=new_transaction.transaction_type,
-        created_at=new_transaction.created_at,
-        account_number=wallet.account_number  # Include account number from wallet
+
+    return TransactionResponse(
+        amount=entry.amount,
+        transaction_type=entry.transaction_type,
+        created_at=entry.created_at,
+        account_number=entry.account_number,
+        balance=entry.balance_after
     )
-    
-    return response
 
 
 # Get the wallet transaction history for a wallet (by account number)
 @router.get("/wallets/{account_number}/history", response_model=list[TransactionHistoryResponse])
-async def get_wallet_history(user_id: int, db: AsyncSession = Depends(get_async_db)):
-    # Query the wallet by account number
-    result = await db.execute(select(Wallet).filter(Wallet.user_id == user_id ))
-    wallet = result.scalars().first()
+async def get_wallet_history(
+    account_number: str,
+    response: Response,
+    user_id: Optional[int] = None,
+    limit: int = Query(wallet_history.DEFAULT_PAGE_SIZE, ge=1, le=wallet_history.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Newest-first page of a wallet's transactions, optionally within [start, end).
+
+    The cursor for the next page is returned in the X-Next-Cursor header; it is
+    absent on the last page.
+    """
+    # Query the wallet by account number (or by user ID, as older clients do)
+    wallet_filter = Wallet.user_id == user_id if user_id is not None else Wallet.account_number == account_number
+    wallet_id = (await db.execute(select(Wallet.id).filter(wallet_filter))).scalar()
 
     # Raise error if wallet not found
-    if not wallet:
+    if not wallet_id:
         raise HTTPException(status_code=404, detail="Wallet not found")
-    
-    # Fetch all transactions related to this wallet
-    transactions_result = await db.execute(select(Transaction).filter(Transaction.wallet_id == wallet.id))
-    transactions = transactions_result.scalars().all()
+
+    transactions, next_cursor = await wallet_history.get_history_page(
+        db, wallet_id, limit=limit, cursor=cursor, start=start, end=end
+    )
 
     # If no transactions found, raise a 404 error
-    if not transactions:
+    if not transactions and not cursor:
         raise HTTPException(status_code=404, detail="No transaction history found for this wallet")
 
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return transactions
 
 
+# Wallet statement for a period
+@router.get("/wallets/{account_number}/statement", response_model=WalletStatementResponse)
+async def get_wallet_statement(
+    account_number: str,
+    start: datetime,
+    end: datetime,
+    db: AsyncSession = Depends(get_async_db)
+):
+    wallet_id = (await db.execute(select(Wallet.id).filter(Wallet.account_number == account_number))).scalar()
+    if not wallet_id:
+        raise HTTPException(status_code=404, detail="Wallet not found")
+
+    statement = await wallet_history.get_statement(db, wallet_id, start, end)
+    return WalletStatementResponse(
+        account_number=account_number,
+        start=statement.start,
+        end=statement.end,
+        opening_balance=ledger.to_major(statement.opening_balance_minor),
+        closing_balance=ledger.to_major(statement.closing_balance_minor),
+        total_credits=ledger.to_major(statement.credits_minor),
+        total_debits=ledger.to_major(statement.debits_minor),
+        transaction_count=statement.transaction_count
+    )
+
+
+# Export the full transaction history as CSV
+@router.get("/wallets/{account_number}/history/export")
+async def export_wallet_history(
+    account_number: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    wallet_id = (await db.execute(select(Wallet.id).filter(Wallet.account_number == account_number))).scalar()
+    if not wallet_id:
+        raise HTTPException(status_code=404, detail="Wallet not found")
+
+    # Rows are streamed in keyset batches, so memory stays flat however long the history is
+    return StreamingResponse(
+        wallet_history.export_history_csv(wallet_id, start=start, end=end),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="wallet-{account_number}-history.csv"'}
+    )
+
+
 # Create Company Wallet endpoint
 @router.post("/company-wallet/create", status_code=status.HTTP_201_CREATED)
 async def create_company_wallet(db: AsyncSession = Depends(get_async_db)):
@@ -142,7 +168,7 @@ async def create_company_wallet(db: AsyncSession = Depends(get_async_db)):
         account_number = await generate_global_unique_account_number(db)
 
         # Create the new company wallet with the generated account number
-        new_wallet = CompanyWallet(balance=0.0, account_number=account_number)
+        new_wallet = CompanyWallet(account_number=account_number)
         db.add(new_wallet)
         await db.commit()
         await db.refresh(new_wallet)
@@ -0,0 +1,219 @@
+import hashlib
+import logging
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import exists, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from ..database import get_async_db
+from ..models import Driver, User
+
+
+logger = logging.getLogger(__name__)
+
+# The filter is sized for at least this many credentials, and twice what exists when rebuilt
+MIN_FILTER_CAPACITY = 100000
+FILTER_ERROR_RATE = 0.01
+
+# Registration credentials that must be unique, the column each is checked against, and the
+# error returned when it is taken. Order matters: the first taken one is reported.
+CREDENTIAL_COLUMNS = {
+    "phone_number": User.phone_number,
+    "email": User.email,
+    "user_name": User.user_name,
+    "nin_number": Driver.nin_number,
+    "license_number": Driver.license_number,
+}
+CREDENTIAL_TAKEN_MESSAGES = {
+    "phone_number": "Phone number is already associated with another user.",
+    "email": "Email address is already associated with another user.",
+    "user_name": "Username is already taken by another user.",
+    "nin_number": "Driver with this NIN already exists.",
+    "license_number": "Driver with this license number already exists.",
+}
+# The user credentials the filter tracks
+FILTERED_CREDENTIALS = ("phone_number", "email", "user_name")
+
+
+def credential_digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings: no false negatives, about error_rate
+    false positives once `capacity` keys are in. Keys can also be given as
+    credential_digest() digests, so a caller that needs the digest anyway
+    hashes once.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = FILTER_ERROR_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest: bytes) -> Iterable[int]:
+        # Double hashing: k positions from two 64-bit halves of one digest
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add_digest(self, digest: bytes):
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def contains_digest(self, digest: bytes) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+    def add(self, key: str):
+        self.add_digest(credential_digest(key))
+
+    def __contains__(self, key: str) -> bool:
+        return self.contains_digest(credential_digest(key))
+
+
+class TakenCredentialFilter:
+    """
+    In-memory index of registered phone numbers, emails and usernames: a Bloom
+    filter in front of a set of 64-bit credential hashes.
+
+    If none of a registration's credentials are in the Bloom filter, none is
+    taken and the uniqueness query can be skipped; a hit only means "maybe",
+    and the database decides. The hash set answers availability checks
+    (is_available) without the Bloom filter's false positives, as of the
+    last rebuild. Until the first load finishes nothing is known, and callers go to the
+    database. The index is rebuilt from the users table on a schedule, which
+    also picks up users registered through other app instances; in between,
+    the completion endpoints still check the database, so a missed
+    registration is caught there rather than at pre-registration.
+    """
+
+    def __init__(self):
+        self.bloom: Optional[BloomFilter] = None
+        self._taken: set = set()
+        self._added_during_rebuild: Optional[List[Tuple[Optional[str], ...]]] = None
+        self.counters: Dict[str, int] = {"skipped_queries": 0, "maybe_taken": 0}
+
+    @staticmethod
+    def _keys(credentials: Dict[str, Optional[str]]) -> List[str]:
+        return [f"{name}:{value}" for name, value in credentials.items() if value is not None]
+
+    @staticmethod
+    def _index(bloom: BloomFilter, taken: set, key: str):
+        digest = credential_digest(key)
+        bloom.add_digest(digest)
+        taken.add(digest[:8])
+
+    def might_be_taken(self, **credentials: Optional[str]) -> bool:
+        bloom = self.bloom
+        if bloom is None or any(key in bloom for key in self._keys(credentials)):
+            self.counters["maybe_taken"] += 1
+            return True
+        self.counters["skipped_queries"] += 1
+        return False
+
+    def is_available(self, name: str, value: str) -> Optional[bool]:
+        """
+        Whether a phone number, email or username is free, or None if the index is not loaded yet.
+
+        Best effort: the index sees registrations made through other app
+        instances only at its next rebuild.
+        """
+        bloom = self.bloom
+        if bloom is None:
+            return None
+        digest = credential_digest(f"{name}:{value}")
+        return not (bloom.contains_digest(digest) and digest[:8] in self._taken)
+
+    def add(self, phone_number: str, email: str, user_name: str):
+        """Record a new user's credentials; call after the user is committed."""
+        if self._added_during_rebuild is not None:
+            self._added_during_rebuild.append((phone_number, email, user_name))
+        if self.bloom is not None:
+            for key in self._keys({"phone_number": phone_number, "email": email, "user_name": user_name}):
+                self._index(self.bloom, self._taken, key)
+
+    async def rebuild(self, batch_size: int = 5000) -> int:
+        """
+        Scheduled job: load every user's credentials into a fresh filter and swap it in.
+
+        Returns:
+            int: Number of users loaded.
+        """
+        self._added_during_rebuild = []
+        bloom, taken = None, set()
+        try:
+            async for db in get_async_db():
+                user_count = await db.scalar(select(func.count(User.id)))
+                bloom = BloomFilter(max(MIN_FILTER_CAPACITY, 2 * user_count * len(FILTERED_CREDENTIALS)))
+                result = await db.stream(
+                    select(User.phone_number, User.email, User.user_name).execution_options(yield_per=batch_size)
+                )
+                async for row in result:
+                    for key in self._keys(row._asdict()):
+                        self._index(bloom, taken, key)
+        except Exception as e:
+            logger.error(f"Error rebuilding the taken credential filter: {e}")
+            bloom = None
+        finally:
+            added, self._added_during_rebuild = self._added_during_rebuild, None
+
+        # Keep the previous filter if the read failed
+        if bloom is None:
+            return 0
+        for phone_number, email, user_name in added:
+            for key in self._keys({"phone_number": phone_number, "email": email, "user_name": user_name}):
+                self._index(bloom, taken, key)
+        self.bloom, self._taken = bloom, taken
+        logger.info(f"Taken credential filter rebuilt with {bloom.count} credential(s).")
+        return bloom.count // len(FILTERED_CREDENTIALS)
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            **self.counters,
+            "loaded": int(self.bloom is not None),
+            "entries": self.bloom.count if self.bloom is not None else 0,
+        }
+
+
+# Instantiate the filter
+credential_filter = TakenCredentialFilter()
+
+
+async def find_taken_credentials(db: AsyncSession, **credentials: Optional[str]) -> List[str]:
+    """
+    Which of the given credentials are already registered, in one query.
+
+    Each credential becomes an EXISTS on its indexed column, all in one SELECT.
+    Phone number, email, NIN and license number are unique columns; user_name is
+    only indexed, so uniqueness there is enforced by this check alone. Returns the taken credentials' names in CREDENTIAL_COLUMNS order.
+    """
+    names = [name for name in CREDENTIAL_COLUMNS if credentials.get(name) is not None]
+    if not names:
+        return []
+    row = (await db.execute(
+        select(*(exists().where(CREDENTIAL_COLUMNS[name] == credentials[name]).label(name) for name in names))
+    )).one()
+    return [name for name in names if getattr(row, name)]
+
+
+async def ensure_credentials_available(db: AsyncSession, use_filter: bool = True, **credentials: Optional[str]):
+    """
+    Raise a 400 naming the first credential that is already registered.
+
+    When only phone number, email and username are being checked and the
+    filter rules them all out, no query is made. The filter is per process and
+    rebuilt on a schedule, so the completion endpoints pass use_filter=False
+    and always ask the database before creating the user.
+    """
+    if use_filter and set(name for name, value in credentials.items() if value is not None) <= set(FILTERED_CREDENTIALS):
+        if not credential_filter.might_be_taken(**credentials):
+            return
+    taken = await find_taken_credentials(db, **credentials)
+    if taken:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=CREDENTIAL_TAKEN_MESSAGES[taken[0]])
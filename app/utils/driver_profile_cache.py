@@ -0,0 +1,80 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy.future import select
+
+from ..database import get_async_db
+from ..models import Driver, User, Vehicle
+from .photo_serving import build_photo_url
+from .profile_cache import ProfileCache
+
+
+# How long a driver profile is served from memory. Rating a driver invalidates
+# it; that is the only driver, vehicle or photo write the app makes after
+# registration. Any other change (an admin tool, a direct SQL edit, a write
+# from another app instance) shows up once the entry expires, so the profile
+# can be up to this many seconds stale. A new endpoint that edits these fields
+# should call driver_profile_cache.invalidate(driver_id) after committing.
+DRIVER_PROFILE_TTL_SECONDS = 60.0
+
+
+@dataclass(frozen=True)
+class DriverProfile:
+    driver_id: int
+    driver_name: str
+    photo_url: Optional[str]
+    rating: Optional[float]
+    num_of_ratings: int
+    overall_rating: Optional[float]
+    rating_tier: int
+    vehicle_name: Optional[str]
+    vehicle_model: Optional[str]
+    vehicle_exterior_color: Optional[str]
+    vehicle_interior_color: Optional[str]
+    license_plate: Optional[str]
+
+
+async def load_driver_profile(driver_id: int) -> Optional[DriverProfile]:
+    """Read a driver's public profile in one query (driver, user and vehicle joined)."""
+    async for db in get_async_db():
+        row = (await db.execute(
+            select(
+                Driver.id,
+                Driver.driver_photo,
+                Driver.rating,
+                Driver.rating_count,
+                Driver.rating_sum,
+                Driver.rating_tier,
+                Driver.vehicle_name,
+                Driver.vehicle_model,
+                Driver.vehicle_exterior_color,
+                Driver.vehicle_interior_color,
+                User.full_name,
+                Vehicle.license_plate,
+            )
+            .join(User, User.id == Driver.user_id)
+            .outerjoin(Vehicle, Vehicle.driver_id == Driver.id)
+            .where(Driver.id == driver_id)
+        )).first()
+    # Built outside the loop, so the session is already closed
+    if row is None:
+        return None
+
+    return DriverProfile(
+        driver_id=row.id,
+        driver_name=row.full_name,
+        photo_url=build_photo_url(row.driver_photo),
+        rating=row.rating,
+        num_of_ratings=row.rating_count,
+        overall_rating=row.rating_sum / row.rating_count if row.rating_count else None,
+        rating_tier=row.rating_tier,
+        vehicle_name=row.vehicle_name,
+        vehicle_model=row.vehicle_model,
+        vehicle_exterior_color=row.vehicle_exterior_color,
+        vehicle_interior_color=row.vehicle_interior_color,
+        license_plate=row.license_plate,
+    )
+
+
+# Instantiate the cache
+driver_profile_cache: ProfileCache[DriverProfile] = ProfileCache(load_driver_profile, ttl=DRIVER_PROFILE_TTL_SECONDS)
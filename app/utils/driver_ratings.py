@@ -0,0 +1,101 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import case, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Driver, Rating
+
+
+# Riders rate 1-5 stars; Driver.rating is kept on the 0-100 scale the tiers use
+MAX_STARS = 5
+SCORE_PER_STAR = 100 / MAX_STARS
+# Weight of the newest rating in the decayed average; roughly the last 1/weight ratings count
+RECENT_RATING_WEIGHT = 0.1
+
+# Matching tiers by score, best first (see categorize_drivers_by_rating)
+TIER_1_MIN_SCORE = 70
+TIER_2_MIN_SCORE = 40
+
+
+def _tier_case(score):
+    return case(
+        (score >= TIER_1_MIN_SCORE, 1),
+        (score >= TIER_2_MIN_SCORE, 2),
+        else_=3,
+    )
+
+
+@dataclass
+class DriverRatingSummary:
+    driver_id: int
+    rating_count: int
+    average_stars: float
+    recent_stars: float
+    score: float
+    tier: int
+
+
+async def record_rating(
+    db: AsyncSession,
+    ride_id: int,
+    rider_id: int,
+    driver_id: int,
+    stars: float,
+    comment: Optional[str] = None,
+) -> DriverRatingSummary:
+    """
+    Store a rating and fold it into the driver's aggregates. Does not commit.
+
+    The aggregates (count, sum, decayed recent average, score and tier) move in a
+    single UPDATE, so concurrent ratings for the same driver never overwrite each
+    other and nothing ever re-reads the ratings table.
+
+    Raises:
+        HTTPException: 400 if the ride has already been rated, 404 if the driver does not exist.
+    """
+    try:
+        await db.execute(insert(Rating).values(
+            ride_id=ride_id,
+            driver_id=driver_id,
+            rider_id=rider_id,
+            rating=stars,
+            comment=comment,
+        ))
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="This ride has already been rated")
+
+    # SET expressions see the row as it was before the update
+    recent = case(
+        (Driver.rating_count == 0, stars),
+        else_=Driver.rating_recent * (1 - RECENT_RATING_WEIGHT) + stars * RECENT_RATING_WEIGHT,
+    )
+    score = recent * SCORE_PER_STAR
+
+    row = (await db.execute(
+        update(Driver)
+        .where(Driver.id == driver_id)
+        .values(
+            rating_count=Driver.rating_count + 1,
+            rating_sum=Driver.rating_sum + stars,
+            rating_recent=recent,
+            rating=score,
+            rating_tier=_tier_case(score),
+        )
+        .returning(Driver.rating_count, Driver.rating_sum, Driver.rating_recent, Driver.rating, Driver.rating_tier)
+        .execution_options(synchronize_session=False)
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Driver not found")
+
+    return DriverRatingSummary(
+        driver_id=driver_id,
+        rating_count=row.rating_count,
+        average_stars=row.rating_sum / row.rating_count,
+        recent_stars=row.rating_recent,
+        score=row.rating,
+        tier=row.rating_tier,
+    )
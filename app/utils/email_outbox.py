@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from email.utils import parseaddr
+from typing import Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SENDGRID_API_URL = os.getenv("SENDGRID_API_URL", "https://api.sendgrid.com/v3/mail/send")
+SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
+SENDGRID_EMAIL_SENDER = "Delevia <no-reply@delevia.com>"  # Use your verified SendGrid sender email
+
+
+@dataclass
+class OutgoingEmail:
+    to_email: str
+    subject: str
+    html_content: str
+    attempts: int = 0
+
+
+class EmailOutbox:
+    """
+    Asynchronous outbox for transactional email.
+
+    Handlers enqueue a message and return straight away; a pool of worker tasks
+    delivers queued messages through SendGrid's v3 API on one pooled HTTP client.
+    Failed sends are retried with exponential backoff and given up after
+    max_attempts. Counters for every outcome are available from metrics().
+
+    The queue lives in memory, so queued messages are lost if the process dies.
+    Mail that must not be dropped (panic alerts) goes through send_now instead,
+    which delivers before returning and raises if it cannot.
+    """
+
+    def __init__(
+        self,
+        api_url: str = SENDGRID_API_URL,
+        api_key: Optional[str] = SENDGRID_API_KEY,
+        sender: str = SENDGRID_EMAIL_SENDER,
+        workers: int = 4,
+        max_queue_size: int = 10000,
+        max_attempts: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        timeout: float = 10.0,
+    ):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.sender_name, self.sender_email = parseaddr(sender)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.client: Optional[httpx.AsyncClient] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._retry_tasks: set = set()
+        self.counters: Dict[str, int] = {
+            "enqueued": 0,
+            "sent": 0,
+            "retried": 0,
+            "failed": 0,
+            "rejected": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._worker_tasks)
+
+    async def start(self):
+        """Open the pooled HTTP client and start the worker pool (done at app startup)."""
+        if self.running:
+            return
+        self._open_client()
+        self._worker_tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        logger.info(f"Email outbox started with {self.workers} worker(s).")
+
+    def _open_client(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers),
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+            )
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """Give queued messages drain_timeout seconds to go out, then stop the workers and close the client."""
+        if self._worker_tasks:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Email outbox stopped with {self.queue.qsize()} message(s) unsent.")
+            for task in [*self._worker_tasks, *self._retry_tasks]:
+                task.cancel()
+            await asyncio.gather(*self._worker_tasks, *self._retry_tasks, return_exceptions=True)
+            self._worker_tasks = []
+            self._retry_tasks.clear()
+
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def enqueue(self, to_email: str, subject: str, html_content: str):
+        """
+        Queue an email for delivery. Safe to call from sync code; messages queued
+        before start() wait until the workers are running.
+
+        Raises:
+            HTTPException: 500 if SendGrid is not configured, 503 if the outbox is full.
+        """
+        if not self.api_key:
+            raise HTTPException(status_code=500, detail="SendGrid API key not configured")
+
+        try:
+            self.queue.put_nowait(OutgoingEmail(to_email=to_email, subject=subject, html_content=html_content))
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            raise HTTPException(status_code=503, detail="Email outbox is full, try again later.")
+
+        self.counters["enqueued"] += 1
+
+    async def send_now(self, to_email: str, subject: str, html_content: str, attempts: int = 3):
+        """
+        Deliver an email before returning, retrying up to `attempts` times with short backoff.
+
+        Raises:
+            HTTPException: 500 if SendGrid is not configured, 502 if every attempt failed.
+        """
+        if not self.api_key:
+            raise HTTPException(status_code=500, detail="SendGrid API key not configured")
+
+        self._open_client()
+        email = OutgoingEmail(to_email=to_email, subject=subject, html_content=html_content)
+        while True:
+            try:
+                await self._deliver(email)
+            except Exception as e:
+                if email.attempts >= attempts:
+                    self.counters["failed"] += 1
+                    logger.error(f"Giving up on email to {to_email} after {email.attempts} attempt(s): {e}")
+                    raise HTTPException(status_code=502, detail="Failed to send email")
+                self.counters["retried"] += 1
+                await asyncio.sleep(min(self.backoff_base * (2 ** (email.attempts - 1)), self.backoff_max))
+            else:
+                self.counters["sent"] += 1
+                return
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            **self.counters,
+            "queue_depth": self.queue.qsize(),
+            "pending_retries": len(self._retry_tasks),
+            "workers": sum(1 for task in self._worker_tasks if not task.done()),
+        }
+
+    async def _run(self):
+        while True:
+            email = await self.queue.get()
+            try:
+                await self._deliver(email)
+            except Exception as e:
+                self._schedule_retry(email, e)
+            else:
+                self.counters["sent"] += 1
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, email: OutgoingEmail):
+        email.attempts += 1
+        payload = {
+            "personalizations": [{"to": [{"email": email.to_email}]}],
+            "from": {"email": self.sender_email, "name": self.sender_name},
+            "subject": email.subject,
+            "content": [{"type": "text/html", "value": email.html_content}],
+        }
+        response = await self.client.post(self.api_url, json=payload)
+        if response.status_code not in (200, 202):
+            raise Exception(f"SendGrid response error: {response.status_code} {response.text}")
+
+    def _schedule_retry(self, email: OutgoingEmail, error: Exception):
+        if email.attempts >= self.max_attempts:
+            self.counters["failed"] += 1
+            logger.error(f"Giving up on email to {email.to_email} after {email.attempts} attempt(s): {error}")
+            return
+
+        delay = min(self.backoff_base * (2 ** (email.attempts - 1)), self.backoff_max)
+        self.counters["retried"] += 1
+        logger.warning(f"Error sending email to {email.to_email}, retrying in {delay:.1f}s: {error}")
+
+        task = asyncio.create_task(self._requeue_after(email, delay))
+        self._retry_tasks.add(task)
+        task.add_done_callback(self._retry_tasks.discard)
+
+    async def _requeue_after(self, email: OutgoingEmail, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            self.queue.put_nowait(email)
+        except asyncio.QueueFull:
+            self.counters["failed"] += 1
+            logger.error(f"Email outbox full, dropping retry for {email.to_email}")
+
+
+# Instantiate the outbox
+email_outbox = EmailOutbox()
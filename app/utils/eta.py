@@ -0,0 +1,224 @@
+import logging
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Sequence, Tuple
+
+import h3
+from sqlalchemy.future import select
+
+from ..database import get_async_db
+from ..enums import RideStatusEnum
+from ..models import Ride
+from .pricing import AVERAGE_SPEED_KMH, ROAD_DISTANCE_FACTOR, haversine_km
+
+
+logger = logging.getLogger(__name__)
+
+# Speeds are learned per H3 cell at this resolution (~36 km² hexagons) and per UTC hour
+ETA_H3_RESOLUTION = 6
+HOURS_PER_DAY = 24
+# How far back the nightly rebuild looks
+PROFILE_HISTORY_DAYS = 28
+# A cell/hour needs this many trips before its own speed is trusted
+MIN_SAMPLES = 5
+# Trips implying speeds outside this range (GPS glitches, forgotten completions) are ignored
+MIN_TRIP_SPEED_KMH = 3.0
+MAX_TRIP_SPEED_KMH = 120.0
+
+Point = Tuple[float, float]
+
+
+class SpeedProfileTable:
+    """
+    Learned travel speeds, in flat float arrays.
+
+    speeds holds one km/h value per (cell, hour), row-major by cell, 0.0 where there
+    was too little data. Lookups fall back from cell/hour to the cell's all-day
+    speed, then to the city-wide speed for the hour, then to AVERAGE_SPEED_KMH.
+    """
+
+    def __init__(
+        self,
+        cell_index: Dict[str, int],
+        speeds: array,
+        cell_speeds: array,
+        hour_speeds: array,
+        default_speed: float = AVERAGE_SPEED_KMH,
+    ):
+        self.cell_index = cell_index
+        self.speeds = speeds
+        self.cell_speeds = cell_speeds
+        self.hour_speeds = hour_speeds
+        self.default_speed = default_speed
+
+    @classmethod
+    def empty(cls) -> "SpeedProfileTable":
+        return cls({}, array("f"), array("f"), array("f", [0.0] * HOURS_PER_DAY))
+
+    def __len__(self) -> int:
+        return len(self.cell_index)
+
+
+class SpeedProfileBuilder:
+    """
+    Accumulates completed trips and turns them into a SpeedProfileTable.
+
+    Only a trip's endpoints and duration are known, so its average speed is
+    credited to every cell on the straight H3 line from pickup to dropoff, each
+    taking an equal share of the distance and time. Cells the road actually
+    passes through but the line misses learn nothing from that trip.
+    """
+
+    def __init__(self, resolution: int = ETA_H3_RESOLUTION):
+        self.resolution = resolution
+        # (cell, hour) -> [distance km, time h, trips]
+        self._totals: Dict[Tuple[str, int], list] = {}
+        self.trips = 0
+
+    def add_trip(self, pickup: Point, dropoff: Point, started_at: datetime, completed_at: datetime):
+        hours = (completed_at - started_at).total_seconds() / 3600
+        if hours <= 0:
+            return
+        distance_km = haversine_km(*pickup, *dropoff) * ROAD_DISTANCE_FACTOR
+        if not MIN_TRIP_SPEED_KMH <= distance_km / hours <= MAX_TRIP_SPEED_KMH:
+            return
+
+        cells = self._route_cells(pickup, dropoff)
+        for cell in cells:
+            totals = self._totals.setdefault((cell, started_at.hour), [0.0, 0.0, 0])
+            totals[0] += distance_km / len(cells)
+            totals[1] += hours / len(cells)
+            totals[2] += 1
+        self.trips += 1
+
+    def _route_cells(self, pickup: Point, dropoff: Point) -> list:
+        start = h3.geo_to_h3(pickup[0], pickup[1], self.resolution)
+        end = h3.geo_to_h3(dropoff[0], dropoff[1], self.resolution)
+        try:
+            return h3.h3_line(start, end)
+        except Exception:
+            # No line across a pentagon or between far-apart cells; keep the pickup cell
+            return [start]
+
+    def build(self) -> SpeedProfileTable:
+        # Speeds are total distance over total time, so long trips weigh in proportion
+        cell_index: Dict[str, int] = {}
+        for cell, _ in self._totals:
+            cell_index.setdefault(cell, len(cell_index))
+
+        speeds = array("f", [0.0] * (len(cell_index) * HOURS_PER_DAY))
+        cell_totals = [[0.0, 0.0, 0] for _ in cell_index]
+        hour_totals = [[0.0, 0.0, 0] for _ in range(HOURS_PER_DAY)]
+        for (cell, hour), (distance_km, hours, trips) in self._totals.items():
+            row = cell_index[cell]
+            if trips >= MIN_SAMPLES:
+                speeds[row * HOURS_PER_DAY + hour] = distance_km / hours
+            for totals in (cell_totals[row], hour_totals[hour]):
+                totals[0] += distance_km
+                totals[1] += hours
+                totals[2] += trips
+
+        def speed(totals) -> float:
+            return totals[0] / totals[1] if totals[2] >= MIN_SAMPLES else 0.0
+
+        return SpeedProfileTable(
+            cell_index,
+            speeds,
+            array("f", (speed(totals) for totals in cell_totals)),
+            array("f", (speed(totals) for totals in hour_totals)),
+        )
+
+
+class ETAEstimator:
+    """
+    Pickup ETAs from learned per-cell, per-hour speed profiles.
+
+    Nothing leaves the process: estimate_minutes() answers thousands of
+    origin -> destination pairs in one call from the in-memory table. The table
+    is rebuilt from recently completed rides by a nightly job and swapped in
+    whole, so readers never see a half-built one.
+    """
+
+    def __init__(self, resolution: int = ETA_H3_RESOLUTION):
+        self.resolution = resolution
+        self.table = SpeedProfileTable.empty()
+
+    def estimate_minutes(
+        self,
+        origins: Sequence[Point],
+        destination: Point,
+        at: Optional[datetime] = None,
+    ) -> array:
+        """Travel time in minutes from each origin to destination, in the order given."""
+        table = self.table
+        hour = (at or datetime.utcnow()).hour
+        speeds, cell_speeds, cell_index = table.speeds, table.cell_speeds, table.cell_index
+        fallback_speed = table.hour_speeds[hour] or table.default_speed
+        geo_to_h3, resolution = h3.geo_to_h3, self.resolution
+        dest_lat, dest_lng = destination
+
+        minutes = array("f", bytes(4 * len(origins)))
+        for i, (lat, lng) in enumerate(origins):
+            distance_km = haversine_km(lat, lng, dest_lat, dest_lng) * ROAD_DISTANCE_FACTOR
+            row = cell_index.get(geo_to_h3(lat, lng, resolution))
+            speed = 0.0
+            if row is not None:
+                speed = speeds[row * HOURS_PER_DAY + hour] or cell_speeds[row]
+            minutes[i] = distance_km / (speed or fallback_speed) * 60
+        return minutes
+
+    async def rebuild(self, days: int = PROFILE_HISTORY_DAYS, batch_size: int = 1000) -> int:
+        """
+        Scheduled job: relearn speed profiles from rides completed in the last `days` days.
+
+        Rides are streamed in batches, so memory stays flat however many there are.
+
+        Returns:
+            int: Number of trips learned from.
+        """
+        builder = SpeedProfileBuilder(self.resolution)
+        since = datetime.utcnow() - timedelta(days=days)
+        query = (
+            select(
+                Ride.pickup_latitude,
+                Ride.pickup_longitude,
+                Ride.dropoff_latitude,
+                Ride.dropoff_longitude,
+                Ride.started_at,
+                Ride.completed_at,
+            )
+            .where(
+                Ride.status == RideStatusEnum.COMPLETED,
+                Ride.completed_at >= since,
+                Ride.started_at.isnot(None),
+                Ride.pickup_latitude.isnot(None),
+                Ride.dropoff_latitude.isnot(None),
+            )
+            .execution_options(yield_per=batch_size)
+        )
+
+        loaded = False
+        async for db in get_async_db():
+            try:
+                result = await db.stream(query)
+                async for row in result:
+                    builder.add_trip(
+                        (row.pickup_latitude, row.pickup_longitude),
+                        (row.dropoff_latitude, row.dropoff_longitude),
+                        row.started_at,
+                        row.completed_at,
+                    )
+                loaded = True
+            except Exception as e:
+                logger.error(f"Error rebuilding ETA speed profiles: {e}")
+        # Keep serving the previous table if the read failed
+        if not loaded:
+            return 0
+
+        self.table = builder.build()
+        logger.info(f"ETA speed profiles rebuilt from {builder.trips} trip(s) across {len(self.table)} cell(s).")
+        return builder.trips
+
+
+# Instantiate the estimator
+eta_estimator = ETAEstimator()
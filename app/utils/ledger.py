@@ -0,0 +1,208 @@
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Optional, Union
+
+from fastapi import HTTPException
+from sqlalchemy import BigInteger, DateTime, cast, insert, literal, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from ..enums import WalletTransactionEnum
+from ..models import CompanyWallet, Transaction, Wallet
+
+
+# Balances and transaction amounts are stored in minor units (kobo/cents)
+MINOR_UNITS_PER_MAJOR = 100
+
+
+def to_minor(amount: Union[Decimal, float, int, str]) -> int:
+    """Convert a major-unit amount (e.g. 1500.75 naira) to minor units, rounding half up."""
+    minor = (Decimal(str(amount)) * MINOR_UNITS_PER_MAJOR).quantize(Decimal("1"), rounding=ROUND_HALF_UP)
+    return int(minor)
+
+
+def to_major(amount_minor: int) -> float:
+    return amount_minor / MINOR_UNITS_PER_MAJOR
+
+
+@dataclass
+class LedgerEntry:
+    transaction_id: int
+    account_number: str
+    amount_minor: int
+    balance_after_minor: int
+    transaction_type: WalletTransactionEnum
+    created_at: datetime
+
+    @property
+    def amount(self) -> float:
+        return to_major(self.amount_minor)
+
+    @property
+    def balance_after(self) -> float:
+        return to_major(self.balance_after_minor)
+
+
+async def _post(
+    db: AsyncSession,
+    model,
+    condition,
+    delta_minor: int,
+    transaction_type: WalletTransactionEnum,
+) -> Optional[LedgerEntry]:
+    """
+    Move a balance by delta_minor and record the transaction, or do nothing.
+
+    The balance change is a single conditional UPDATE; debits only match while the
+    balance covers them, so two concurrent debits can never both pass a stale check.
+    On PostgreSQL the UPDATE and the transaction INSERT go out as one statement
+    (a data-modifying CTE). Other databases get the same two statements back to back
+    in the caller's transaction.
+
+    Returns None when no wallet matched (missing, or not enough funds for a debit).
+    """
+    balance_change = update(model).where(condition)
+    if delta_minor < 0:
+        balance_change = balance_change.where(model.balance_minor >= -delta_minor)
+    balance_change = (
+        balance_change
+        .values(balance_minor=model.balance_minor + delta_minor)
+        .returning(model.id, model.account_number, model.balance_minor)
+    )
+
+    owner_column = Transaction.wallet_id if model is Wallet else Transaction.company_wallet_id
+    created_at = datetime.utcnow()
+    amount_minor = abs(delta_minor)
+
+    if db.get_bind().dialect.name == "postgresql":
+        updated = balance_change.cte("updated")
+        inserted = (
+            insert(Transaction)
+            .from_select(
+                [owner_column.key, "amount_minor", "balance_after_minor", "transaction_type", "created_at"],
+                select(
+                    updated.c.id,
+                    cast(literal(amount_minor), BigInteger),
+                    updated.c.balance_minor,
+                    cast(literal(transaction_type), Transaction.transaction_type.type),
+                    cast(literal(created_at), DateTime),
+                ),
+            )
+            .returning(Transaction.id, owner_column)
+            .cte("inserted")
+        )
+        row = (await db.execute(
+            select(inserted.c.id, updated.c.account_number, updated.c.balance_minor)
+            .select_from(inserted.join(updated, inserted.c[owner_column.key] == updated.c.id))
+        )).first()
+        if row is None:
+            return None
+        transaction_id, account_number, balance_after_minor = row
+    else:
+        row = (await db.execute(balance_change)).first()
+        if row is None:
+            return None
+        owner_id, account_number, balance_after_minor = row
+        transaction_id = (await db.execute(
+            insert(Transaction)
+            .values({
+                owner_column.key: owner_id,
+                "amount_minor": amount_minor,
+                "balance_after_minor": balance_after_minor,
+                "transaction_type": transaction_type,
+                "created_at": created_at,
+            })
+            .returning(Transaction.id)
+        )).scalar_one()
+
+    return LedgerEntry(
+        transaction_id=transaction_id,
+        account_number=account_number,
+        amount_minor=amount_minor,
+        balance_after_minor=balance_after_minor,
+        transaction_type=transaction_type,
+        created_at=created_at,
+    )
+
+
+def _wallet_condition(wallet_id: Optional[int], account_number: Optional[str], user_id: Optional[int]):
+    if wallet_id is not None:
+        return Wallet.id == wallet_id
+    if account_number is not None:
+        return Wallet.account_number == account_number
+    if user_id is not None:
+        return Wallet.user_id == user_id
+    raise ValueError("One of wallet_id, account_number or user_id is required.")
+
+
+def _check_amount(amount_minor: int):
+    if amount_minor <= 0:
+        raise HTTPException(status_code=400, detail="Amount must be greater than zero")
+
+
+async def credit_wallet(
+    db: AsyncSession,
+    amount_minor: int,
+    wallet_id: Optional[int] = None,
+    account_number: Optional[str] = None,
+    user_id: Optional[int] = None,
+    transaction_type: WalletTransactionEnum = WalletTransactionEnum.CREDIT,
+) -> LedgerEntry:
+    """
+    Add amount_minor to a wallet and record the transaction. Does not commit.
+
+    Raises:
+        HTTPException: 400 for a non-positive amount, 404 if the wallet does not exist.
+    """
+    _check_amount(amount_minor)
+    entry = await _post(db, Wallet, _wallet_condition(wallet_id, account_number, user_id), amount_minor, transaction_type)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Wallet not found")
+    return entry
+
+
+async def debit_wallet(
+    db: AsyncSession,
+    amount_minor: int,
+    wallet_id: Optional[int] = None,
+    account_number: Optional[str] = None,
+    user_id: Optional[int] = None,
+    transaction_type: WalletTransactionEnum = WalletTransactionEnum.DEBIT,
+) -> LedgerEntry:
+    """
+    Take amount_minor out of a wallet if the balance covers it, and record the transaction.
+    Does not commit.
+
+    Raises:
+        HTTPException: 400 for a non-positive amount or insufficient balance, 404 if
+        the wallet does not exist.
+    """
+    _check_amount(amount_minor)
+    condition = _wallet_condition(wallet_id, account_number, user_id)
+    entry = await _post(db, Wallet, condition, -amount_minor, transaction_type)
+    if entry is None:
+        # Only the failure path pays for finding out why
+        if await db.scalar(select(Wallet.id).where(condition)) is None:
+            raise HTTPException(status_code=404, detail="Wallet not found")
+        raise HTTPException(status_code=400, detail="Insufficient balance")
+    return entry
+
+
+async def credit_company_wallet(
+    db: AsyncSession,
+    amount_minor: int,
+    transaction_type: WalletTransactionEnum = WalletTransactionEnum.CREDIT,
+) -> LedgerEntry:
+    """
+    Add amount_minor to the company wallet and record the transaction. Does not commit.
+
+    Raises:
+        HTTPException: 404 if the company wallet has not been created.
+    """
+    _check_amount(amount_minor)
+    company_wallet_id = select(CompanyWallet.id).order_by(CompanyWallet.id).limit(1).scalar_subquery()
+    entry = await _post(db, CompanyWallet, CompanyWallet.id == company_wallet_id, amount_minor, transaction_type)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Company wallet not found")
+    return entry
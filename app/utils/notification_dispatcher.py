@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ONESIGNAL_API_URL = os.getenv("ONESIGNAL_API_URL", "https://onesignal.com/api/v1/notifications")
+ONESIGNAL_APP_ID = os.getenv("ONESIGNAL_APP_ID", "09a1effe-4f8e-4bfa-9823-bdbfc5cf2d53")
+ONESIGNAL_API_KEY = os.getenv("ONESIGNAL_API_KEY")
+
+# OneSignal accepts at most 2000 external ids per notification
+MAX_EXTERNAL_IDS_PER_REQUEST = 2000
+
+try:
+    import h2  # noqa: F401  (httpx only speaks HTTP/2 when h2 is installed)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+@dataclass
+class PendingNotification:
+    title: str
+    message: str
+    external_ids: List[str] = field(default_factory=list)
+    segment: Optional[str] = None
+    future: Optional[asyncio.Future] = None
+
+    @property
+    def content_key(self) -> Tuple[str, str, Optional[str]]:
+        # Notifications with the same key can share one OneSignal request
+        return self.title, self.message, self.segment
+
+
+class NotificationDispatcher:
+    """
+    Long-lived OneSignal sender.
+
+    Callers put notifications on a bounded queue and return immediately (or await the
+    delivery result). A single worker drains the queue in short windows, merges
+    notifications with identical content into one request whose external ids are
+    chunked to OneSignal's limit, and sends them over one pooled HTTP/2 client,
+    retrying 429/5xx and transport errors with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        api_url: str = ONESIGNAL_API_URL,
+        app_id: str = ONESIGNAL_APP_ID,
+        api_key: Optional[str] = ONESIGNAL_API_KEY,
+        max_queue_size: int = 10000,
+        batch_window: float = 0.05,
+        max_batch_size: int = 1000,
+        max_external_ids: int = MAX_EXTERNAL_IDS_PER_REQUEST,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        timeout: float = 10.0,
+    ):
+        self.api_url = api_url
+        self.app_id = app_id
+        self.api_key = api_key
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.max_external_ids = max_external_ids
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.client: Optional[httpx.AsyncClient] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Open the pooled HTTP client and start the worker task."""
+        self._ensure_started()
+
+    def _ensure_started(self):
+        # Synchronous so enqueue can start the worker and keep a reference to its task
+        if self._worker is not None and not self._worker.done():
+            return
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                headers={
+                    "Authorization": f"Basic {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+            )
+        self._worker = asyncio.create_task(self._run())
+        logger.info(f"Notification dispatcher started (http2={HTTP2_AVAILABLE}).")
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """Flush what is already queued (bounded by drain_timeout), then close the client."""
+        if self._worker is not None:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Notification dispatcher stopped with {self.queue.qsize()} notification(s) unsent.")
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def enqueue(
+        self,
+        title: str,
+        message: str,
+        external_ids: Optional[List[str]] = None,
+        segment: Optional[str] = None,
+    ) -> asyncio.Future:
+        """
+        Queue a notification without waiting for delivery.
+
+        Returns:
+            asyncio.Future: Resolves to the OneSignal response (or its error) once sent.
+
+        Raises:
+            HTTPException: 400 if no target is given, 503 if the queue is full.
+        """
+        if not external_ids and not segment:
+            raise HTTPException(
+                status_code=400,
+                detail="Either 'external_ids' or 'segment' must be provided.",
+            )
+
+        self._ensure_started()
+
+        future = asyncio.get_running_loop().create_future()
+        notification = PendingNotification(
+            title=title,
+            message=message,
+            external_ids=list(external_ids or []),
+            segment=segment,
+            future=future,
+        )
+        try:
+            self.queue.put_nowait(notification)
+        except asyncio.QueueFull:
+            raise HTTPException(status_code=503, detail="Notification queue is full, try again later.")
+
+        return future
+
+    async def send(
+        self,
+        title: str,
+        message: str,
+        external_ids: Optional[List[str]] = None,
+        segment: Optional[str] = None,
+    ) -> dict:
+        """Queue a notification and wait for OneSignal's response."""
+        return await self.enqueue(title, message, external_ids=external_ids, segment=segment)
+
+    async def _run(self):
+        while True:
+            first = await self.queue.get()
+            batch = [first]
+
+            # Collect everything that arrives within the batch window
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._dispatch_batch(batch)
+            except Exception as e:
+                logger.error(f"Unexpected error dispatching notifications: {e}")
+                for notification in batch:
+                    if not notification.future.done():
+                        notification.future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _dispatch_batch(self, batch: List[PendingNotification]):
+        groups: Dict[Tuple[str, str, Optional[str]], List[PendingNotification]] = {}
+        for notification in batch:
+            groups.setdefault(notification.content_key, []).append(notification)
+
+        await asyncio.gather(*(self._dispatch_group(group) for group in groups.values()))
+
+    async def _dispatch_group(self, group: List[PendingNotification]):
+        title, message, segment = group[0].content_key
+
+        # Merge external ids, keeping order and dropping duplicates
+        external_ids = list(dict.fromkeys(
+            external_id for notification in group for external_id in notification.external_ids
+        ))
+
+        payload = {
+            "app_id": self.app_id,
+            "headings": {"en": title},
+            "contents": {"en": message},
+        }
+        if segment:
+            payload["included_segments"] = [segment]
+
+        if not external_ids:
+            results = await asyncio.gather(self._post(payload), return_exceptions=True)
+            for notification in group:
+                self._resolve(notification, results)
+            return
+
+        chunks = [
+            external_ids[i:i + self.max_external_ids]
+            for i in range(0, len(external_ids), self.max_external_ids)
+        ]
+        results = await asyncio.gather(
+            *(self._post({**payload, "include_external_user_ids": chunk}) for chunk in chunks),
+            return_exceptions=True,
+        )
+
+        # Each caller gets the outcome of the chunk(s) holding its own recipients
+        chunk_of = {
+            external_id: index // self.max_external_ids for index, external_id in enumerate(external_ids)
+        }
+        for notification in group:
+            indexes = sorted({chunk_of[external_id] for external_id in notification.external_ids})
+            self._resolve(notification, [results[index] for index in indexes] or results)
+
+    @staticmethod
+    def _resolve(notification: PendingNotification, results: list):
+        """
+        Fail the caller if any of its chunks failed, else hand it its chunk's response
+        (the last one, if its recipients were split across chunks).
+        """
+        if notification.future.done():
+            return
+        error = next((result for result in results if isinstance(result, BaseException)), None)
+        if error is not None:
+            notification.future.set_exception(error)
+        else:
+            notification.future.set_result(results[-1])
+
+    async def _post(self, payload: dict) -> dict:
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.post(self.api_url, json=payload)
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    raise HTTPException(status_code=502, detail=f"Failed to reach OneSignal: {e}")
+            else:
+                if response.status_code == 200:
+                    response_data = response.json()
+                    if "errors" in response_data:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=f"OneSignal errors: {response_data['errors']} {response_data}",
+                        )
+                    return response_data
+
+                retryable = response.status_code == 429 or response.status_code >= 500
+                if not retryable or attempt >= self.max_retries:
+                    raise HTTPException(
+                        status_code=response.status_code,
+                        detail=f"Failed to send notification: {response.text}",
+                    )
+
+            delay = self.backoff_base * (2 ** attempt)
+            attempt += 1
+            logger.warning(f"Retrying OneSignal request in {delay:.2f}s (attempt {attempt}/{self.max_retries}).")
+            await asyncio.sleep(delay)
+
+
+# Instantiate the dispatcher
+notification_dispatcher = NotificationDispatcher()
@@ -0,0 +1,384 @@
+import logging
+import math
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import psutil
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_SUBMITTED
+from sqlalchemy import event
+
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets (upper bounds) for request latency, single statements, and statements per request
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_STATEMENT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+STATEMENT_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+JOB_DURATION_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels, value: float):
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (+Inf last), sum]
+        self._values: Dict[Labels, list] = {}
+
+    def observe(self, *labels, value: float):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames + ("le",), labels + (_format_value(bound),))
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            plain = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{plain} {_format_value(total)}"
+            yield f"{self.name}_count{plain} {cumulative}"
+
+
+# A collector is called at scrape time and yields (name, type, help, [(labels, value), ...])
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class MetricsRegistry:
+    """
+    Metrics in the Prometheus text format.
+
+    Metrics updated as things happen are registered once; values that are
+    cheaper to read when scraped (pool sizes, connection counts, process
+    stats, the components' own metrics() dicts) come from collectors.
+    """
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Collector] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def add_stats(self, component: str, stats: Callable[[], Dict[str, float]]):
+        """Expose a component's metrics() dict as one gauge per key, named <component>_<key>."""
+        def collect():
+            for key, value in stats().items():
+                if isinstance(value, (int, float)):
+                    yield f"{component}_{key}", "gauge", f"{key} reported by {component}.", [({}, value)]
+        self.add_collector(collect)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        for collector in self._collectors:
+            try:
+                for name, kind, documentation, samples in collector():
+                    lines.append(f"# HELP {name} {documentation}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for labels, value in samples:
+                        lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+# Instantiate the registry
+registry = MetricsRegistry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"),
+))
+http_request_db_statements = registry.register(Histogram(
+    "http_request_db_statements", "SQL statements run per HTTP request.", ("method", "route"),
+    buckets=STATEMENT_COUNT_BUCKETS,
+))
+http_request_db_seconds = registry.register(Histogram(
+    "http_request_db_seconds", "Time spent in SQL per HTTP request.", ("method", "route"),
+))
+db_statement_duration = registry.register(Histogram(
+    "db_statement_duration_seconds", "SQL statement execution time.", ("operation",),
+    buckets=DB_STATEMENT_BUCKETS,
+))
+db_statement_errors = registry.register(Counter(
+    "db_statement_errors_total", "SQL statements that raised.", ("operation",),
+))
+db_pool_checkout_duration = registry.register(Histogram(
+    "db_pool_checkout_seconds", "Time to get a connection from the pool, waiting included.",
+    buckets=DB_STATEMENT_BUCKETS,
+))
+websocket_connections = registry.register(Gauge(
+    "websocket_open_connections", "Open WebSocket connections by route.", ("route",),
+))
+websocket_messages = registry.register(Counter(
+    "websocket_messages_total", "WebSocket messages by route and direction.", ("route", "direction"),
+))
+scheduler_job_duration = registry.register(Histogram(
+    "scheduler_job_duration_seconds", "Scheduled job run time.", ("job",), buckets=JOB_DURATION_BUCKETS,
+))
+scheduler_job_runs = registry.register(Counter(
+    "scheduler_job_runs_total", "Scheduled job runs by outcome.", ("job", "outcome"),
+))
+
+
+@dataclass
+class RequestStats:
+    """What the current request has done so far; see current_request_stats()."""
+    statements: int = 0
+    db_seconds: float = 0.0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """The running request's stats, or None outside a request (scheduled jobs, workers)."""
+    return _request_stats.get()
+
+
+def _route_label(scope) -> str:
+    # The route template, not the raw path, so ids do not each get their own series
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request and counting WebSocket traffic, by route.
+
+    Each HTTP request gets a RequestStats that the SQLAlchemy hooks fill in, so
+    statements and database time are recorded per route as well.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            await self._http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def _http(self, scope, receive, send):
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            route = _route_label(scope)
+            http_request_duration.observe(scope["method"], route, str(status_code), value=elapsed)
+            http_request_db_statements.observe(scope["method"], route, value=stats.statements)
+            http_request_db_seconds.observe(scope["method"], route, value=stats.db_seconds)
+
+    async def _websocket(self, scope, receive, send):
+        accepted = False
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "websocket.receive":
+                websocket_messages.inc(_route_label(scope), "in")
+            return message
+
+        async def send_wrapper(message):
+            nonlocal accepted
+            if message["type"] == "websocket.accept":
+                accepted = True
+                websocket_connections.inc(_route_label(scope))
+            elif message["type"] == "websocket.send":
+                websocket_messages.inc(_route_label(scope), "out")
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            if accepted:
+                websocket_connections.inc(_route_label(scope), amount=-1)
+
+
+def _operation(statement: str) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+
+
+def instrument_engine(engine):
+    """
+    Time every SQL statement and pool checkout on a (sync) engine; for an async
+    engine pass async_engine.sync_engine.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        db_statement_duration.observe(_operation(statement), value=elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("query_start_time") if context.connection is not None else None
+        if starts:
+            starts.pop()
+        db_statement_errors.inc(_operation(context.statement or ""))
+
+    # Pool events only fire once a connection is handed out, so time the checkout call itself
+    pool = engine.pool
+    pool_connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return pool_connect()
+        finally:
+            db_pool_checkout_duration.observe(value=time.perf_counter() - start)
+
+    pool.connect = timed_connect
+
+    def collect_pool():
+        # NullPool and friends do not keep connections, so have nothing to report
+        for name, documentation, read in (
+            ("db_pool_size", "Connections the pool keeps open.", "size"),
+            ("db_pool_checked_out", "Connections currently checked out.", "checkedout"),
+            ("db_pool_overflow", "Connections open beyond the pool size.", "overflow"),
+        ):
+            if hasattr(pool, read):
+                yield name, "gauge", documentation, [({}, getattr(pool, read)())]
+
+    registry.add_collector(collect_pool)
+
+
+def instrument_scheduler(scheduler):
+    """Record how long each scheduled job runs and how it ends."""
+    started: Dict[str, float] = {}
+
+    def listener(job_event):
+        if job_event.code == EVENT_JOB_SUBMITTED:
+            started[job_event.job_id] = time.perf_counter()
+            return
+        start = started.pop(job_event.job_id, None)
+        if start is not None:
+            scheduler_job_duration.observe(job_event.job_id, value=time.perf_counter() - start)
+        scheduler_job_runs.inc(job_event.job_id, "error" if job_event.code == EVENT_JOB_ERROR else "success")
+
+    scheduler.add_listener(listener, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+
+
+def collect_websocket_managers(managers: Dict[str, Callable[[], int]]) -> Collector:
+    """Connection counts per WebSocket manager, each read by a callable at scrape time."""
+    def collect():
+        yield (
+            "websocket_manager_connections", "gauge", "Connections held by each WebSocket manager.",
+            [({"manager": name}, count()) for name, count in managers.items()],
+        )
+    return collect
+
+
+_process = psutil.Process(os.getpid())
+
+
+def collect_process():
+    with _process.oneshot():
+        cpu = _process.cpu_times()
+        memory = _process.memory_info()
+        samples = [
+            ("process_cpu_seconds_total", "counter", "User and system CPU time.", cpu.user + cpu.system),
+            ("process_resident_memory_bytes", "gauge", "Resident memory size.", memory.rss),
+            ("process_virtual_memory_bytes", "gauge", "Virtual memory size.", memory.vms),
+            ("process_start_time_seconds", "gauge", "Start time since the Unix epoch.", _process.create_time()),
+            ("process_threads", "gauge", "OS threads.", _process.num_threads()),
+        ]
+        if hasattr(_process, "num_fds"):
+            samples.append(("process_open_fds", "gauge", "Open file descriptors.", _process.num_fds()))
+    for name, kind, documentation, value in samples:
+        yield name, kind, documentation, [({}, value)]
+
+
+registry.add_collector(collect_process)
@@ -1,10 +1,20 @@
 # utils/otp.py
 from twilio.rest import Client
+import logging
+import os
 import random
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_async_db
 from ..models import OTPVerification
 
+logger = logging.getLogger(__name__)
+
+# How long otp_verifications rows (audit log and password reset codes) are kept after they expire
+OTP_RECORD_RETENTION_MINUTES = int(os.getenv("OTP_RECORD_RETENTION_MINUTES", "5"))
+
 # Generate OTP
 def generate_otp(length: int = 6) -> str:
     return ''.join([str(random.randint(0, 9)) for _ in range(length)])
@@ -14,14 +24,53 @@ def generate_otp_expiration(minutes: int = 5) -> datetime:
     return datetime.utcnow() + timedelta(minutes=minutes)
 
 
+# Audit log
+# The OTP store is the source of truth for pending registrations; when OTP_AUDIT_LOG
+# is on, issued and verified OTPs are also recorded in otp_verifications.
+def record_otp_issued(session: AsyncSession, entry):
+    session.add(OTPVerification(
+        full_name=entry.full_name,
+        user_name=entry.user_name,
+        phone_number=entry.phone_number,
+        email=entry.email,
+        otp_code=entry.otp_code,
+        expires_at=entry.expires_at,
+        is_verified=False,
+        hashed_password=entry.hashed_password,
+        referral_code=entry.referral_code,
+    ))
 
 
+async def record_otp_verified(session: AsyncSession, phone_number: str, otp_code: str):
+    await session.execute(
+        update(OTPVerification)
+        .where(
+            OTPVerification.phone_number == phone_number,
+            OTPVerification.otp_code == otp_code,
+            OTPVerification.is_verified == False
+        )
+        .values(is_verified=True)
+    )
 
 
+async def delete_expired_otp_records(retention_minutes: int = OTP_RECORD_RETENTION_MINUTES) -> int:
+    """
+    Scheduled job: delete otp_verifications rows that expired more than
+    retention_minutes ago, so the audit log cannot grow without bound.
 
-
-
-
-
-
-
+    Returns:
+        int: Number of rows deleted.
+    """
+    async for db in get_async_db():
+        try:
+            threshold = datetime.utcnow() - timedelta(minutes=retention_minutes)
+            result = await db.execute(delete(OTPVerification).where(OTPVerification.expires_at <= threshold))
+            await db.commit()
+            deleted = result.rowcount or 0
+            if deleted:
+                logger.info(f"Deleted {deleted} expired OTP record(s).")
+            return deleted
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error deleting expired OTP records: {e}")
+            return 0
@@ -0,0 +1,53 @@
+from .email_outbox import email_outbox
+from .sendchamp_gateway import get_sendchamp_gateway
+from fastapi import HTTPException
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+OTP_EMAIL_SUBJECT = "Your OTP Code for Verification"
+
+
+def build_otp_email(otp_code: str) -> str:
+    """Return the HTML body of the OTP email."""
+    return f"""
+    <html>
+        <body>
+            <h3>Your OTP Code</h3>
+            <p>Your Delevia OTP code is <strong>{otp_code}</strong>. It expires in 5 minutes.</p>
+        </body>
+    </html>
+    """
+
+
+async def deliver_otp_email(to_email: str, otp_code: str):
+    """
+    Queue an OTP email on the outbox.
+
+    Used directly by registration and password reset, so sending an OTP no longer
+    goes through an HTTP request back into this same service.
+
+    Raises:
+        HTTPException: If SendGrid is not configured or the outbox is full.
+    """
+    email_outbox.enqueue(
+        to_email=to_email,
+        subject=OTP_EMAIL_SUBJECT,
+        html_content=build_otp_email(otp_code),
+    )
+
+
+async def deliver_otp_sms(phone_number: str, otp_code: str):
+    """
+    Send an OTP by SMS through the shared Sendchamp gateway.
+
+    Raises:
+        HTTPException: If Sendchamp rejects the message.
+    """
+    message = f"Your Delevia OTP code is {otp_code}. It expires in 5 minutes."
+    _, errors = await get_sendchamp_gateway().send_sms([phone_number], message)
+
+    if errors:
+        logger.error(f"Sendchamp error sending OTP SMS: {errors}")
+        raise HTTPException(status_code=400, detail="Failed to send OTP SMS")
@@ -0,0 +1,407 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+import sys
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    redis_asyncio = None
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Any Redis-compatible server (Redis, KeyDB, Valkey, a local stand-in) enables the shared backend
+OTP_STORE_URL = os.getenv("OTP_STORE_URL")
+# Set to "true" to also record every issued OTP in the otp_verifications table
+OTP_AUDIT_LOG = os.getenv("OTP_AUDIT_LOG", "false").lower() == "true"
+
+# An unverified OTP lives as long as the code is valid; once verified, the
+# pre-registration is kept long enough for the user to finish signing up
+OTP_TTL_SECONDS = 5 * 60
+VERIFIED_TTL_SECONDS = 30 * 60
+
+
+@dataclass
+class PendingRegistration:
+    full_name: str
+    user_name: str
+    phone_number: str
+    email: str
+    otp_code: str
+    expires_at: datetime
+    hashed_password: str
+    referral_code: Optional[str] = None
+    is_verified: bool = False
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["expires_at"] = self.expires_at.isoformat()
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, raw) -> "PendingRegistration":
+        data = json.loads(raw)
+        data["expires_at"] = datetime.fromisoformat(data["expires_at"])
+        return cls(**data)
+
+
+class OTPStore(ABC):
+    """
+    Pending pre-registrations keyed by phone number, with secondary lookups by email
+    and username.
+
+    Entries expire on their own, so nothing has to sweep them. A phone number, email
+    or username can only belong to one live entry at a time.
+    """
+
+    @abstractmethod
+    async def add(self, entry: PendingRegistration, ttl: int = OTP_TTL_SECONDS) -> bool:
+        """Store entry for ttl seconds. Returns False if any of its identifiers is already taken."""
+
+    @abstractmethod
+    async def get(self, phone_number: str) -> Optional[PendingRegistration]:
+        pass
+
+    @abstractmethod
+    async def find(
+        self,
+        phone_number: Optional[str] = None,
+        email: Optional[str] = None,
+        user_name: Optional[str] = None,
+    ) -> Optional[PendingRegistration]:
+        """Return the live entry holding any of the given identifiers."""
+
+    @abstractmethod
+    async def mark_verified(self, entry: PendingRegistration, ttl: int) -> PendingRegistration:
+        pass
+
+    @abstractmethod
+    async def delete(self, phone_number: str):
+        pass
+
+    async def verify(
+        self,
+        phone_number: str,
+        otp_code: str,
+        ttl: int = VERIFIED_TTL_SECONDS,
+    ) -> Optional[PendingRegistration]:
+        """
+        Check otp_code against the pending entry for phone_number and mark it verified.
+
+        Returns:
+            PendingRegistration: The verified entry, or None if the code is wrong,
+            expired or already used.
+        """
+        entry = await self.get(phone_number)
+        if entry is None or entry.is_verified or entry.otp_code != otp_code:
+            return None
+        return await self.mark_verified(entry, ttl)
+
+    async def get_verified(self, phone_number: str) -> Optional[PendingRegistration]:
+        entry = await self.get(phone_number)
+        if entry is None or not entry.is_verified:
+            return None
+        return entry
+
+    async def close(self):
+        pass
+
+
+class MemoryOTPStore(OTPStore):
+    """
+    Process-local OTPStore.
+
+    Entries sit in one dict keyed by phone number, with email and username
+    indexes pointing at it. Expiry deadlines are kept in a heap and purged
+    whenever the store is touched, so every lookup is a dict hit.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._entries: Dict[str, Tuple[PendingRegistration, float]] = {}
+        self._by_email: Dict[str, str] = {}
+        self._by_user_name: Dict[str, str] = {}
+        self._deadlines: List[Tuple[float, str]] = []
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        self._purge_expired()
+        return len(self._entries)
+
+    def _purge_expired(self):
+        now = self._clock()
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, phone_number = heapq.heappop(self._deadlines)
+            stored = self._entries.get(phone_number)
+            # Entries re-stored with a later deadline leave stale heap items behind
+            if stored is not None and stored[1] == deadline:
+                self._remove(phone_number)
+
+    def _remove(self, phone_number: str):
+        entry, _ = self._entries.pop(phone_number)
+        if self._by_email.get(entry.email) == phone_number:
+            del self._by_email[entry.email]
+        if self._by_user_name.get(entry.user_name) == phone_number:
+            del self._by_user_name[entry.user_name]
+
+    def _store(self, entry: PendingRegistration, ttl: int):
+        deadline = self._clock() + ttl
+        self._entries[entry.phone_number] = (entry, deadline)
+        self._by_email[entry.email] = entry.phone_number
+        self._by_user_name[entry.user_name] = entry.phone_number
+        heapq.heappush(self._deadlines, (deadline, entry.phone_number))
+
+    async def add(self, entry: PendingRegistration, ttl: int = OTP_TTL_SECONDS) -> bool:
+        async with self._lock:
+            self._purge_expired()
+            if (
+                entry.phone_number in self._entries
+                or entry.email in self._by_email
+                or entry.user_name in self._by_user_name
+            ):
+                return False
+            self._store(entry, ttl)
+            return True
+
+    async def get(self, phone_number: str) -> Optional[PendingRegistration]:
+        self._purge_expired()
+        stored = self._entries.get(phone_number)
+        return stored[0] if stored else None
+
+    async def find(
+        self,
+        phone_number: Optional[str] = None,
+        email: Optional[str] = None,
+        user_name: Optional[str] = None,
+    ) -> Optional[PendingRegistration]:
+        self._purge_expired()
+        for key in (phone_number, self._by_email.get(email), self._by_user_name.get(user_name)):
+            if key in self._entries:
+                return self._entries[key][0]
+        return None
+
+    async def mark_verified(self, entry: PendingRegistration, ttl: int) -> PendingRegistration:
+        async with self._lock:
+            verified = replace(entry, is_verified=True)
+            self._store(verified, ttl)
+            return verified
+
+    async def verify(
+        self,
+        phone_number: str,
+        otp_code: str,
+        ttl: int = VERIFIED_TTL_SECONDS,
+    ) -> Optional[PendingRegistration]:
+        # Check and mark under one lock so a code can only be redeemed once
+        async with self._lock:
+            self._purge_expired()
+            stored = self._entries.get(phone_number)
+            if stored is None or stored[0].is_verified or stored[0].otp_code != otp_code:
+                return None
+            verified = replace(stored[0], is_verified=True)
+            self._store(verified, ttl)
+            return verified
+
+    async def delete(self, phone_number: str):
+        async with self._lock:
+            if phone_number in self._entries:
+                self._remove(phone_number)
+
+
+class RedisOTPStore(OTPStore):
+    """
+    OTPStore on a Redis-compatible server, shared by every worker.
+
+    Each entry is a JSON string under otp:phone:<phone_number>; otp:email:<email> and
+    otp:user:<user_name> hold the phone number. All three keys carry the same
+    expiry, so the server drops them together. Only plain GET/SET/MGET/DEL
+    commands are used, so any server speaking the Redis protocol will do.
+    """
+
+    def __init__(self, client, prefix: str = "otp"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisOTPStore":
+        if redis_asyncio is None:
+            raise RuntimeError("The redis package is required for OTP_STORE_URL.")
+        return cls(redis_asyncio.from_url(url, decode_responses=True), **kwargs)
+
+    def _phone_key(self, phone_number: str) -> str:
+        return f"{self.prefix}:phone:{phone_number}"
+
+    def _email_key(self, email: str) -> str:
+        return f"{self.prefix}:email:{email}"
+
+    def _user_key(self, user_name: str) -> str:
+        return f"{self.prefix}:user:{user_name}"
+
+    def _index_keys(self, entry: PendingRegistration) -> List[str]:
+        return [self._email_key(entry.email), self._user_key(entry.user_name)]
+
+    async def add(self, entry: PendingRegistration, ttl: int = OTP_TTL_SECONDS) -> bool:
+        # Claim the phone number first; SET NX makes concurrent registrations race safely
+        if not await self.client.set(self._phone_key(entry.phone_number), entry.to_json(), nx=True, ex=ttl):
+            return False
+
+        claimed = []
+        for key in self._index_keys(entry):
+            if not await self.client.set(key, entry.phone_number, nx=True, ex=ttl):
+                await self.client.delete(self._phone_key(entry.phone_number), *claimed)
+                return False
+            claimed.append(key)
+        return True
+
+    async def get(self, phone_number: str) -> Optional[PendingRegistration]:
+        raw = await self.client.get(self._phone_key(phone_number))
+        return PendingRegistration.from_json(raw) if raw else None
+
+    async def find(
+        self,
+        phone_number: Optional[str] = None,
+        email: Optional[str] = None,
+        user_name: Optional[str] = None,
+    ) -> Optional[PendingRegistration]:
+        keys = [
+            self._phone_key(phone_number or ""),
+            self._email_key(email or ""),
+            self._user_key(user_name or ""),
+        ]
+        raw_entry, email_owner, user_owner = await self.client.mget(keys)
+        if raw_entry and phone_number:
+            return PendingRegistration.from_json(raw_entry)
+        for owner in (email_owner if email else None, user_owner if user_name else None):
+            if owner:
+                entry = await self.get(owner)
+                if entry is not None:
+                    return entry
+        return None
+
+    async def mark_verified(self, entry: PendingRegistration, ttl: int) -> PendingRegistration:
+        verified = replace(entry, is_verified=True)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(self._phone_key(entry.phone_number), verified.to_json(), xx=True, ex=ttl)
+            for key in self._index_keys(entry):
+                pipe.expire(key, ttl)
+            await pipe.execute()
+        return verified
+
+    async def verify(
+        self,
+        phone_number: str,
+        otp_code: str,
+        ttl: int = VERIFIED_TTL_SECONDS,
+    ) -> Optional[PendingRegistration]:
+        # WATCH the entry so two requests racing on the same code cannot both redeem it
+        key = self._phone_key(phone_number)
+        async with self.client.pipeline(transaction=True) as pipe:
+            await pipe.watch(key)
+            raw = await pipe.get(key)
+            entry = PendingRegistration.from_json(raw) if raw else None
+            if entry is None or entry.is_verified or entry.otp_code != otp_code:
+                await pipe.unwatch()
+                return None
+
+            verified = replace(entry, is_verified=True)
+            pipe.multi()
+            pipe.set(key, verified.to_json(), xx=True, ex=ttl)
+            for index_key in self._index_keys(entry):
+                pipe.expire(index_key, ttl)
+            try:
+                await pipe.execute()
+            except redis_asyncio.WatchError:
+                return None
+        return verified
+
+    async def delete(self, phone_number: str):
+        entry = await self.get(phone_number)
+        keys = [self._phone_key(phone_number)]
+        if entry is not None:
+            keys.extend(self._index_keys(entry))
+        await self.client.delete(*keys)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def configured_worker_count(argv: Optional[List[str]] = None) -> int:
+    """
+    Number of server worker processes, from WEB_CONCURRENCY (read by uvicorn and
+    gunicorn) or a --workers/-w option on the command line, which uvicorn and
+    gunicorn workers inherit. 1 when neither is set.
+    """
+    argv = sys.argv if argv is None else argv
+    count = os.getenv("WEB_CONCURRENCY")
+    for index, arg in enumerate(argv):
+        if arg in ("--workers", "-w") and index + 1 < len(argv):
+            count = argv[index + 1]
+        elif arg.startswith("--workers="):
+            count = arg.split("=", 1)[1]
+    try:
+        return max(1, int(count)) if count else 1
+    except ValueError:
+        return 1
+
+
+def create_otp_store() -> OTPStore:
+    if OTP_STORE_URL:
+        logger.info("Using Redis-compatible OTP store.")
+        return RedisOTPStore.from_url(OTP_STORE_URL)
+
+    # An OTP issued by one worker could not be verified by another
+    workers = configured_worker_count()
+    if workers > 1:
+        raise RuntimeError(
+            f"OTP_STORE_URL must be set when running {workers} workers: "
+            "the in-memory OTP store is per process."
+        )
+    logger.warning("Using the in-memory OTP store; set OTP_STORE_URL before running more than one worker.")
+    return MemoryOTPStore()
+
+
+otp_store: OTPStore = create_otp_store()
+
+
+def get_otp_store() -> OTPStore:
+    return otp_store
+
+
+def set_otp_store(store: OTPStore):
+    """Swap the process-wide store, e.g. for a MemoryOTPStore in tests."""
+    global otp_store
+    otp_store = store
+
+
+def new_pending_registration(
+    full_name: str,
+    user_name: str,
+    phone_number: str,
+    email: str,
+    otp_code: str,
+    hashed_password: str,
+    referral_code: Optional[str] = None,
+    ttl: int = OTP_TTL_SECONDS,
+) -> PendingRegistration:
+    return PendingRegistration(
+        full_name=full_name,
+        user_name=user_name,
+        phone_number=phone_number,
+        email=email,
+        otp_code=otp_code,
+        expires_at=datetime.utcnow() + timedelta(seconds=ttl),
+        hashed_password=hashed_password,
+        referral_code=referral_code,
+    )
@@ -1,14 +1,10 @@
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
-import os
+from .email_outbox import email_outbox
 
-# Configure SendGrid API Key
-SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
-SENDGRID_EMAIL_SENDER = "Delevia <no-reply@delevia.com>"
 
-def send_email(to_email: str, subject: str, html_content: str):
+async def send_email(to_email: str, subject: str, html_content: str):
     """
-    Sends an email using SendGrid.
+    Sends an email straight away (not through the outbox queue), so an alert is
+    never left in memory waiting to be sent.
     
     Args:
         to_email (str): Recipient's email address.
@@ -16,31 +12,13 @@ def send_email(to_email: str, subject: str, html_content: str):
         html_content (str): HTML content of the email.
     
     Returns:
-        dict: Confirmation message if the email is sent successfully.
+        dict: Confirmation message once the email is sent.
+
+    Raises:
+        HTTPException: If SendGrid is not configured or every attempt failed.
     """
-    if not SENDGRID_API_KEY:
-        raise Exception("SendGrid API key is not configured")
-    
-    message = Mail(
-        from_email=SENDGRID_EMAIL_SENDER,
-        to_emails=to_email,
-        subject=subject,
-        html_content=html_content
-    )
-    
-    try:
-        sg = SendGridAPIClient(SENDGRID_API_KEY)
-        response = sg.send(message)
-        
-        # Check if the response status code indicates success
-        if response.status_code not in [200, 202]:
-            raise Exception(f"SendGrid response error: {response.status_code}")
-        
-        return {"message": "Email sent successfully"}
-    
-    except Exception as e:
-        print(f"Error sending email: {str(e)}")
-        raise Exception("An error occurred while sending the email")
+    await email_outbox.send_now(to_email=to_email, subject=subject, html_content=html_content)
+    return {"message": "Email sent successfully"}
 
 
 async def send_panic_notification_email(
@@ -74,4 +52,4 @@ async def send_panic_notification_email(
     </html>
     """
     # Use the working email function to send the email
-    return send_email(to_email=to_email, subject=subject, html_content=html_content)
+    return await send_email(to_email=to_email, subject=subject, html_content=html_content)
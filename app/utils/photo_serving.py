@@ -0,0 +1,223 @@
+import hashlib
+import os
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import anyio
+from fastapi import HTTPException
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+
+# Directories (relative to the working directory) holding profile and driver photos.
+# Anything outside these roots is never served; identity and vehicle documents
+# (nin_photos, proof_of_ownership, insurance and inspection files) stay private.
+PHOTO_ROOTS = (
+    "profile_photos",
+    "assets/riders/profile_photos",
+    "assets/drivers/driver_photos",
+    "assets/temporal_photos",
+)
+
+PHOTO_URL_PREFIX = "/photos"
+
+# Photo files are never rewritten in place (every upload gets a new timestamped name),
+# so clients may keep them for a year without revalidating.
+PHOTO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+CHUNK_SIZE = 64 * 1024
+
+# (path, mtime_ns, size) -> strong ETag, so each file is hashed once per version
+_etag_cache: Dict[Tuple[str, int, int], str] = {}
+_ETAG_CACHE_MAX_ENTRIES = 10000
+
+
+def build_photo_url(photo_path: Optional[str]) -> Optional[str]:
+    """Turn a stored photo path such as './assets/riders/profile_photos/x.jpg' into its serving URL."""
+    if not photo_path:
+        return None
+    relative = Path(os.path.normpath(photo_path)).as_posix().lstrip("/")
+    return f"{PHOTO_URL_PREFIX}/{relative}"
+
+
+def resolve_photo_path(photo_path: str) -> Path:
+    """
+    Resolve a requested photo path to a regular file inside one of PHOTO_ROOTS.
+
+    Raises:
+        HTTPException: 404 if the path escapes the photo roots or is not a file.
+    """
+    base = Path.cwd().resolve()
+    candidate = (base / photo_path).resolve()
+
+    allowed = any(
+        candidate.is_relative_to(base / root) for root in PHOTO_ROOTS
+    )
+    if not allowed or not candidate.is_file():
+        raise HTTPException(status_code=404, detail="Photo not found")
+
+    return candidate
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as photo:
+        for chunk in iter(lambda: photo.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def get_photo_etag(path: Path, stat_result: os.stat_result) -> str:
+    """Return a strong ETag derived from the file's content hash, hashing only when the file changed."""
+    key = (str(path), stat_result.st_mtime_ns, stat_result.st_size)
+    etag = _etag_cache.get(key)
+    if etag is None:
+        content_hash = await anyio.to_thread.run_sync(_hash_file, str(path))
+        etag = f'"{content_hash}"'
+        if len(_etag_cache) >= _ETAG_CACHE_MAX_ENTRIES:
+            _etag_cache.clear()
+        _etag_cache[key] = etag
+    return etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against the current ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses weak comparison, so a W/ prefix still matches
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def parse_range_header(range_header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single 'bytes=start-end' range into an inclusive (start, end) pair.
+
+    Returns None when the header is absent, malformed (including a last byte
+    before the first) or asks for several ranges, in which case the whole file
+    is served, as RFC 9110 asks for ranges that cannot be parsed.
+
+    Raises:
+        HTTPException: 416 if the range starts beyond the end of the file.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+
+    start_text, end_text = (part.strip() for part in spec.split("-", 1))
+    try:
+        if start_text == "":
+            # Suffix range: the last N bytes
+            suffix_length = int(end_text)
+            if suffix_length <= 0:
+                raise ValueError
+            start = max(file_size - suffix_length, 0)
+            end = file_size - 1
+        else:
+            start = int(start_text)
+            end = int(end_text) if end_text else file_size - 1
+            if start < 0 or end < start:
+                raise ValueError
+            end = min(end, file_size - 1)
+    except ValueError:
+        return None
+
+    if start >= file_size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{file_size}"},
+        )
+
+    return start, end
+
+
+class PhotoFileResponse(Response):
+    """
+    File response for photos that serves either the whole file or one byte range.
+
+    When the ASGI server advertises the 'http.response.zerocopysend' extension the
+    body is handed over as a file descriptor so the server can use sendfile();
+    otherwise the file is streamed in chunks from a worker thread.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        stat_result: os.stat_result,
+        headers: Dict[str, str],
+        byte_range: Optional[Tuple[int, int]] = None,
+    ) -> None:
+        self.path = path
+        self.media_type = guess_type(str(path))[0] or "application/octet-stream"
+        self.background = None
+
+        file_size = stat_result.st_size
+        if byte_range is None:
+            self.status_code = 200
+            self.offset, self.count = 0, file_size
+        else:
+            start, end = byte_range
+            self.status_code = 206
+            self.offset, self.count = start, end - start + 1
+
+        self.init_headers(headers)
+        self.headers["accept-ranges"] = "bytes"
+        self.headers["content-length"] = str(self.count)
+        if byte_range is not None:
+            self.headers["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{file_size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+
+        if scope["method"].upper() == "HEAD" or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            # Opening can block on slow disks, so keep it off the event loop
+            photo = await anyio.to_thread.run_sync(open, self.path, "rb")
+            try:
+                await send(
+                    {
+                        "type": "http.response.zerocopysend",
+                        "file": photo.fileno(),
+                        "offset": self.offset,
+                        "count": self.count,
+                        "more_body": False,
+                    }
+                )
+            finally:
+                await anyio.to_thread.run_sync(photo.close)
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as photo:
+            await photo.seek(self.offset)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await photo.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    }
+                )
+            if remaining > 0:
+                # File shrank underneath us; close the body rather than hang the client
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,166 @@
+import json
+import logging
+import math
+import os
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+import h3
+from dotenv import load_dotenv
+
+from .surge import SURGE_H3_RESOLUTION, SurgeTracker, surge_tracker
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Order of the ride types in every tariff vector
+RIDE_TYPES = ("STANDARD", "VIP")
+
+# Pickup cells are looked up at this H3 resolution (~5 km² hexagons); the surge
+# tracker counts in the same cells so one lookup serves both
+PRICING_H3_RESOLUTION = SURGE_H3_RESOLUTION
+# Optional JSON file of priced zones, see load_zones()
+PRICING_ZONES_FILE = os.getenv("PRICING_ZONES_FILE")
+
+# Straight-line distance is shorter than the road; until routes are fetched, pad it
+ROAD_DISTANCE_FACTOR = 1.3
+# Average city speed used to turn distance into an expected trip time
+AVERAGE_SPEED_KMH = 25.0
+
+EARTH_RADIUS_KM = 6371.0
+
+
+@dataclass(frozen=True)
+class Tariff:
+    base_fare: float
+    per_km: float
+    per_minute: float
+    minimum_fare: float
+
+
+DEFAULT_TARIFFS: Dict[str, Tariff] = {
+    "STANDARD": Tariff(base_fare=100.0, per_km=40.0, per_minute=5.0, minimum_fare=200.0),
+    "VIP": Tariff(base_fare=150.0, per_km=60.0, per_minute=8.0, minimum_fare=300.0),
+}
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _tariff_vector(tariffs: Dict[str, Tariff], multiplier: float = 1.0) -> array:
+    """
+    Flatten per-ride-type tariffs into one vector laid out coefficient-major:
+    [base x types, per_km x types, per_minute x types, minimum x types].
+    """
+    vector = array("d")
+    for name in ("base_fare", "per_km", "per_minute", "minimum_fare"):
+        vector.extend(getattr(tariffs[ride_type], name) * multiplier for ride_type in RIDE_TYPES)
+    return vector
+
+
+@dataclass(frozen=True)
+class Quote:
+    distance_km: float
+    duration_minutes: float
+    zone: Optional[str]
+    surge_multiplier: float
+    prices: Dict[str, float]
+
+
+class PricingEngine:
+    """
+    Fare quotes from distance, expected trip time, ride type and pickup zone.
+
+    Tariffs are precomputed into one flat vector per priced H3 cell when zones
+    are loaded, so quoting is a cell lookup plus a few multiply-adds that price
+    every ride type at once; there is no I/O and nothing to parse per request.
+    Pickups outside every zone use the default vector. The pickup cell's surge
+    multiplier, if a surge tracker is attached, scales the final prices.
+    """
+
+    def __init__(
+        self,
+        tariffs: Dict[str, Tariff] = DEFAULT_TARIFFS,
+        resolution: int = PRICING_H3_RESOLUTION,
+        surge: Optional[SurgeTracker] = None,
+    ):
+        self.resolution = resolution
+        self.surge = surge
+        self.default_vector = _tariff_vector(tariffs)
+        self._tariffs = tariffs
+        self._cells: Dict[str, Tuple[str, array]] = {}
+
+    def load_zones(self, zones: Iterable[dict]):
+        """
+        Precompute tariff vectors for priced zones.
+
+        Each zone is a dict with a name, a centre (lat, lng), radius_rings (how many
+        rings of H3 cells around the centre it covers) and a multiplier applied to
+        the default tariffs. Where zones overlap, the later one wins.
+        """
+        cells: Dict[str, Tuple[str, array]] = {}
+        for zone in zones:
+            vector = _tariff_vector(self._tariffs, float(zone.get("multiplier", 1.0)))
+            centre = h3.geo_to_h3(zone["lat"], zone["lng"], self.resolution)
+            for cell in h3.k_ring(centre, int(zone.get("radius_rings", 0))):
+                cells[cell] = (zone["name"], vector)
+        self._cells = cells
+        logger.info(f"Pricing engine loaded tariffs for {len(cells)} zone cell(s).")
+
+    def load_zones_file(self, path: str):
+        with open(path) as zones_file:
+            self.load_zones(json.load(zones_file))
+
+    def estimate(self, pickup: Tuple[float, float], dropoff: Tuple[float, float]) -> Tuple[float, float]:
+        """Expected road distance (km) and trip time (minutes) between two points."""
+        distance_km = haversine_km(*pickup, *dropoff) * ROAD_DISTANCE_FACTOR
+        return distance_km, distance_km / AVERAGE_SPEED_KMH * 60
+
+    def quote(
+        self,
+        pickup: Tuple[float, float],
+        dropoff: Tuple[float, float],
+        distance_km: Optional[float] = None,
+        duration_minutes: Optional[float] = None,
+    ) -> Quote:
+        """
+        Price every ride type for a trip. Pass distance_km/duration_minutes to use a
+        known route instead of the straight-line estimate.
+        """
+        if distance_km is None or duration_minutes is None:
+            estimated_distance, estimated_duration = self.estimate(pickup, dropoff)
+            distance_km = estimated_distance if distance_km is None else distance_km
+            duration_minutes = estimated_duration if duration_minutes is None else duration_minutes
+
+        cell = h3.geo_to_h3(pickup[0], pickup[1], self.resolution)
+        zone, vector = self._cells.get(cell, (None, self.default_vector))
+        surge_multiplier = self.surge.multiplier(cell) if self.surge is not None else 1.0
+
+        n = len(RIDE_TYPES)
+        prices = {}
+        for i, ride_type in enumerate(RIDE_TYPES):
+            price = vector[i] + vector[n + i] * distance_km + vector[2 * n + i] * duration_minutes
+            prices[ride_type] = round(max(price, vector[3 * n + i]) * surge_multiplier, 2)
+
+        return Quote(
+            distance_km=distance_km,
+            duration_minutes=duration_minutes,
+            zone=zone,
+            surge_multiplier=surge_multiplier,
+            prices=prices,
+        )
+
+    def minimum_fare(self, ride_type: str) -> float:
+        return self.default_vector[3 * len(RIDE_TYPES) + RIDE_TYPES.index(ride_type)]
+
+
+# Instantiate the engine
+pricing_engine = PricingEngine(surge=surge_tracker)
+if PRICING_ZONES_FILE:
+    pricing_engine.load_zones_file(PRICING_ZONES_FILE)
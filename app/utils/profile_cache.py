@@ -0,0 +1,87 @@
+import asyncio
+import hashlib
+import time
+from typing import Awaitable, Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+
+Profile = TypeVar("Profile")
+
+
+class ProfileCache(Generic[Profile]):
+    """
+    Read-through, per-process cache of profiles loaded by id.
+
+    Entries live for ttl seconds. Concurrent misses for the same id share one
+    load (single flight), so a burst of requests for the same profile costs at
+    most one query. Writers call invalidate() after committing a change; a load
+    that was already running when the profile changed is not stored, so it
+    cannot put the old profile back. Other app instances see the change when
+    their entry expires.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[int], Awaitable[Optional[Profile]]],
+        ttl: float = 60.0,
+        max_entries: int = 10000,
+    ):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[int, Tuple[float, Profile]] = {}
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self._versions: Dict[int, int] = {}
+        self.counters: Dict[str, int] = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    async def get(self, profile_id: int) -> Optional[Profile]:
+        entry = self._entries.get(profile_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self.counters["hits"] += 1
+            return entry[1]
+
+        inflight = self._inflight.get(profile_id)
+        if inflight is not None:
+            self.counters["coalesced"] += 1
+            # shield: one caller going away must not cancel the load for the others
+            return await asyncio.shield(inflight)
+
+        self.counters["misses"] += 1
+        load = asyncio.ensure_future(self._load(profile_id))
+        self._inflight[profile_id] = load
+        load.add_done_callback(lambda done: self._forget_load(profile_id, done))
+        return await asyncio.shield(load)
+
+    async def _load(self, profile_id: int) -> Optional[Profile]:
+        version = self._versions.get(profile_id, 0)
+        profile = await self.loader(profile_id)
+        if profile is not None and self._versions.get(profile_id, 0) == version:
+            if len(self._entries) >= self.max_entries:
+                self._evict()
+            self._entries[profile_id] = (time.monotonic() + self.ttl, profile)
+        return profile
+
+    def _forget_load(self, profile_id: int, load: asyncio.Future):
+        if self._inflight.get(profile_id) is load:
+            del self._inflight[profile_id]
+
+    def _evict(self):
+        now = time.monotonic()
+        for profile_id in [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[profile_id]
+        if len(self._entries) >= self.max_entries:
+            self._entries.clear()
+
+    def invalidate(self, profile_id: int):
+        """Forget a profile; call after committing any change to it."""
+        self._entries.pop(profile_id, None)
+        self._versions[profile_id] = self._versions.get(profile_id, 0) + 1
+        # A load in flight may have read the old row; let the next caller start afresh
+        self._inflight.pop(profile_id, None)
+
+    def metrics(self) -> Dict[str, int]:
+        return {**self.counters, "entries": len(self._entries)}
+
+
+def make_etag(*values) -> str:
+    """A strong ETag over a profile's values; equal values give the same tag in every process."""
+    return '"' + hashlib.blake2b(repr(values).encode(), digest_size=12).hexdigest() + '"'
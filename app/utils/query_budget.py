@@ -0,0 +1,188 @@
+import asyncio
+import functools
+import inspect
+import logging
+import os
+import sys
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import greenlet
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# off: nothing is checked; warn: log over-budget blocks (staging); raise: fail them (tests)
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "off").lower()
+# Budget for requests whose endpoint does not declare one
+DEFAULT_QUERY_BUDGET = int(os.getenv("QUERY_BUDGET_DEFAULT", "20"))
+# How many of the app's own frames to keep per recorded statement
+CALL_SITE_DEPTH = 3
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+@dataclass
+class RecordedStatement:
+    statement: str
+    call_site: List[str]
+
+
+def _call_site() -> List[str]:
+    """
+    The innermost app frames (file:line in function) that led to the current statement.
+
+    Cursor events run in SQLAlchemy's greenlet, whose stack stops at the
+    driver call; the awaiting app code is on the parent greenlet's stack.
+    """
+    site: List[str] = []
+    frames = [sys._getframe(1)]
+    parent = greenlet.getcurrent().parent
+    if parent is not None and parent.gr_frame is not None:
+        frames.append(parent.gr_frame)
+    for frame in frames:
+        while frame is not None and len(site) < CALL_SITE_DEPTH:
+            filename = os.path.abspath(frame.f_code.co_filename)
+            if filename.startswith(APP_DIR) and filename != _THIS_FILE and "site-packages" not in filename:
+                site.append(f"{os.path.relpath(filename, os.path.dirname(APP_DIR))}:{frame.f_lineno} in {frame.f_code.co_name}")
+            frame = frame.f_back
+    return site
+
+
+_active_budgets: ContextVar[Tuple["QueryBudget", ...]] = ContextVar("active_query_budgets", default=())
+
+
+class QueryBudget:
+    """
+    Counts the SQL statements run inside a block and reports blocks that run more
+    than `limit`, with each statement and where it came from.
+
+    Use it as a context manager around a block, or as a decorator on a function
+    or endpoint:
+
+        with query_budget(3, "load ride parties"):
+            ...
+
+        @query_budget(4)
+        async def complete_ride(...):
+
+    Budgets nest; a statement counts against every enclosing one. Tasks spawned
+    inside a block inherit it, but their statements are not counted. What happens
+    on overrun follows QUERY_BUDGET_MODE, and nothing is counted when it is off.
+    install_query_budget() must have hooked the engine.
+    """
+
+    def __init__(self, limit: Optional[int], name: Optional[str] = None):
+        self.limit = limit
+        self.name = name
+        self.statements: List[RecordedStatement] = []
+        self._token = None
+        self._task = None
+
+    @staticmethod
+    def _current_task():
+        try:
+            return asyncio.current_task()
+        except RuntimeError:
+            return None
+
+    def __enter__(self) -> "QueryBudget":
+        if QUERY_BUDGET_MODE != "off":
+            self._task = self._current_task()
+            self._token = _active_budgets.set(_active_budgets.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._token is None:
+            return False
+        _active_budgets.reset(self._token)
+        self._token = None
+        # Do not bury an exception that is already on its way out
+        if exc_type is None and self.limit is not None and len(self.statements) > self.limit:
+            self.report()
+        return False
+
+    def __call__(self, func):
+        name = self.name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with QueryBudget(self.limit, name):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with QueryBudget(self.limit, name):
+                    return func(*args, **kwargs)
+
+        # Lets the request middleware leave an endpoint to its own budget
+        wrapper.__query_budget__ = self.limit
+        return wrapper
+
+    def report(self):
+        lines = [f"Query budget exceeded for {self.name or 'block'}: {len(self.statements)} statements, budget {self.limit}"]
+        for number, recorded in enumerate(self.statements, 1):
+            lines.append(f"  {number}. {recorded.statement}")
+            lines.extend(f"       at {site}" for site in recorded.call_site)
+        message = "\n".join(lines)
+        if QUERY_BUDGET_MODE == "raise":
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+def query_budget(limit: int, name: Optional[str] = None) -> QueryBudget:
+    return QueryBudget(limit, name)
+
+
+def install_query_budget(engine):
+    """Record statements against the active budgets; for an async engine pass async_engine.sync_engine."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        budgets = _active_budgets.get()
+        if budgets:
+            # Background tasks started inside a budget copy it with the context; skip their statements
+            task = QueryBudget._current_task()
+            budgets = [budget for budget in budgets if budget._task is task]
+        if budgets:
+            recorded = RecordedStatement(" ".join(statement.split())[:300], _call_site())
+            for budget in budgets:
+                budget.statements.append(recorded)
+
+
+class QueryBudgetMiddleware:
+    """
+    Holds every HTTP request to DEFAULT_QUERY_BUDGET statements, unless its
+    endpoint declares its own budget with @query_budget. Overruns are found
+    once the response has gone out, so in raise mode the error surfaces in
+    the server (and in a test client) rather than in the response.
+    """
+
+    def __init__(self, app, default_budget: int = DEFAULT_QUERY_BUDGET):
+        self.app = app
+        self.default_budget = default_budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget = QueryBudget(self.default_budget)
+        with budget:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                route = scope.get("route")
+                budget.name = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+                if getattr(getattr(route, "endpoint", None), "__query_budget__", None) is not None:
+                    budget.limit = None
@@ -0,0 +1,87 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .pricing import Quote
+
+
+load_dotenv()
+
+# How long a fare quoted at request time stays locked for selection and confirmation
+QUOTE_VALIDITY_SECONDS = float(os.getenv("QUOTE_VALIDITY_SECONDS", "300"))
+# Coordinates are compared at this many decimals (5 is about 1 m)
+COORDINATE_PRECISION = 5
+
+Point = Tuple[float, float]
+
+
+@dataclass(frozen=True)
+class LockedQuote:
+    rider_id: int
+    pickup: Point
+    dropoff: Point
+    quote: Quote
+
+    def matches(self, pickup: Point, dropoff: Point) -> bool:
+        """True if the trip is still the one that was quoted."""
+        def same(a: Point, b: Point) -> bool:
+            return all(round(x, COORDINATE_PRECISION) == round(y, COORDINATE_PRECISION) for x, y in zip(a, b))
+        return same(self.pickup, pickup) and same(self.dropoff, dropoff)
+
+
+class QuoteStore:
+    """
+    Fares quoted by request_ride, kept per ride for a short validity window.
+
+    select_ride_type and confirm_ride read the locked fare from here instead of
+    pricing the trip again, so the rider pays what they were shown. Every entry
+    lives for the same ttl, so insertion order is expiry order and expiring only
+    ever looks at the oldest entries. A missing or expired quote means the
+    caller re-prices. Quotes are per process; a request that lands on another
+    app instance re-prices the same way.
+    """
+
+    def __init__(self, ttl: float = QUOTE_VALIDITY_SECONDS, max_entries: int = 100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[float, LockedQuote]]" = OrderedDict()
+        self.counters: Dict[str, int] = {"locked": 0, "hits": 0, "misses": 0}
+
+    def _expire(self, now: float):
+        while self._entries:
+            ride_id, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[ride_id]
+
+    def lock(self, ride_id: int, rider_id: int, pickup: Point, dropoff: Point, quote: Quote):
+        now = time.monotonic()
+        self._entries.pop(ride_id, None)
+        self._entries[ride_id] = (now + self.ttl, LockedQuote(rider_id, pickup, dropoff, quote))
+        self.counters["locked"] += 1
+        self._expire(now)
+
+    def get(self, ride_id: int) -> Optional[LockedQuote]:
+        """The ride's locked quote, or None if there is none or it has expired."""
+        self._expire(time.monotonic())
+        entry = self._entries.get(ride_id)
+        if entry is None:
+            self.counters["misses"] += 1
+            return None
+        self.counters["hits"] += 1
+        return entry[1]
+
+    def discard(self, ride_id: int):
+        """Drop a ride's quote once its fare is settled on the ride or the ride is cancelled."""
+        self._entries.pop(ride_id, None)
+
+    def metrics(self) -> Dict[str, int]:
+        return {**self.counters, "entries": len(self._entries)}
+
+
+# Instantiate the store
+quote_store = QuoteStore()
@@ -0,0 +1,78 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from fastapi import HTTPException, Request, status
+
+
+# Number of reverse proxies in front of the app that append to X-Forwarded-For.
+# 0 (the default) ignores the header, which any client can set.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+
+class TokenBucketLimiter:
+    """
+    Per-client token buckets: each client may make `burst` requests at once and
+    `rate` per second after that.
+
+    Buckets are kept in last-used order and capped at max_clients, dropping the
+    least recently seen (a dropped client simply starts with a full bucket).
+    Counts are per process.
+
+    Behind trusted_proxy_hops proxies the socket peer is the nearest proxy, so
+    the client is taken from X-Forwarded-For instead: the address the outermost
+    trusted proxy saw, counting hops from the right, since anything to its
+    left was written by the client.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 100000, trusted_proxy_hops: int = TRUSTED_PROXY_HOPS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.trusted_proxy_hops = trusted_proxy_hops
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.counters: Dict[str, int] = {"allowed": 0, "limited": 0}
+
+    def acquire(self, client: str) -> float:
+        """Take a token for the client. Returns 0 if allowed, else seconds until a token is free."""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(client, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated_at) * self.rate)
+
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+            self.counters["allowed"] += 1
+        else:
+            wait = (1 - tokens) / self.rate
+            self.counters["limited"] += 1
+
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def client_address(self, request: Request) -> str:
+        if self.trusted_proxy_hops > 0:
+            forwarded = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+            if forwarded:
+                return forwarded[max(0, len(forwarded) - self.trusted_proxy_hops)]
+        return request.client.host if request.client else "unknown"
+
+    def dependency(self):
+        """A FastAPI dependency that limits by client address and answers 429 when over."""
+        async def limit(request: Request):
+            client = self.client_address(request)
+            wait = self.acquire(client)
+            if wait:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many requests. Please slow down.",
+                    headers={"Retry-After": str(math.ceil(wait))},
+                )
+        return limit
+
+    def metrics(self) -> Dict[str, int]:
+        return {**self.counters, "clients": len(self._buckets)}
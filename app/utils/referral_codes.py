@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import secrets
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from ..database import get_async_db
+from ..models import ReferralCode
+
+
+logger = logging.getLogger(__name__)
+
+# No 0/O or 1/I/L, so codes survive being read out or typed from a screenshot
+REFERRAL_CODE_ALPHABET = "23456789ABCDEFGHJKMNPQRSTUVWXYZ"
+REFERRAL_CODE_LENGTH = 8
+
+
+@dataclass(frozen=True)
+class ReferralOwner:
+    rider_id: Optional[int] = None
+    driver_id: Optional[int] = None
+
+
+def generate_referral_code(length: int = REFERRAL_CODE_LENGTH) -> str:
+    return "".join(secrets.choice(REFERRAL_CODE_ALPHABET) for _ in range(length))
+
+
+class ReferralCodeService:
+    """
+    Referral codes from a pre-generated pool.
+
+    Codes live in referral_codes, keyed by the code itself. Assigning one claims a
+    free row with FOR UPDATE SKIP LOCKED, so concurrent requests never get the same
+    code and never hit a unique violation. The pool is topped up in bulk by
+    refill_pool(), on a schedule and whenever a claim finds it empty.
+
+    Committed assignments never change, so codes resolve() finds assigned are
+    kept in a bounded LRU cache.
+    """
+
+    def __init__(self, pool_target: int = 1000, refill_batch_size: int = 500, cache_size: int = 10000):
+        self.pool_target = pool_target
+        self.refill_batch_size = refill_batch_size
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, ReferralOwner]" = OrderedDict()
+        self._refill_lock = asyncio.Lock()
+
+    def _remember(self, code: str, owner: ReferralOwner):
+        self._cache[code] = owner
+        self._cache.move_to_end(code)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def resolve(self, db: AsyncSession, code: str) -> Optional[ReferralOwner]:
+        """Return the rider or driver that owns code, or None if it is not an assigned code."""
+        owner = self._cache.get(code)
+        if owner is not None:
+            self._cache.move_to_end(code)
+            return owner
+
+        row = (await db.execute(
+            select(ReferralCode.rider_id, ReferralCode.driver_id).where(ReferralCode.code == code)
+        )).first()
+        if row is None or (row.rider_id is None and row.driver_id is None):
+            return None
+
+        owner = ReferralOwner(rider_id=row.rider_id, driver_id=row.driver_id)
+        self._remember(code, owner)
+        return owner
+
+    async def _claim(self, db: AsyncSession, **owner) -> Optional[str]:
+        free_code = (
+            select(ReferralCode.code)
+            .where(ReferralCode.rider_id.is_(None), ReferralCode.driver_id.is_(None))
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        return (await db.execute(
+            update(ReferralCode)
+            .where(ReferralCode.code == free_code)
+            .values(assigned_at=datetime.utcnow(), **owner)
+            .returning(ReferralCode.code)
+        )).scalar()
+
+    async def assign(self, db: AsyncSession, rider_id: Optional[int] = None, driver_id: Optional[int] = None) -> str:
+        """
+        Claim a code from the pool for a rider or a driver.
+
+        Runs in the caller's transaction; the caller commits together with
+        whatever else it stores (e.g. rider.referral_code).
+        """
+        owner = {"rider_id": rider_id} if rider_id is not None else {"driver_id": driver_id}
+
+        code = await self._claim(db, **owner)
+        if code is None:
+            logger.warning("Referral code pool is empty, refilling inline.")
+            await self.refill(db, self.refill_batch_size)
+            code = await self._claim(db, **owner)
+        if code is None:
+            raise RuntimeError("Could not claim a referral code from the pool.")
+
+        # Not cached here: the caller's transaction may still roll back and free the code
+        return code
+
+    async def pool_size(self, db: AsyncSession) -> int:
+        return (await db.execute(
+            select(func.count())
+            .select_from(ReferralCode)
+            .where(ReferralCode.rider_id.is_(None), ReferralCode.driver_id.is_(None))
+        )).scalar_one()
+
+    async def refill(self, db: AsyncSession, count: int) -> int:
+        """Add count new codes to the pool. Returns how many were inserted."""
+        async with self._refill_lock:
+            codes = {generate_referral_code() for _ in range(count)}
+            # A new code may clash with an existing one; those rows are skipped
+            result = await db.execute(
+                insert(ReferralCode)
+                .values([{"code": code, "created_at": datetime.utcnow()} for code in codes])
+                .on_conflict_do_nothing(index_elements=[ReferralCode.code])
+                .returning(ReferralCode.code)
+            )
+            return len(result.all())
+
+    async def refill_pool(self):
+        """Scheduled job: top the pool back up to pool_target free codes."""
+        async for db in get_async_db():
+            try:
+                missing = self.pool_target - await self.pool_size(db)
+                inserted = 0
+                while missing > 0:
+                    added = await self.refill(db, min(missing, self.refill_batch_size))
+                    if not added:
+                        break
+                    inserted += added
+                    missing -= added
+                await db.commit()
+                if inserted:
+                    logger.info(f"Added {inserted} referral code(s) to the pool.")
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Error refilling referral code pool: {e}")
+
+
+# Instantiate the service
+referral_code_service = ReferralCodeService()
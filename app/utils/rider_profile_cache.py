@@ -0,0 +1,63 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy.future import select
+
+from ..database import get_async_db
+from ..models import Rider, User, Wallet
+from .ledger import to_major
+from .profile_cache import ProfileCache, make_etag
+
+
+@dataclass(frozen=True)
+class RiderProfileRecord:
+    rider_id: int
+    user_id: int
+    full_name: str
+    email: str
+    phone_number: str
+    gender: Optional[str]
+    address: Optional[str]
+    nin: Optional[str]
+    ssn: Optional[str]
+    profile_photo: Optional[str]
+    wallet_balance: Optional[float]
+    etag: str
+
+
+async def load_rider_profile(rider_id: int) -> Optional[RiderProfileRecord]:
+    """Read a rider's profile in one query (rider, user and wallet joined)."""
+    async for db in get_async_db():
+        row = (await db.execute(
+            select(
+                Rider.id,
+                Rider.user_id,
+                Rider.nin,
+                Rider.ssn_number,
+                Rider.rider_photo,
+                User.full_name,
+                User.email,
+                User.phone_number,
+                User.gender,
+                User.address,
+                Wallet.balance_minor,
+            )
+            .join(User, User.id == Rider.user_id)
+            .outerjoin(Wallet, Wallet.user_id == User.id)
+            .where(Rider.id == rider_id)
+        )).first()
+    # Built outside the loop, so the session is already closed
+    if row is None:
+        return None
+
+    gender = getattr(row.gender, "value", row.gender)
+    wallet_balance = to_major(row.balance_minor) if row.balance_minor is not None else None
+    fields = (
+        row.id, row.user_id, row.full_name, row.email, row.phone_number, gender,
+        row.address, row.nin, row.ssn_number, row.rider_photo, wallet_balance,
+    )
+    return RiderProfileRecord(*fields, etag=make_etag(*fields))
+
+
+# Instantiate the cache. Profile edits invalidate it; the wallet balance can lag by up to the ttl
+rider_profile_cache: ProfileCache[RiderProfileRecord] = ProfileCache(load_rider_profile, ttl=30.0)
@@ -52,7 +52,7 @@ class RideResponse(BaseModel):
 class RatingRequest(BaseModel):
     ride_id: int
     driver_id: int
-    rating: float  # e.g., 1-5 stars
+    rating: float = Field(..., ge=1, le=5)  # 1-5 stars
     comment: str = None
 
 
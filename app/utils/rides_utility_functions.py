@@ -1,8 +1,20 @@
+import math
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
 from sqlalchemy.orm import Session
 from ..models import Driver
 from geopy.distance import geodesic  # Library for calculating distance between two points (latitude, longitude)
-from typing import List, Dict
-import requests
+from typing import List, Dict, Optional
+from .eta import eta_estimator
+from .pricing import pricing_engine
+from .route_distance import get_route_provider
+from .surge import surge_tracker
+
+
+# Drivers further than this from a pickup are not considered for its ETA
+NEARBY_DRIVER_RADIUS_KM = 10.0
+# How many of the best learned-speed candidates get a routed ETA
+ETA_SHORTLIST_SIZE = 5
 
 
 # Function to calculate the distance between two locations (rider and driver)
@@ -25,56 +37,82 @@ def find_drivers_nearby(rider_location: tuple, db: Session, max_distance: float
     return nearby_drivers
 
 
-# Function to categorize drivers by rating
+# Function to categorize drivers by rating tier (kept current by utils/driver_ratings.py)
 def categorize_drivers_by_rating(nearby_drivers: List[Driver]) -> Dict[str, List[Driver]]:
-    group_1 = [driver for driver in nearby_drivers if 100 >= driver.rating >= 70]
-    group_2 = [driver for driver in nearby_drivers if 69 >= driver.rating >= 40]
-    group_3 = [driver for driver in nearby_drivers if driver.rating < 40]
-    
-    return {"group_1": group_1, "group_2": group_2, "group_3": group_3}
-
-
-def get_distance_matrix(pickup_location, driver_location, api_key):
-    url = "https://maps.googleapis.com/maps/api/distancematrix/json"
-    params = {
-        "origins": f"{pickup_location[0]},{pickup_location[1]}",
-        "destinations": f"{driver_location[0]},{driver_location[1]}",
-        "key": api_key
-    }
-    response = requests.get(url, params=params)
-    data = response.json()
-
-    if data["rows"]:
-        distance_info = data["rows"][0]["elements"][0]
-        distance_km = distance_info["distance"]["value"] / 1000
-        return distance_km
-    return None
-
-
-# Function to update the driver's overall rating
-def update_driver_rating(driver: Driver, new_rating: float, db: Session):
-    if driver.num_of_ratings == 0:
-        # First rating
-        driver.overall_rating = new_rating
-        driver.num_of_ratings = 1
-    else:
-        # Calculate new average rating
-        total_rating = driver.overall_rating * driver.num_of_ratings
-        total_rating += new_rating
-        driver.num_of_ratings += 1
-        driver.overall_rating = total_rating / driver.num_of_ratings
-
-    db.commit()
-
-
-#Function to calculate  
-def calculate_estimated_price(pickup_location: str, dropoff_location: str, ride_type: str):
-    # Dummy function to calculate price based on location and ride type
-    # You can implement actual distance-based calculation here
-    if ride_type == "STANDARD":
-        return 200  # Static regular price
-    elif ride_type == "VIP":
-        return 300  # Static VIP price
+    groups = {"group_1": [], "group_2": [], "group_3": []}
+    for driver in nearby_drivers:
+        groups[f"group_{driver.rating_tier}"].append(driver)
+    return groups
+
+
+async def get_distance_matrix(pickup_location: tuple, driver_location: tuple) -> Optional[float]:
+    """Road distance in km from a driver to the pickup, or None if there is no route."""
+    estimate = (await get_route_provider().matrix([driver_location], [pickup_location]))[0][0]
+    return estimate.distance_km if estimate else None
+
+
+# Function to estimate pickup times for many candidate drivers in one routing call
+async def estimate_pickup_etas(pickup_location: tuple, driver_locations: List[tuple]) -> List[Optional[float]]:
+    """Minutes for each driver to reach the pickup, in the order given (None where there is no route)."""
+    if not driver_locations:
+        return []
+    rows = await get_route_provider().matrix(driver_locations, [pickup_location])
+    return [row[0].duration_minutes if row[0] else None for row in rows]
+
+
+# Function to estimate pickup times from learned speeds, with no routing call (see utils/eta.py)
+def estimate_pickup_etas_from_history(pickup_location: tuple, driver_locations: List[tuple]) -> List[float]:
+    """Minutes for each driver to reach the pickup, in the order given."""
+    return eta_estimator.estimate_minutes(driver_locations, pickup_location).tolist()
+
+
+async def estimate_nearest_pickup_eta(
+    db: AsyncSession,
+    pickup_location: tuple,
+    max_distance_km: float = NEARBY_DRIVER_RADIUS_KM,
+    shortlist: int = ETA_SHORTLIST_SIZE,
+) -> Optional[float]:
+    """
+    Minutes until the closest available driver could reach the pickup, or None if
+    no driver is within max_distance_km.
+
+    Available means the driver has reported a location recently (see utils/surge.py).
+    Every nearby driver is ranked by learned speeds, which costs nothing per
+    driver; only the `shortlist` fastest go to the routing provider, in one call.
+    """
+    lat, lng = pickup_location
+    lat_delta = max_distance_km / 111.0
+    lng_delta = max_distance_km / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+    rows = (await db.execute(
+        select(Driver.id, Driver.latitude, Driver.longitude).where(
+            Driver.latitude.between(lat - lat_delta, lat + lat_delta),
+            Driver.longitude.between(lng - lng_delta, lng + lng_delta),
+        )
+    )).all()
+    candidates = [
+        (row.latitude, row.longitude) for row in rows
+        if surge_tracker.is_driver_available(row.id)
+        and calculate_distance(pickup_location, (row.latitude, row.longitude)) <= max_distance_km
+    ]
+    if not candidates:
+        return None
+
+    learned = estimate_pickup_etas_from_history(pickup_location, candidates)
+    ranked = sorted(range(len(candidates)), key=learned.__getitem__)[:shortlist]
+    routed = await estimate_pickup_etas(pickup_location, [candidates[i] for i in ranked])
+    return min(
+        routed_minutes if routed_minutes is not None else learned[i]
+        for i, routed_minutes in zip(ranked, routed)
+    )
+
+
+# Function to calculate the estimated price for one ride type (see utils/pricing.py)
+def calculate_estimated_price(pickup_location, dropoff_location, ride_type: str) -> float:
+    quote = pricing_engine.quote(
+        (pickup_location.latitude, pickup_location.longitude),
+        (dropoff_location.latitude, dropoff_location.longitude),
+    )
+    return quote.prices[ride_type]
     
 
 #Tokenize Card
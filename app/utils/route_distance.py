@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+from .pricing import AVERAGE_SPEED_KMH, ROAD_DISTANCE_FACTOR, haversine_km
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_DISTANCE_MATRIX_URL = "https://maps.googleapis.com/maps/api/distancematrix/json"
+GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+
+# Distance Matrix limits per request
+MAX_ORIGINS_PER_REQUEST = 25
+MAX_DESTINATIONS_PER_REQUEST = 25
+MAX_ELEMENTS_PER_REQUEST = 100
+
+Point = Tuple[float, float]
+
+
+@dataclass(frozen=True)
+class RouteEstimate:
+    distance_km: float
+    duration_minutes: float
+    source: str  # "google" or "offline"
+
+
+class RouteDistanceProvider(ABC):
+    """Road distance and travel time between many origins and destinations."""
+
+    @abstractmethod
+    async def matrix(self, origins: Sequence[Point], destinations: Sequence[Point]) -> List[List[Optional[RouteEstimate]]]:
+        """
+        One estimate per (origin, destination) pair, as rows per origin. None where
+        no route exists.
+        """
+
+    async def close(self):
+        pass
+
+
+class OfflineRouteProvider(RouteDistanceProvider):
+    """Straight-line distance padded by a road factor; for tests and when the routing API is down."""
+
+    def estimate(self, origin: Point, destination: Point) -> RouteEstimate:
+        distance_km = haversine_km(*origin, *destination) * ROAD_DISTANCE_FACTOR
+        return RouteEstimate(distance_km, distance_km / AVERAGE_SPEED_KMH * 60, "offline")
+
+    async def matrix(self, origins, destinations):
+        return [[self.estimate(origin, destination) for destination in destinations] for origin in origins]
+
+
+class GoogleDistanceMatrixProvider(RouteDistanceProvider):
+    """
+    Google Distance Matrix API on one pooled async client.
+
+    A matrix larger than the API's per-request limits is split into blocks that
+    are fetched concurrently.
+    """
+
+    def __init__(self, api_key: str, url: str = GOOGLE_DISTANCE_MATRIX_URL, timeout: float = 5.0):
+        self.api_key = api_key
+        self.url = url
+        self.timeout = timeout
+        self.client: Optional[httpx.AsyncClient] = None
+
+    def _client(self) -> httpx.AsyncClient:
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=self.timeout)
+        return self.client
+
+    async def _fetch_block(self, origins: Sequence[Point], destinations: Sequence[Point]):
+        response = await self._client().get(self.url, params={
+            "origins": "|".join(f"{lat},{lng}" for lat, lng in origins),
+            "destinations": "|".join(f"{lat},{lng}" for lat, lng in destinations),
+            "key": self.api_key,
+        })
+        # Not raise_for_status(): its message carries the URL, and with it the API key
+        if response.status_code != 200:
+            raise Exception(f"Distance Matrix HTTP error: {response.status_code}")
+        data = response.json()
+        if data.get("status") != "OK":
+            raise Exception(f"Distance Matrix error: {data.get('status')} {data.get('error_message', '')}")
+
+        rows = []
+        for row in data["rows"]:
+            estimates = []
+            for element in row["elements"]:
+                if element.get("status") != "OK":
+                    estimates.append(None)
+                    continue
+                estimates.append(RouteEstimate(
+                    element["distance"]["value"] / 1000,
+                    element["duration"]["value"] / 60,
+                    "google",
+                ))
+            rows.append(estimates)
+        return rows
+
+    async def matrix(self, origins, destinations):
+        origin_step = max(1, min(MAX_ORIGINS_PER_REQUEST, MAX_ELEMENTS_PER_REQUEST // max(len(destinations), 1)))
+        destination_step = min(MAX_DESTINATIONS_PER_REQUEST, MAX_ELEMENTS_PER_REQUEST // origin_step)
+
+        blocks = [
+            (o, d)
+            for o in range(0, len(origins), origin_step)
+            for d in range(0, len(destinations), destination_step)
+        ]
+        results = await asyncio.gather(*(
+            self._fetch_block(origins[o:o + origin_step], destinations[d:d + destination_step])
+            for o, d in blocks
+        ))
+
+        matrix: List[List[Optional[RouteEstimate]]] = [[None] * len(destinations) for _ in origins]
+        for (o, d), rows in zip(blocks, results):
+            for i, row in enumerate(rows):
+                matrix[o + i][d:d + len(row)] = row
+        return matrix
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+
+class CachedRouteProvider(RouteDistanceProvider):
+    """
+    Caches another provider's estimates by quantized coordinates, with a TTL and LRU eviction.
+
+    Coordinates are rounded to `precision` decimals (3 is about 100 m), so nearby
+    requests share entries. Only the origins and destinations with uncached pairs
+    go to the upstream provider, in one matrix call. If that call fails, the
+    missing pairs come from the fallback provider and are not cached.
+    """
+
+    def __init__(
+        self,
+        provider: RouteDistanceProvider,
+        fallback: Optional[RouteDistanceProvider] = None,
+        ttl: float = 900.0,
+        max_entries: int = 50000,
+        precision: int = 3,
+    ):
+        self.provider = provider
+        self.fallback = fallback or OfflineRouteProvider()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.precision = precision
+        self._entries: "OrderedDict[Tuple[Point, Point], Tuple[float, Optional[RouteEstimate]]]" = OrderedDict()
+        self.counters: Dict[str, int] = {"hits": 0, "misses": 0, "upstream_calls": 0, "fallbacks": 0}
+
+    def _quantize(self, point: Point) -> Point:
+        return round(point[0], self.precision), round(point[1], self.precision)
+
+    def _get(self, key, now: float):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] <= now:
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, entry[1]
+
+    def _put(self, key, estimate: Optional[RouteEstimate], now: float):
+        self._entries[key] = (now + self.ttl, estimate)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def matrix(self, origins, destinations):
+        now = time.monotonic()
+        origins = [self._quantize(point) for point in origins]
+        destinations = [self._quantize(point) for point in destinations]
+
+        matrix: List[List[Optional[RouteEstimate]]] = [[None] * len(destinations) for _ in origins]
+        missing: List[Tuple[int, int]] = []
+        for i, origin in enumerate(origins):
+            for j, destination in enumerate(destinations):
+                found, estimate = self._get((origin, destination), now)
+                if found:
+                    matrix[i][j] = estimate
+                else:
+                    missing.append((i, j))
+
+        self.counters["hits"] += len(origins) * len(destinations) - len(missing)
+        self.counters["misses"] += len(missing)
+        if not missing:
+            return matrix
+
+        missing_origins = list(dict.fromkeys(origins[i] for i, _ in missing))
+        missing_destinations = list(dict.fromkeys(destinations[j] for _, j in missing))
+        origin_index = {point: k for k, point in enumerate(missing_origins)}
+        destination_index = {point: k for k, point in enumerate(missing_destinations)}
+
+        try:
+            self.counters["upstream_calls"] += 1
+            fetched = await self.provider.matrix(missing_origins, missing_destinations)
+            cache = True
+        except Exception as e:
+            logger.warning(f"Route provider failed, using offline estimates: {e}")
+            self.counters["fallbacks"] += 1
+            fetched = await self.fallback.matrix(missing_origins, missing_destinations)
+            cache = False
+
+        for i, j in missing:
+            estimate = fetched[origin_index[origins[i]]][destination_index[destinations[j]]]
+            matrix[i][j] = estimate
+            if cache:
+                self._put((origins[i], destinations[j]), estimate, now)
+        return matrix
+
+    async def close(self):
+        await self.provider.close()
+
+    def metrics(self) -> Dict[str, int]:
+        return {**self.counters, "entries": len(self._entries)}
+
+
+def create_route_provider() -> RouteDistanceProvider:
+    if GOOGLE_MAPS_API_KEY:
+        return CachedRouteProvider(GoogleDistanceMatrixProvider(GOOGLE_MAPS_API_KEY))
+    logger.info("GOOGLE_MAPS_API_KEY not set, using offline route estimates.")
+    return OfflineRouteProvider()
+
+
+route_provider: RouteDistanceProvider = create_route_provider()
+
+
+def get_route_provider() -> RouteDistanceProvider:
+    return route_provider
+
+
+def set_route_provider(provider: RouteDistanceProvider):
+    """Swap the process-wide provider, e.g. for an OfflineRouteProvider in tests."""
+    global route_provider
+    route_provider = provider
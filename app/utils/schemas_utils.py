@@ -79,6 +79,7 @@ class RiderProfile(BaseModel):
     email: Optional[str] = None
     phone_number: Optional[str] = None
     full_name: Optional[str] = None
+    wallet_balance: Optional[float] = None
 
     class Config:
         from_attributes = True
@@ -92,6 +93,7 @@ class RiderProfileus(BaseModel):
     email: Optional[str] = None
     phone_number: Optional[str] = None
     full_name: Optional[str] = None
+    wallet_balance: Optional[float] = None
 
     class Config:
         from_attributes = True
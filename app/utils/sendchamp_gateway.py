@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+from .sendchamp_errors import Error
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SENDCHAMP_PUBLIC_KEY = os.getenv("SENDCHAMP_PUBLIC_KEY")
+SENDCHAMP_SMS_URL = os.getenv("SENDCHAMP_API_URL", "https://api.sendchamp.com/api/v1/sms/send")
+SENDCHAMP_EMAIL_URL = os.getenv("SENDCHAMP_EMAIL_URL", "https://api.sendchamp.com/api/v1/email/send")
+
+# Recipients per Sendchamp SMS request when fanning out a bulk send
+SMS_RECIPIENTS_PER_REQUEST = 100
+
+
+class SendchampGateway:
+    """
+    Async Sendchamp client for SMS and email.
+
+    All requests share one pooled httpx.AsyncClient with explicit timeouts, and a
+    semaphore caps how many requests are in flight at once. Multi-recipient SMS is
+    split into chunks of SMS_RECIPIENTS_PER_REQUEST sent concurrently.
+
+    send_email returns a (data, error) pair; send_sms returns a list of response
+    data for the chunks that went through and a list of Errors for those that
+    did not.
+    """
+
+    def __init__(
+        self,
+        public_key: Optional[str] = SENDCHAMP_PUBLIC_KEY,
+        sms_url: str = SENDCHAMP_SMS_URL,
+        email_url: str = SENDCHAMP_EMAIL_URL,
+        max_concurrency: int = 10,
+        recipients_per_request: int = SMS_RECIPIENTS_PER_REQUEST,
+        timeout: float = 10.0,
+    ):
+        self.public_key = public_key
+        self.sms_url = sms_url
+        self.email_url = email_url
+        self.recipients_per_request = recipients_per_request
+        self.timeout = httpx.Timeout(timeout, connect=5.0)
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+                headers={
+                    "Authorization": f"Bearer {self.public_key}",
+                    "Accept": "application/json",
+                    "Content-Type": "application/json",
+                },
+            )
+
+    async def stop(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _post(self, url: str, payload: dict) -> Tuple[Optional[dict], Optional[Error]]:
+        if self.client is None:
+            await self.start()
+
+        async with self._semaphore:
+            try:
+                response = await self.client.post(url, json=payload)
+            except httpx.HTTPError as e:
+                logger.error(f"Sendchamp request to {url} failed: {e}")
+                return None, Error(code=503, message=str(e), status="error")
+
+        try:
+            json_response = response.json()
+        except ValueError:
+            json_response = {"message": response.text}
+
+        if not 200 <= response.status_code < 300:
+            return None, Error(
+                code=response.status_code,
+                message=json_response.get("message", response.text),
+                status=json_response.get("status", "error"),
+            )
+
+        return json_response.get("data"), None
+
+    async def send_sms(
+        self,
+        recipients: List[str],
+        message: str,
+        sender_name: str = "Sendchamp",
+        route: str = "dnd",
+    ) -> Tuple[List[dict], List[Error]]:
+        """
+        Send one SMS to any number of recipients.
+
+        Returns:
+            tuple: Response data for each successful chunk and errors for each failed chunk.
+        """
+        chunks = [
+            recipients[i:i + self.recipients_per_request]
+            for i in range(0, len(recipients), self.recipients_per_request)
+        ]
+        results = await asyncio.gather(*(
+            self._post(self.sms_url, {
+                "to": chunk,
+                "message": message,
+                "sender_name": sender_name,
+                "route": route,
+            })
+            for chunk in chunks
+        ))
+
+        data = [result for result, error in results if not error]
+        errors = [error for _, error in results if error]
+        return data, errors
+
+    async def send_email(
+        self,
+        to: List[Dict[str, str]],
+        subject: str,
+        html_content: str,
+        from_email: str = "no-reply@delevia.com",
+        from_name: str = "Delevia",
+    ) -> Tuple[Optional[dict], Optional[Error]]:
+        """Send one email to a list of {"email": ..., "name": ...} recipients."""
+        return await self._post(self.email_url, {
+            "to": to,
+            "from": {"email": from_email, "name": from_name},
+            "message_body": {"type": "html", "value": html_content},
+            "subject": subject,
+        })
+
+
+class FakeSendchampGateway(SendchampGateway):
+    """
+    In-memory stand-in for SendchampGateway.
+
+    Records every SMS and email instead of calling Sendchamp. Set fail_with to an
+    Error to make every send fail with it.
+    """
+
+    def __init__(self, fail_with: Optional[Error] = None, **kwargs):
+        super().__init__(public_key="fake", **kwargs)
+        self.fail_with = fail_with
+        self.sent_sms: List[dict] = []
+        self.sent_emails: List[dict] = []
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def _post(self, url: str, payload: dict) -> Tuple[Optional[dict], Optional[Error]]:
+        if self.fail_with is not None:
+            return None, self.fail_with
+        if url == self.sms_url:
+            self.sent_sms.append(payload)
+        else:
+            self.sent_emails.append(payload)
+        return {"status": "sent"}, None
+
+
+sendchamp_gateway: SendchampGateway = SendchampGateway()
+
+
+def get_sendchamp_gateway() -> SendchampGateway:
+    return sendchamp_gateway
+
+
+def set_sendchamp_gateway(gateway: SendchampGateway):
+    """Swap the process-wide gateway, e.g. for a FakeSendchampGateway in tests."""
+    global sendchamp_gateway
+    sendchamp_gateway = gateway
@@ -1,6 +1,11 @@
 import httpx
 from .sendchamp_errors import Error
 
+
+# One pooled client for every CUSTOM_HTTP_CLIENT, so requests reuse connections
+_shared_client = httpx.Client(timeout=httpx.Timeout(10.0, connect=5.0))
+
+
 class CUSTOM_HTTP_CLIENT:
 
     def __init__(self, url, headers):
@@ -12,22 +17,11 @@ class CUSTOM_HTTP_CLIENT:
         if method not in ["GET", "POST", "PUT", "PATCH", "DELETE"]:
             raise NotImplementedError(f"Method '{method}' not recognized.")
 
-        # Map method names to httpx methods
-        method_map = {
-            "GET": httpx.get,
-            "POST": httpx.post,
-            "PUT": httpx.put,
-            "PATCH": httpx.patch,
-            "DELETE": httpx.delete
-        }
-
-        make_request = method_map[method]
-
         # Making the request
         if method in ["GET", "DELETE"]:
-            res = make_request(self.url, headers=self.headers)
+            res = _shared_client.request(method, self.url, headers=self.headers)
         else:
-            res = make_request(self.url, json=data, headers=self.headers)
+            res = _shared_client.request(method, self.url, json=data, headers=self.headers)
 
         # Check for response status
         try:
@@ -1,23 +1,19 @@
-import requests
-from ..utils.sendchamp_http_client import CUSTOM_HTTP_CLIENT
+from .sendchamp_gateway import get_sendchamp_gateway
 
 class Email:
-    def __init__(self, headers):
-        self.headers = headers
-
-    def send_email(self, email_data):
-        SENDCHAMP_EMAIL_ENDPOINT = "https://api.sendchamp.com/api/v1/email/send"
-        client = CUSTOM_HTTP_CLIENT(SENDCHAMP_EMAIL_ENDPOINT, self.headers)
-        response = client.requests("POST", json=email_data)
-        return response.json(), response.status_code != 200
+    async def send_email(self, email_data):
+        # email_data follows Sendchamp's email payload: to, from, message_body, subject
+        return await get_sendchamp_gateway().send_email(
+            to=email_data["to"],
+            subject=email_data["subject"],
+            html_content=email_data["message_body"]["value"],
+            from_email=email_data["from"]["email"],
+            from_name=email_data["from"].get("name", "Delevia"),
+        )
 
 
 
 class Sendchamp:
-    def __init__(self, public_key: str):
-        self.headers = {
-            "accept": "application/json",
-            "content-type": "application/json",
-            "Authorization": f"Bearer {public_key}"
-        }
-        self.email = Email(headers=self.headers)
+    # Sends with the shared gateway, which is configured from SENDCHAMP_PUBLIC_KEY
+    def __init__(self):
+        self.email = Email()
@@ -0,0 +1,386 @@
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import case, func, insert, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from ..enums import PaymentMethodEnum, RideStatusEnum, WalletTransactionEnum
+from ..models import CompanyWallet, Driver, Referral, Ride, RideSettlement, Rider, Transaction, Wallet
+from .ledger import to_minor
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Share of every fare kept by the company, in percent
+COMPANY_COMMISSION_PERCENT = Decimal(os.getenv("COMPANY_COMMISSION_PERCENT", "20"))
+# Referral bonuses, in percent of the fare, paid out of the company's commission
+REFERRER_BONUS_PERCENT = Decimal("3")
+DRIVER_REFERRER_BONUS_PERCENT = Decimal("3")
+
+
+def percent_of(amount_minor: int, percent: Decimal) -> int:
+    # Round down so the parts never add up to more than the fare
+    return int(amount_minor * percent // 100)
+
+
+@dataclass
+class Posting:
+    amount_minor: int
+    transaction_type: WalletTransactionEnum
+    wallet_id: Optional[int] = None  # None means the company wallet
+
+    @property
+    def signed_amount_minor(self) -> int:
+        return -self.amount_minor if self.transaction_type == WalletTransactionEnum.DEBIT else self.amount_minor
+
+
+@dataclass
+class SettlementPlan:
+    fare_minor: int
+    commission_minor: int
+    driver_earnings_minor: int
+    referral_bonus_minor: int = 0
+    commission_uncollected_minor: int = 0
+    fare_uncollected_minor: int = 0
+    postings: List[Posting] = field(default_factory=list)
+
+
+@dataclass
+class ReferralParties:
+    referrer_rider_id: Optional[int] = None
+    referrer_driver_id: Optional[int] = None
+    referrer_wallet_id: Optional[int] = None
+
+
+def plan_settlement(
+    fare_minor: int,
+    driver_id: int,
+    driver_wallet_id: Optional[int],
+    payment_method: PaymentMethodEnum,
+    referral: Optional[ReferralParties] = None,
+    commission_percent: Decimal = COMPANY_COMMISSION_PERCENT,
+    driver_balance_minor: Optional[int] = None,
+    rider_wallet_id: Optional[int] = None,
+    rider_balance_minor: Optional[int] = None,
+) -> SettlementPlan:
+    """
+    Split a fare between the driver, the company and any referrers. Pure; no I/O.
+
+    On a card ride the fare was charged outside the ledger, so the driver's
+    wallet is credited the fare minus the company commission. On a wallet ride
+    the fare is first debited from the rider's wallet, as far as
+    rider_balance_minor covers it; what was paid goes to the driver's earnings
+    first and then to the commission, and any shortfall is recorded as
+    uncollected fare (and, where it eats into the commission, uncollected
+    commission). On a cash ride the driver already holds the fare, so instead
+    the commission is debited from their wallet, as far as driver_balance_minor
+    covers it; the rest is recorded as uncollected.
+    Whoever referred the rider gets REFERRER_BONUS_PERCENT of the fare. If the
+    driver on this ride is that referrer, they also get
+    DRIVER_REFERRER_BONUS_PERCENT. Bonuses come out of the commission actually
+    collected, and the company keeps the rest.
+    """
+    commission_minor = percent_of(fare_minor, commission_percent)
+    plan = SettlementPlan(
+        fare_minor=fare_minor,
+        commission_minor=commission_minor,
+        driver_earnings_minor=fare_minor - commission_minor,
+    )
+
+    collected_minor = commission_minor
+    driver_credit_minor = plan.driver_earnings_minor
+    if payment_method == PaymentMethodEnum.CASH:
+        collected_minor = 0
+        driver_credit_minor = 0
+        if driver_wallet_id is not None:
+            available = commission_minor if driver_balance_minor is None else max(driver_balance_minor, 0)
+            collected_minor = min(commission_minor, available)
+        plan.commission_uncollected_minor = commission_minor - collected_minor
+        if collected_minor > 0:
+            plan.postings.append(Posting(collected_minor, WalletTransactionEnum.DEBIT, driver_wallet_id))
+    elif payment_method == PaymentMethodEnum.WALLET:
+        paid_minor = 0
+        if rider_wallet_id is not None:
+            available = fare_minor if rider_balance_minor is None else max(rider_balance_minor, 0)
+            paid_minor = min(fare_minor, available)
+        driver_credit_minor = min(plan.driver_earnings_minor, paid_minor)
+        collected_minor = paid_minor - driver_credit_minor
+        if driver_wallet_id is None:
+            # Nowhere to pay the driver's part, so it is not taken from the rider either
+            driver_credit_minor = 0
+        plan.fare_uncollected_minor = fare_minor - paid_minor
+        plan.commission_uncollected_minor = commission_minor - collected_minor
+        if driver_credit_minor + collected_minor > 0:
+            plan.postings.append(Posting(
+                driver_credit_minor + collected_minor, WalletTransactionEnum.DEBIT, rider_wallet_id
+            ))
+    elif payment_method != PaymentMethodEnum.DEBIT_CARD:
+        raise ValueError(f"Cannot settle a ride with payment method {payment_method!r}")
+
+    if driver_wallet_id is not None and driver_credit_minor > 0:
+        plan.postings.append(Posting(driver_credit_minor, WalletTransactionEnum.CREDIT, driver_wallet_id))
+
+    bonuses: List[Posting] = []
+    if referral is not None:
+        if referral.referrer_wallet_id is not None:
+            bonuses.append(Posting(
+                percent_of(fare_minor, REFERRER_BONUS_PERCENT),
+                WalletTransactionEnum.REFERRAL_BONUS,
+                referral.referrer_wallet_id,
+            ))
+        if referral.referrer_driver_id == driver_id and driver_wallet_id is not None:
+            bonuses.append(Posting(
+                percent_of(fare_minor, DRIVER_REFERRER_BONUS_PERCENT),
+                WalletTransactionEnum.REFERRAL_BONUS,
+                driver_wallet_id,
+            ))
+
+    # Bonuses can never cost the company more than the commission it collected
+    available = collected_minor
+    for bonus in bonuses:
+        bonus.amount_minor = min(bonus.amount_minor, available)
+        available -= bonus.amount_minor
+        if bonus.amount_minor > 0:
+            plan.postings.append(bonus)
+            plan.referral_bonus_minor += bonus.amount_minor
+
+    company_share = collected_minor - plan.referral_bonus_minor
+    if company_share > 0:
+        plan.postings.append(Posting(company_share, WalletTransactionEnum.CREDIT))
+
+    return plan
+
+
+async def complete_ride_status(db: AsyncSession, ride_id: int, driver_id: int):
+    """
+    Move an ONGOING ride assigned to driver_id to COMPLETED, fixing its fare. Does not commit.
+
+    Returns the ride's id, rider_id, driver_id and fare, or None if nothing matched;
+    a ride can only be completed once.
+    """
+    return (await db.execute(
+        update(Ride)
+        .where(Ride.id == ride_id, Ride.driver_id == driver_id, Ride.status == RideStatusEnum.ONGOING)
+        .values(status=RideStatusEnum.COMPLETED, fare=Ride.estimated_price, completed_at=datetime.utcnow())
+        .returning(Ride.id, Ride.rider_id, Ride.driver_id, Ride.fare)
+        .execution_options(synchronize_session=False)
+    )).first()
+
+
+async def _load_parties(db: AsyncSession, rides: list):
+    """
+    Driver wallets, the wallets of riders paying from one, balances and referral
+    parties for a batch of rides, in two queries.
+
+    On PostgreSQL the wallets are locked (in id order, so concurrent batches
+    cannot deadlock) as their balances are read, and stay locked until the
+    caller commits; the balances the plans are capped by cannot move underneath.
+    """
+    rider_ids = {ride.rider_id for ride in rides}
+    driver_ids = {ride.driver_id for ride in rides}
+    paying_rider_ids = {ride.rider_id for ride in rides if ride.payment_method == PaymentMethodEnum.WALLET}
+
+    referral_rows = (await db.execute(
+        select(
+            Referral.referred_rider_id,
+            Referral.referrer_rider_id,
+            Referral.referrer_driver_id,
+            func.coalesce(Rider.user_id, Driver.user_id).label("referrer_user_id"),
+        )
+        .outerjoin(Rider, Rider.id == Referral.referrer_rider_id)
+        .outerjoin(Driver, Driver.id == Referral.referrer_driver_id)
+        .where(Referral.referred_rider_id.in_(rider_ids))
+        .order_by(Referral.id)
+    )).all()
+    # A rider has one referrer; should there be more rows, the first one wins
+    referral_by_rider = {}
+    for row in referral_rows:
+        referral_by_rider.setdefault(row.referred_rider_id, row)
+
+    referrer_user_ids = {row.referrer_user_id for row in referral_by_rider.values() if row.referrer_user_id is not None}
+    wallet_query = (
+        select(Wallet.id, Wallet.user_id, Wallet.balance_minor, Driver.id.label("driver_id"), Rider.id.label("rider_id"))
+        .outerjoin(Driver, Driver.user_id == Wallet.user_id)
+        .outerjoin(Rider, Rider.user_id == Wallet.user_id)
+        .where(or_(
+            Driver.id.in_(driver_ids),
+            Rider.id.in_(paying_rider_ids),
+            Wallet.user_id.in_(referrer_user_ids),
+        ))
+        .order_by(Wallet.id)
+    )
+    if db.get_bind().dialect.name == "postgresql":
+        wallet_query = wallet_query.with_for_update(of=Wallet)
+    wallet_rows = (await db.execute(wallet_query)).all()
+    wallet_by_user = {row.user_id: row.id for row in wallet_rows}
+    wallet_by_driver = {row.driver_id: row.id for row in wallet_rows if row.driver_id is not None}
+    wallet_by_rider = {row.rider_id: row.id for row in wallet_rows if row.rider_id is not None}
+    balances = {row.id: row.balance_minor for row in wallet_rows}
+
+    referrals = {}
+    for rider_id, row in referral_by_rider.items():
+        referrals[rider_id] = ReferralParties(
+            referrer_rider_id=row.referrer_rider_id,
+            referrer_driver_id=row.referrer_driver_id,
+            referrer_wallet_id=wallet_by_user.get(row.referrer_user_id),
+        )
+    return wallet_by_driver, wallet_by_rider, balances, referrals
+
+
+async def _apply_postings(db: AsyncSession, postings: List[Posting]):
+    created_at = datetime.utcnow()
+    transactions: List[dict] = []
+
+    # All user wallets in one UPDATE, each getting its own total via CASE
+    per_wallet: Dict[int, int] = {}
+    for posting in postings:
+        if posting.wallet_id is not None:
+            per_wallet[posting.wallet_id] = per_wallet.get(posting.wallet_id, 0) + posting.signed_amount_minor
+
+    if per_wallet:
+        # The wallets were locked by _load_parties when their balances were read
+        credit = case(per_wallet, value=Wallet.id)
+        balances = dict((await db.execute(
+            update(Wallet)
+            .where(Wallet.id.in_(list(per_wallet)))
+            .values(balance_minor=Wallet.balance_minor + credit)
+            .returning(Wallet.id, Wallet.balance_minor)
+            .execution_options(synchronize_session=False)
+        )).all())
+
+        # Walk back from the final balance to give each posting its own balance_after
+        running = dict(balances)
+        for posting in reversed([p for p in postings if p.wallet_id is not None]):
+            transactions.append({
+                "wallet_id": posting.wallet_id,
+                "company_wallet_id": None,
+                "amount_minor": posting.amount_minor,
+                "balance_after_minor": running[posting.wallet_id],
+                "transaction_type": posting.transaction_type,
+                "created_at": created_at,
+            })
+            running[posting.wallet_id] -= posting.signed_amount_minor
+        transactions.reverse()
+
+    company_minor = sum(p.amount_minor for p in postings if p.wallet_id is None)
+    if company_minor:
+        company_wallet_id = select(CompanyWallet.id).order_by(CompanyWallet.id).limit(1).scalar_subquery()
+        company_row = (await db.execute(
+            update(CompanyWallet)
+            .where(CompanyWallet.id == company_wallet_id)
+            .values(balance_minor=CompanyWallet.balance_minor + company_minor)
+            .returning(CompanyWallet.id, CompanyWallet.balance_minor)
+            .execution_options(synchronize_session=False)
+        )).first()
+        if company_row is None:
+            logger.warning(f"No company wallet; commission of {company_minor} minor units recorded on the settlement only.")
+        else:
+            transactions.append({
+                "wallet_id": None,
+                "company_wallet_id": company_row.id,
+                "amount_minor": company_minor,
+                "balance_after_minor": company_row.balance_minor,
+                "transaction_type": WalletTransactionEnum.CREDIT,
+                "created_at": created_at,
+            })
+
+    if transactions:
+        await db.execute(insert(Transaction), transactions)
+
+
+async def settle_rides(
+    db: AsyncSession,
+    ride_ids: List[int],
+    unsettled: Optional[Dict[int, str]] = None,
+) -> Dict[int, SettlementPlan]:
+    """
+    Settle a batch of completed rides. Does not commit.
+
+    Rides that are not COMPLETED, or already have a settlement, are skipped, so
+    running the same batch twice pays out once. Rides with no recorded payment
+    method (everything completed before rides stored one) cannot be settled
+    safely; they are left alone and reported in `unsettled` (ride id to reason),
+    if given. Cash and wallet rides are planned against wallet balances as they
+    stand after the batch's earlier rides. Whatever the batch size, this is
+    a fixed handful of statements: three reads, one UPDATE for user wallets, one
+    for the company wallet, and one bulk INSERT each for settlements and
+    transactions.
+
+    Returns:
+        dict: The plan for each ride settled, by ride id.
+    """
+    rides = (await db.execute(
+        select(Ride.id, Ride.rider_id, Ride.driver_id, Ride.fare, Ride.payment_method)
+        .outerjoin(RideSettlement, RideSettlement.ride_id == Ride.id)
+        .where(
+            Ride.id.in_(ride_ids),
+            Ride.status == RideStatusEnum.COMPLETED,
+            RideSettlement.ride_id.is_(None),
+        )
+    )).all()
+
+    unknown = [ride.id for ride in rides if ride.payment_method is None]
+    if unknown:
+        logger.warning(f"Not settling ride(s) {unknown}: no payment method recorded.")
+        if unsettled is not None:
+            unsettled.update((ride_id, "No payment method recorded for the ride") for ride_id in unknown)
+        rides = [ride for ride in rides if ride.payment_method is not None]
+    if not rides:
+        return {}
+
+    wallet_by_driver, wallet_by_rider, balances, referrals = await _load_parties(db, rides)
+
+    plans: Dict[int, SettlementPlan] = {}
+    postings: List[Posting] = []
+    for ride in rides:
+        driver_wallet_id = wallet_by_driver.get(ride.driver_id)
+        rider_wallet_id = wallet_by_rider.get(ride.rider_id)
+        plan = plan_settlement(
+            to_minor(ride.fare or 0),
+            ride.driver_id,
+            driver_wallet_id,
+            ride.payment_method,
+            referrals.get(ride.rider_id),
+            driver_balance_minor=balances.get(driver_wallet_id),
+            rider_wallet_id=rider_wallet_id,
+            rider_balance_minor=balances.get(rider_wallet_id),
+        )
+        if plan.fare_uncollected_minor:
+            logger.warning(
+                f"Wallet ride {ride.id}: rider {ride.rider_id}'s wallet could not cover "
+                f"{plan.fare_uncollected_minor} minor units of the fare."
+            )
+        elif plan.commission_uncollected_minor:
+            logger.warning(
+                f"Cash ride {ride.id}: driver {ride.driver_id}'s wallet could not cover "
+                f"{plan.commission_uncollected_minor} minor units of commission."
+            )
+        for posting in plan.postings:
+            if posting.wallet_id is not None:
+                balances[posting.wallet_id] = balances.get(posting.wallet_id, 0) + posting.signed_amount_minor
+        plans[ride.id] = plan
+        postings.extend(plan.postings)
+
+    await db.execute(insert(RideSettlement), [
+        {
+            "ride_id": ride_id,
+            "fare_minor": plan.fare_minor,
+            "commission_minor": plan.commission_minor,
+            "driver_earnings_minor": plan.driver_earnings_minor,
+            "referral_bonus_minor": plan.referral_bonus_minor,
+            "commission_uncollected_minor": plan.commission_uncollected_minor,
+            "fare_uncollected_minor": plan.fare_uncollected_minor,
+            "settled_at": datetime.utcnow(),
+        }
+        for ride_id, plan in plans.items()
+    ])
+    await _apply_postings(db, postings)
+    return plans
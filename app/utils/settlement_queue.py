@@ -0,0 +1,257 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from ..database import get_async_db
+from ..enums import SettlementJobStatusEnum
+from ..models import Ride, SettlementJob
+from .settlement import complete_ride_status, settle_rides
+
+
+logger = logging.getLogger(__name__)
+
+
+class SettlementQueue:
+    """
+    Durable queue of ride settlements.
+
+    Completing a ride writes a settlement_jobs row in the same transaction as the
+    status change and returns; the payout happens here. A pool of worker tasks
+    claims pending jobs batch_size at a time (SKIP LOCKED on PostgreSQL, so several
+    app instances can share the table) and settles each batch in one transaction.
+
+    If a batch fails, its rides are retried one by one so a single bad ride
+    cannot hold up the rest. A failed job is retried with exponential backoff and
+    dead-lettered (status DEAD) after max_attempts; dead jobs stay in the table
+    until requeue_dead() puts them back. A claimed job is leased for
+    lease_seconds, so jobs held by a crashed worker are picked up again.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        batch_size: int = 500,
+        max_attempts: int = 5,
+        backoff_base: float = 5.0,
+        backoff_max: float = 600.0,
+        lease_seconds: float = 300.0,
+        poll_interval: float = 2.0,
+    ):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+        self._wakeup = asyncio.Event()
+        self._worker_tasks: List[asyncio.Task] = []
+        self.counters: Dict[str, int] = {
+            "enqueued": 0,
+            "settled": 0,
+            "batches": 0,
+            "retried": 0,
+            "dead": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._worker_tasks)
+
+    async def start(self):
+        """Start the worker pool."""
+        if self.running:
+            return
+        self._worker_tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        logger.info(f"Settlement queue started with {self.workers} worker(s).")
+
+    async def stop(self):
+        """Stop the workers. Unfinished jobs stay in the table and are picked up after the lease expires."""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    async def enqueue(self, db: AsyncSession, ride_id: int, driver_id: int) -> SettlementJob:
+        """
+        Complete a ride and queue its settlement, in one commit.
+
+        Completing a ride that already has a settlement job returns that job.
+
+        Raises:
+            HTTPException: 404 if the ride does not exist, 403 if it belongs to another
+            driver, 400 if it is not ongoing.
+        """
+        ride = await complete_ride_status(db, ride_id, driver_id)
+
+        if ride is None:
+            current = (await db.execute(select(Ride.driver_id).where(Ride.id == ride_id))).first()
+            if current is None:
+                raise HTTPException(status_code=404, detail="Ride not found")
+            if current.driver_id != driver_id:
+                raise HTTPException(status_code=403, detail="You are not authorized to complete this ride")
+            existing = await db.get(SettlementJob, ride_id)
+            if existing is not None:
+                return existing
+            raise HTTPException(status_code=400, detail="Ride is not currently ongoing and cannot be completed")
+
+        job = SettlementJob(ride_id=ride_id, driver_id=driver_id, next_attempt_at=datetime.utcnow())
+        db.add(job)
+        await db.commit()
+
+        self.counters["enqueued"] += 1
+        # Workers are started by the app's startup hook; the job waits in the table until then
+        self._wakeup.set()
+        return job
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            **self.counters,
+            "workers": sum(1 for task in self._worker_tasks if not task.done()),
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                settled = await self.process_batch()
+            except Exception as e:
+                logger.error(f"Settlement worker error: {e}")
+                settled = 0
+
+            if settled < self.batch_size:
+                # Caught up: sleep until a new job arrives or the poll interval passes
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _claim(self, db: AsyncSession) -> List[SettlementJob]:
+        now = datetime.utcnow()
+        due = (
+            select(SettlementJob.ride_id)
+            .where(SettlementJob.status == SettlementJobStatusEnum.PENDING, SettlementJob.next_attempt_at <= now)
+            .order_by(SettlementJob.next_attempt_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        claimed = (await db.execute(
+            update(SettlementJob)
+            .where(SettlementJob.ride_id.in_(due.scalar_subquery()))
+            .values(
+                attempts=SettlementJob.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=self.lease_seconds),
+            )
+            .returning(SettlementJob.ride_id, SettlementJob.attempts)
+            .execution_options(synchronize_session=False)
+        )).all()
+        await db.commit()
+        return claimed
+
+    async def _settle(self, db: AsyncSession, ride_ids: List[int]) -> int:
+        """
+        Settle the rides and close their jobs; returns how many rides were actually paid out.
+
+        Rides settle_rides refuses (no payment method) are dead-lettered with the reason,
+        to be requeued once the ride is fixed.
+        """
+        unsettled: Dict[int, str] = {}
+        plans = await settle_rides(db, ride_ids, unsettled)
+        finished_at = datetime.utcnow()
+        await db.execute(
+            update(SettlementJob)
+            .where(SettlementJob.ride_id.in_([ride_id for ride_id in ride_ids if ride_id not in unsettled]))
+            .values(status=SettlementJobStatusEnum.DONE, finished_at=finished_at, last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+        for ride_id, reason in unsettled.items():
+            await db.execute(
+                update(SettlementJob)
+                .where(SettlementJob.ride_id == ride_id)
+                .values(status=SettlementJobStatusEnum.DEAD, finished_at=finished_at, last_error=reason)
+                .execution_options(synchronize_session=False)
+            )
+        await db.commit()
+        self.counters["dead"] += len(unsettled)
+        return len(plans)
+
+    async def _record_failure(self, db: AsyncSession, ride_id: int, attempts: int, error: Exception):
+        values = {"last_error": str(error)[:1000]}
+        if attempts >= self.max_attempts:
+            values.update(status=SettlementJobStatusEnum.DEAD, finished_at=datetime.utcnow())
+            self.counters["dead"] += 1
+            logger.error(f"Dead-lettering settlement for ride {ride_id} after {attempts} attempt(s): {error}")
+        else:
+            delay = min(self.backoff_base * (2 ** (attempts - 1)), self.backoff_max)
+            values["next_attempt_at"] = datetime.utcnow() + timedelta(seconds=delay)
+            self.counters["retried"] += 1
+            logger.warning(f"Error settling ride {ride_id}, retrying in {delay:.0f}s: {error}")
+
+        await db.execute(
+            update(SettlementJob)
+            .where(SettlementJob.ride_id == ride_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+    async def process_batch(self) -> int:
+        """
+        Claim and settle one batch of due jobs.
+
+        Returns:
+            int: Number of jobs claimed.
+        """
+        async for db in get_async_db():
+            claimed = await self._claim(db)
+            if not claimed:
+                return 0
+
+            try:
+                # Rides already settled or no longer COMPLETED close their jobs without counting
+                settled = await self._settle(db, [job.ride_id for job in claimed])
+                self.counters["settled"] += settled
+            except Exception as e:
+                await db.rollback()
+                logger.warning(f"Settlement batch of {len(claimed)} failed, settling one by one: {e}")
+                for job in claimed:
+                    try:
+                        settled = await self._settle(db, [job.ride_id])
+                        self.counters["settled"] += settled
+                    except Exception as ride_error:
+                        await db.rollback()
+                        await self._record_failure(db, job.ride_id, job.attempts, ride_error)
+
+            self.counters["batches"] += 1
+            return len(claimed)
+
+    async def requeue_dead(self, ride_ids: Optional[List[int]] = None) -> int:
+        """Put dead-lettered jobs (all, or just ride_ids) back in the queue with a fresh attempt count."""
+        query = update(SettlementJob).where(SettlementJob.status == SettlementJobStatusEnum.DEAD)
+        if ride_ids is not None:
+            query = query.where(SettlementJob.ride_id.in_(ride_ids))
+
+        async for db in get_async_db():
+            result = await db.execute(
+                query.values(
+                    status=SettlementJobStatusEnum.PENDING,
+                    attempts=0,
+                    next_attempt_at=datetime.utcnow(),
+                    finished_at=None,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            self._wakeup.set()
+            return result.rowcount or 0
+
+
+# Instantiate the queue
+settlement_queue = SettlementQueue()
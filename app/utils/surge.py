@@ -0,0 +1,129 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+import h3
+
+
+# Same cells as the pricing engine, so a quote needs one H3 lookup
+SURGE_H3_RESOLUTION = 7
+# An open request counts as demand for this long unless it is accepted or cancelled first
+DEMAND_WINDOW_SECONDS = 600
+# A driver counts as available supply while their last location report is this recent
+SUPPLY_WINDOW_SECONDS = 120
+
+# Requests per available driver at which surge starts, how fast it climbs, and its cap
+SURGE_THRESHOLD = 1.0
+SURGE_SENSITIVITY = 0.25
+MAX_SURGE_MULTIPLIER = 2.5
+
+
+class SlidingPresence:
+    """
+    Per-cell counts of keys (ride ids or driver ids) seen within the last window seconds.
+
+    Each key is in at most one cell. Keys are kept in last-seen order, so expiring
+    them only ever looks at the oldest; every operation is amortised O(1) and
+    counts are never recomputed.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._seen: "OrderedDict[Hashable, Tuple[str, float]]" = OrderedDict()
+        self._counts: Dict[str, int] = {}
+
+    def _decrement(self, cell: str):
+        remaining = self._counts[cell] - 1
+        if remaining:
+            self._counts[cell] = remaining
+        else:
+            del self._counts[cell]
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        while self._seen:
+            key, (cell, seen_at) = next(iter(self._seen.items()))
+            if seen_at > cutoff:
+                break
+            del self._seen[key]
+            self._decrement(cell)
+
+    def touch(self, key: Hashable, cell: str, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        previous = self._seen.pop(key, None)
+        if previous is not None:
+            self._decrement(previous[0])
+        self._seen[key] = (cell, now)
+        self._counts[cell] = self._counts.get(cell, 0) + 1
+        self._expire(now)
+
+    def remove(self, key: Hashable):
+        previous = self._seen.pop(key, None)
+        if previous is not None:
+            self._decrement(previous[0])
+
+    def count(self, cell: str, now: Optional[float] = None) -> int:
+        self._expire(time.monotonic() if now is None else now)
+        return self._counts.get(cell, 0)
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def __contains__(self, key: Hashable) -> bool:
+        seen = self._seen.get(key)
+        return seen is not None and seen[1] > time.monotonic() - self.window
+
+
+class SurgeTracker:
+    """
+    Surge multipliers from live supply and demand per H3 cell.
+
+    Demand is open ride requests by pickup cell: added by request_ride and
+    confirm_ride, dropped when the ride is accepted or cancelled, and aged out
+    after DEMAND_WINDOW_SECONDS. Supply is drivers by the cell of their latest
+    location report, aged out after SUPPLY_WINDOW_SECONDS. Both are updated as
+    events arrive, so reading a multiplier never touches the database.
+
+    Counts are per process; with several app instances each sees its own share
+    of traffic, which scales demand and supply alike.
+    """
+
+    def __init__(
+        self,
+        resolution: int = SURGE_H3_RESOLUTION,
+        demand_window: float = DEMAND_WINDOW_SECONDS,
+        supply_window: float = SUPPLY_WINDOW_SECONDS,
+    ):
+        self.resolution = resolution
+        self.demand = SlidingPresence(demand_window)
+        self.supply = SlidingPresence(supply_window)
+
+    def cell_for(self, latitude: float, longitude: float) -> str:
+        return h3.geo_to_h3(latitude, longitude, self.resolution)
+
+    def record_ride_requested(self, ride_id: int, latitude: float, longitude: float):
+        self.demand.touch(ride_id, self.cell_for(latitude, longitude))
+
+    def record_ride_closed(self, ride_id: int):
+        self.demand.remove(ride_id)
+
+    def record_driver_location(self, driver_id: int, latitude: float, longitude: float):
+        self.supply.touch(driver_id, self.cell_for(latitude, longitude))
+
+    def is_driver_available(self, driver_id: int) -> bool:
+        """Whether the driver has reported a location within the supply window."""
+        return driver_id in self.supply
+
+    def multiplier(self, cell: str) -> float:
+        """Surge multiplier for a cell: 1.0 until demand outruns supply, capped at MAX_SURGE_MULTIPLIER."""
+        pressure = self.demand.count(cell) / max(self.supply.count(cell), 1)
+        if pressure <= SURGE_THRESHOLD:
+            return 1.0
+        return round(min(1.0 + SURGE_SENSITIVITY * (pressure - SURGE_THRESHOLD), MAX_SURGE_MULTIPLIER), 2)
+
+    def metrics(self) -> Dict[str, int]:
+        return {"open_requests": len(self.demand), "available_drivers": len(self.supply)}
+
+
+# Instantiate the tracker
+surge_tracker = SurgeTracker()
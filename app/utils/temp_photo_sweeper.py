@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, tuple_
+from sqlalchemy.future import select
+
+from app.database import get_async_db
+from app.models import TemporaryUserPhoto
+
+
+logger = logging.getLogger(__name__)
+
+TEMPORARY_PHOTO_ROOT = Path("./assets/temporal_photos")
+
+SWEEP_BATCH_SIZE = 500
+UNLINK_WORKERS = 8
+
+_unlink_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_unlink_executor() -> ThreadPoolExecutor:
+    global _unlink_executor
+    if _unlink_executor is None:
+        _unlink_executor = ThreadPoolExecutor(max_workers=UNLINK_WORKERS, thread_name_prefix="temp-photo-sweeper")
+    return _unlink_executor
+
+
+def _unlink_photo(photo_path: str) -> Optional[int]:
+    """
+    Delete one temporary photo file and return the number of bytes freed (0 if it was
+    already gone), or None if it could not be deleted and its row should be kept.
+    """
+    root = TEMPORARY_PHOTO_ROOT.resolve()
+    path = Path(photo_path).resolve()
+
+    # Never delete anything outside the temporary photo directory, whatever the row says
+    if not path.is_relative_to(root):
+        logger.warning(f"Skipping temporary photo outside {root}: {photo_path}")
+        return 0
+
+    try:
+        size = path.stat().st_size
+        os.unlink(path)
+        return size
+    except FileNotFoundError:
+        return 0
+    except OSError as e:
+        logger.error(f"Error deleting temporary photo {photo_path}: {e}")
+        return None
+
+
+async def _unlink_photos(photos: Iterable[Tuple[int, str]]) -> Tuple[List[int], int]:
+    """Unlink the photos' files; returns the ids whose rows can go and the bytes freed."""
+    photos = list(photos)
+    loop = asyncio.get_running_loop()
+    executor = _get_unlink_executor()
+    freed = await asyncio.gather(
+        *(loop.run_in_executor(executor, _unlink_photo, photo_path) for _, photo_path in photos)
+    )
+    removed_ids = [photo_id for (photo_id, _), size in zip(photos, freed) if size is not None]
+    return removed_ids, sum(size for size in freed if size is not None)
+
+
+async def sweep_expired_temporary_photos(batch_size: int = SWEEP_BATCH_SIZE) -> dict:
+    """
+    Delete expired temporary photos and their files.
+
+    Expired rows are read in batches, their files are unlinked in a thread pool, and
+    each batch of rows is removed with a single DELETE. A row whose file could not be
+    deleted (other than one already gone) is kept for the next sweep.
+
+    Args:
+        batch_size (int): Maximum number of photos handled per batch.
+
+    Returns:
+        dict: Number of rows deleted and bytes reclaimed from disk.
+    """
+    now = datetime.utcnow()
+    deleted_rows = 0
+    reclaimed_bytes = 0
+    kept_rows = 0
+    # Kept rows stay expired, so page past them on the (expires_at, id) index
+    # rather than re-reading them every batch
+    after = None
+
+    async for db in get_async_db():
+        try:
+            while True:
+                query = (
+                    select(TemporaryUserPhoto.id, TemporaryUserPhoto.photo_path, TemporaryUserPhoto.expires_at)
+                    .where(TemporaryUserPhoto.expires_at <= now)
+                    .order_by(TemporaryUserPhoto.expires_at, TemporaryUserPhoto.id)
+                    .limit(batch_size)
+                )
+                if after is not None:
+                    query = query.where(tuple_(TemporaryUserPhoto.expires_at, TemporaryUserPhoto.id) > after)
+                batch = (await db.execute(query)).all()
+                if not batch:
+                    break
+                after = (batch[-1].expires_at, batch[-1].id)
+
+                removed_ids, freed = await _unlink_photos([(row.id, row.photo_path) for row in batch])
+                reclaimed_bytes += freed
+                kept_rows += len(batch) - len(removed_ids)
+
+                if removed_ids:
+                    await db.execute(
+                        delete(TemporaryUserPhoto).where(TemporaryUserPhoto.id.in_(removed_ids))
+                    )
+                    await db.commit()
+                    deleted_rows += len(removed_ids)
+
+                if len(batch) < batch_size:
+                    break
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error sweeping expired temporary photos: {e}")
+
+    logger.info(
+        f"Deleted {deleted_rows} expired temporary photo(s), reclaimed {reclaimed_bytes} bytes, "
+        f"kept {kept_rows} whose file could not be deleted."
+    )
+    return {"deleted_rows": deleted_rows, "reclaimed_bytes": reclaimed_bytes, "kept_rows": kept_rows}
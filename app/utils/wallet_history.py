@@ -0,0 +1,336 @@
+import base64
+import csv
+import io
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, and_, case, func, insert, literal, or_, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from ..database import get_async_db
+from ..enums import WalletTransactionEnum
+from ..models import Transaction, Wallet, WalletBalanceCheckpoint
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+EXPORT_BATCH_SIZE = 1000
+# How long a transaction may still be in flight after its created_at; checkpoints
+# are written well after their cutoff, so nothing older can be missing from one
+CHECKPOINT_GRACE = timedelta(hours=1)
+
+# Debits take money out; every other transaction type puts it in
+signed_amount_minor = case(
+    (Transaction.transaction_type == WalletTransactionEnum.DEBIT, -Transaction.amount_minor),
+    else_=Transaction.amount_minor,
+)
+
+
+def encode_cursor(created_at: datetime, transaction_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{transaction_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, transaction_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(transaction_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _period_filters(wallet_id: int, start: Optional[datetime], end: Optional[datetime]) -> list:
+    filters = [Transaction.wallet_id == wallet_id]
+    if start is not None:
+        filters.append(Transaction.created_at >= start)
+    if end is not None:
+        filters.append(Transaction.created_at < end)
+    return filters
+
+
+async def get_history_page(
+    db: AsyncSession,
+    wallet_id: int,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Tuple[List[Transaction], Optional[str]]:
+    """
+    One page of a wallet's transactions, newest first.
+
+    Pages are keyed on (created_at, id), so each one is a range read on
+    ix_transactions_wallet_id_created_at_id however deep it is.
+
+    Returns:
+        tuple: The transactions and the cursor for the next page (None on the last page).
+    """
+    query = select(Transaction).where(*_period_filters(wallet_id, start, end))
+    if cursor:
+        created_at, transaction_id = decode_cursor(cursor)
+        query = query.where(tuple_(Transaction.created_at, Transaction.id) < tuple_(created_at, transaction_id))
+
+    # Fetch one extra row to learn whether another page follows
+    rows = (await db.execute(
+        query.order_by(Transaction.created_at.desc(), Transaction.id.desc()).limit(limit + 1)
+    )).scalars().all()
+
+    transactions = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = transactions[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return transactions, next_cursor
+
+
+async def _balance_before(db: AsyncSession, wallet_id: int, moment: datetime) -> int:
+    """
+    Wallet balance just before moment: the latest checkpoint plus what came after it.
+
+    Without a checkpoint the history may not start from zero (migrated or adjusted
+    balances), so it is worked back from the wallet's balance instead.
+    """
+    checkpoint = (await db.execute(
+        select(WalletBalanceCheckpoint)
+        .where(WalletBalanceCheckpoint.wallet_id == wallet_id, WalletBalanceCheckpoint.as_of < moment)
+        .order_by(WalletBalanceCheckpoint.as_of.desc())
+        .limit(1)
+    )).scalars().first()
+
+    if checkpoint is None:
+        since_moment = (
+            select(func.coalesce(func.sum(signed_amount_minor), 0))
+            .where(Transaction.wallet_id == wallet_id, Transaction.created_at >= moment)
+            .scalar_subquery()
+        )
+        balance = (await db.execute(
+            select(Wallet.balance_minor - since_moment).where(Wallet.id == wallet_id)
+        )).scalar_one_or_none()
+        return balance or 0
+
+    filters = [
+        Transaction.wallet_id == wallet_id,
+        Transaction.created_at < moment,
+        Transaction.id > checkpoint.last_transaction_id,
+        # Transactions past the checkpoint are at most CHECKPOINT_GRACE older than it,
+        # which keeps this a short range read on the index
+        Transaction.created_at >= checkpoint.as_of - CHECKPOINT_GRACE,
+    ]
+    opening = checkpoint.balance_minor
+
+    since_checkpoint = (await db.execute(
+        select(func.coalesce(func.sum(signed_amount_minor), 0)).where(*filters)
+    )).scalar_one()
+    return opening + since_checkpoint
+
+
+@dataclass
+class WalletStatement:
+    start: datetime
+    end: datetime
+    opening_balance_minor: int
+    closing_balance_minor: int
+    credits_minor: int
+    debits_minor: int
+    transaction_count: int
+
+
+async def get_statement(db: AsyncSession, wallet_id: int, start: datetime, end: datetime) -> WalletStatement:
+    """
+    Opening and closing balance plus totals for [start, end).
+
+    The opening balance comes from the nearest checkpoint before start; the totals
+    are one aggregate over the period's index range. Neither reads the whole history.
+    """
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    opening = await _balance_before(db, wallet_id, start)
+    credits, debits, count = (await db.execute(
+        select(
+            func.coalesce(func.sum(case((signed_amount_minor > 0, signed_amount_minor), else_=0)), 0),
+            func.coalesce(func.sum(case((signed_amount_minor < 0, -signed_amount_minor), else_=0)), 0),
+            func.count(Transaction.id),
+        ).where(*_period_filters(wallet_id, start, end))
+    )).one()
+
+    return WalletStatement(
+        start=start,
+        end=end,
+        opening_balance_minor=opening,
+        closing_balance_minor=opening + credits - debits,
+        credits_minor=credits,
+        debits_minor=debits,
+        transaction_count=count,
+    )
+
+
+async def export_history_csv(
+    wallet_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[str]:
+    """
+    Yield a CSV of the wallet's transactions, oldest first, one keyset batch at a time.
+
+    Opens its own session: a StreamingResponse body runs after the request's
+    dependencies have been cleaned up.
+    """
+    async for db in get_async_db():
+        async for chunk in _export_rows(db, wallet_id, start, end, batch_size):
+            yield chunk
+
+
+async def _export_rows(
+    db: AsyncSession,
+    wallet_id: int,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    batch_size: int,
+) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerow(["id", "created_at", "transaction_type", "amount", "balance_after"])
+    yield flush()
+
+    after: Optional[Tuple[datetime, int]] = None
+    while True:
+        query = select(Transaction).where(*_period_filters(wallet_id, start, end))
+        if after is not None:
+            query = query.where(tuple_(Transaction.created_at, Transaction.id) > tuple_(*after))
+        batch = (await db.execute(
+            query.order_by(Transaction.created_at, Transaction.id).limit(batch_size)
+        )).scalars().all()
+        if not batch:
+            break
+
+        for transaction in batch:
+            writer.writerow([
+                transaction.id,
+                transaction.created_at.isoformat(),
+                transaction.transaction_type.value,
+                f"{transaction.amount:.2f}",
+                "" if transaction.balance_after_minor is None else f"{transaction.balance_after_minor / 100:.2f}",
+            ])
+        yield flush()
+
+        after = (batch[-1].created_at, batch[-1].id)
+        # Drop the batch from the identity map so long exports stay flat in memory
+        db.expunge_all()
+
+
+async def create_balance_checkpoints(cutoff: Optional[datetime] = None) -> int:
+    """
+    Scheduled job: checkpoint every wallet that has had transactions since its last checkpoint.
+
+    Only transactions created before cutoff (default: midnight UTC today) are
+    included, which leaves in-flight transactions out of the checkpoint. One
+    INSERT ... SELECT covers all wallets.
+
+    The balance is the ledger's balance_after_minor on the last included
+    transaction. Older rows without one fall back to the previous checkpoint
+    plus the new transactions or, for a wallet's first checkpoint, to the
+    wallet's balance less what came in or went out since the cutoff; history
+    is never assumed to start from zero.
+
+    Returns:
+        int: Number of checkpoints written.
+    """
+    if cutoff is None:
+        cutoff = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    latest_as_of = (
+        select(
+            WalletBalanceCheckpoint.wallet_id,
+            func.max(WalletBalanceCheckpoint.as_of).label("as_of"),
+        )
+        .group_by(WalletBalanceCheckpoint.wallet_id)
+        .subquery()
+    )
+    latest = (
+        select(
+            WalletBalanceCheckpoint.wallet_id,
+            WalletBalanceCheckpoint.balance_minor,
+            WalletBalanceCheckpoint.last_transaction_id,
+        )
+        .join(latest_as_of, and_(
+            WalletBalanceCheckpoint.wallet_id == latest_as_of.c.wallet_id,
+            WalletBalanceCheckpoint.as_of == latest_as_of.c.as_of,
+        ))
+        .subquery()
+    )
+    pending = (
+        select(
+            Transaction.wallet_id,
+            func.max(Transaction.created_at).label("as_of"),
+            func.max(Transaction.id).label("last_transaction_id"),
+            func.sum(signed_amount_minor).label("change_minor"),
+            latest.c.balance_minor.label("previous_balance_minor"),
+        )
+        .outerjoin(latest, latest.c.wallet_id == Transaction.wallet_id)
+        .where(
+            Transaction.wallet_id.isnot(None),
+            Transaction.created_at < cutoff,
+            or_(latest.c.last_transaction_id.is_(None), Transaction.id > latest.c.last_transaction_id),
+        )
+        .group_by(Transaction.wallet_id, latest.c.balance_minor)
+        .subquery()
+    )
+    since_cutoff = (
+        select(Transaction.wallet_id, func.sum(signed_amount_minor).label("change_minor"))
+        .where(Transaction.wallet_id.isnot(None), Transaction.created_at >= cutoff)
+        .group_by(Transaction.wallet_id)
+        .subquery()
+    )
+    last_transaction = Transaction.__table__.alias("last_transaction")
+    new_checkpoints = (
+        select(
+            pending.c.wallet_id,
+            pending.c.as_of,
+            pending.c.last_transaction_id,
+            case(
+                (last_transaction.c.balance_after_minor.isnot(None), last_transaction.c.balance_after_minor),
+                (
+                    pending.c.previous_balance_minor.isnot(None),
+                    pending.c.previous_balance_minor + pending.c.change_minor,
+                ),
+                else_=Wallet.balance_minor - func.coalesce(since_cutoff.c.change_minor, 0),
+            ),
+            literal(datetime.utcnow(), DateTime),
+        )
+        .join(last_transaction, last_transaction.c.id == pending.c.last_transaction_id)
+        .join(Wallet, Wallet.id == pending.c.wallet_id)
+        .outerjoin(since_cutoff, since_cutoff.c.wallet_id == pending.c.wallet_id)
+    )
+
+    async for db in get_async_db():
+        try:
+            result = await db.execute(
+                insert(WalletBalanceCheckpoint).from_select(
+                    ["wallet_id", "as_of", "last_transaction_id", "balance_minor", "created_at"],
+                    new_checkpoints,
+                )
+            )
+            await db.commit()
+            written = result.rowcount or 0
+            logger.info(f"Wrote {written} wallet balance checkpoint(s) up to {cutoff}.")
+            return written
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error writing wallet balance checkpoints: {e}")
+            return 0
@@ -1,5 +1,7 @@
 from pydantic import BaseModel
 from typing import Optional
+from decimal import Decimal
+from pydantic import Field
 from datetime import datetime
 
 
@@ -14,7 +16,7 @@ class WalletResponse(BaseModel):
 
 
 class TransactionCreate(BaseModel):
-    amount: float
+    amount: Decimal = Field(..., gt=0, decimal_places=2)  # Major units, at most two decimal places
     transaction_type: str  # Should be either 'CREDIT' or 'DEBIT'
 
 class TransactionResponse(BaseModel):
@@ -22,6 +24,7 @@ class TransactionResponse(BaseModel):
     transaction_type: str
     account_number: str  
     created_at: datetime
+    balance: Optional[float] = None  # Wallet balance after this transaction
 
     class Config:
         from_attributes = True
@@ -35,4 +38,16 @@ class TransactionHistoryResponse(BaseModel):
     created_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+# Response model for a wallet statement over a period
+class WalletStatementResponse(BaseModel):
+    account_number: str
+    start: datetime
+    end: datetime
+    opening_balance: float
+    closing_balance: float
+    total_credits: float
+    total_debits: float
+    transaction_count: int
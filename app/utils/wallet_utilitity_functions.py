@@ -1,21 +1,122 @@
-import random
+import asyncio
+import hashlib
+import hmac
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from .. models import Wallet, CompanyWallet
+from .. models import ACCOUNT_NUMBER_BLOCK_SIZE, account_number_seq
 
-async def generate_global_unique_account_number(db: AsyncSession):
-    while True:
-        # Generate a random 10-digit account number
-        account_number = ''.join([str(random.randint(0, 9)) for _ in range(10)])
 
-        # Check for uniqueness in both Wallet and CompanyWallet tables
-        wallet_exists = (await db.execute(
-            select(Wallet).where(Wallet.account_number == account_number)
-        )).scalars().first()
+load_dotenv()
+
+# Set to any secret string to scramble issued account numbers. Changing it after
+# numbers have been issued can reissue an existing number, so set it once.
+ACCOUNT_NUMBER_SCRAMBLE_KEY = os.getenv("ACCOUNT_NUMBER_SCRAMBLE_KEY")
+
+# Account numbers are 9 body digits followed by a Luhn check digit
+ACCOUNT_NUMBER_BODY_SPACE = 10 ** 9
+
+
+def luhn_check_digit(body: str) -> str:
+    total = 0
+    # Double every second digit, starting from the rightmost digit of the body
+    for position, char in enumerate(reversed(body)):
+        digit = int(char)
+        if position % 2 == 0:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return str((10 - total % 10) % 10)
+
+
+def is_valid_account_number(account_number: str) -> bool:
+    """Check the length and check digit of an account number, e.g. before a transfer lookup."""
+    return (
+        len(account_number) == 10
+        and account_number.isdigit()
+        and luhn_check_digit(account_number[:-1]) == account_number[-1]
+    )
+
+
+class AccountNumberScrambler:
+    """
+    Keyed permutation of 0..10**9 - 1.
+
+    A four-round Feistel network over 30 bits, with HMAC-SHA256 as the round
+    function. Outputs that land past 10**9 are fed back through ("cycle walking"),
+    so every body maps to exactly one other body and no two sequence values collide.
+    """
+
+    BITS = 30
+    HALF_BITS = 15
+    HALF_MASK = (1 << HALF_BITS) - 1
+    ROUNDS = 4
+
+    def __init__(self, key: str):
+        self.key = key.encode()
+
+    def _round(self, round_number: int, value: int) -> int:
+        digest = hmac.new(self.key, bytes([round_number]) + value.to_bytes(2, "big"), hashlib.sha256).digest()
+        return int.from_bytes(digest[:2], "big") & self.HALF_MASK
 
-        company_wallet_exists = (await db.execute(
-            select(CompanyWallet).where(CompanyWallet.account_number == account_number)
-        )).scalars().first()
+    def _permute(self, value: int) -> int:
+        left, right = value >> self.HALF_BITS, value & self.HALF_MASK
+        for round_number in range(self.ROUNDS):
+            left, right = right, left ^ self._round(round_number, right)
+        return (left << self.HALF_BITS) | right
 
-        if not wallet_exists and not company_wallet_exists:
-            return account_number
+    def scramble(self, value: int) -> int:
+        value = self._permute(value)
+        while value >= ACCOUNT_NUMBER_BODY_SPACE:
+            value = self._permute(value)
+        return value
+
+
+class AccountNumberAllocator:
+    """
+    Hands out wallet and company wallet account numbers.
+
+    Each call to the account_number_seq sequence reserves a block of
+    ACCOUNT_NUMBER_BLOCK_SIZE numbers for this process. Numbers come out of that
+    block with no database round trip until it runs out. Sequence values are never
+    reused, so there is nothing to probe and nothing to retry.
+
+    Unused numbers in a block are dropped when the process restarts, which is fine
+    with nine hundred million numbers to spare.
+    """
+
+    def __init__(self, block_size: int = ACCOUNT_NUMBER_BLOCK_SIZE, scramble_key: Optional[str] = ACCOUNT_NUMBER_SCRAMBLE_KEY):
+        self.block_size = block_size
+        self.scrambler = AccountNumberScrambler(scramble_key) if scramble_key else None
+        self._next: int = 0
+        self._end: int = 0
+        self._lock = asyncio.Lock()
+
+    def format(self, value: int) -> str:
+        if self.scrambler is not None:
+            value = self.scrambler.scramble(value)
+        body = f"{value:09d}"
+        return body + luhn_check_digit(body)
+
+    async def _reserve_block(self, db: AsyncSession):
+        start = (await db.execute(select(account_number_seq.next_value()))).scalar_one()
+        self._next, self._end = start, start + self.block_size
+
+    async def allocate(self, db: AsyncSession) -> str:
+        async with self._lock:
+            if self._next >= self._end:
+                await self._reserve_block(db)
+            value = self._next
+            self._next += 1
+        return self.format(value)
+
+
+account_number_allocator = AccountNumberAllocator()
+
+
+async def generate_global_unique_account_number(db: AsyncSession):
+    return await account_number_allocator.allocate(db)
@@ -0,0 +1,119 @@
+"""
+Rider pre-registration throughput: OTP sent over HTTP loopback vs in-process.
+
+Before, pre-registration sent its OTP by opening a new httpx.AsyncClient and POSTing
+to this service's own /auth/send-otp-email. It now calls deliver_otp_email directly.
+This script drives POST /users/pre-register/rider/new/ end to end both ways, with
+fresh credentials per request: uniqueness check, referral-free OTP issue, password
+hashing and OTP dispatch. SendGrid delivery is replaced with a no-op.
+
+The "loopback" run restores the old dispatch by patching deliver_otp_email with a
+client that goes back through the app. It uses an in-memory ASGI transport, so a real
+loopback adds a TCP connection and a second worker slot on top; the measured gap is
+a lower bound. Password hashing (bcrypt, run on the event loop) is part of every
+request and dominates both runs; --cheap-hash swaps it for a fast hash to show the
+rest of the path.
+
+Run it against a migrated database (the one app.database points at). Pending
+registrations go to the OTP store, so leave OTP_STORE_URL unset to keep them in memory.
+
+Usage:
+    python -m benchmarks.registration [--requests 200] [--concurrency 20] [--cheap-hash]
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
+
+import httpx
+from fastapi import FastAPI
+
+from app.routers import auth, users
+from app.utils.email_outbox import email_outbox
+
+
+async def _noop_deliver(email):
+    return None
+
+
+def _build_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(auth.router, prefix="/auth")
+    app.include_router(users.router, prefix="/users")
+    return app
+
+
+def _loopback_deliver(app: FastAPI):
+    # Mirrors the removed code path: a fresh client and a full request through the app
+    async def deliver(to_email: str, otp_code: str):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost:8000") as client:
+            response = await client.post(
+                "/auth/send-otp-email", params={"to_email": to_email, "otp_code": otp_code}
+            )
+            response.raise_for_status()
+    return deliver
+
+
+async def _run(label: str, client: httpx.AsyncClient, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    run_id = uuid.uuid4().hex[:8]
+
+    async def one(index: int):
+        name = f"bench{run_id}{index}"
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                "/users/pre-register/rider/new/",
+                params={"country": "Nigeria"},
+                json={
+                    "full_name": "Benchmark Rider",
+                    "user_name": name,
+                    "phone_number": f"+1{run_id}{index:06d}",
+                    "email": f"{name}@example.com",
+                    "password": "benchmark-password",
+                },
+            )
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.text
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{label:<12} {requests / elapsed:>8.0f} registrations/s   p50 {p50:8.2f} ms   p99 {p99:8.2f} ms")
+
+
+async def main(requests: int, concurrency: int, cheap_hash: bool):
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if cheap_hash:
+        users.hash_password = lambda password: hashlib.sha256(password.encode()).hexdigest()
+    email_outbox.api_key = email_outbox.api_key or "benchmark"
+    email_outbox._deliver = _noop_deliver
+    await email_outbox.start()
+
+    app = _build_app()
+    in_process_deliver = users.deliver_otp_email
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        users.deliver_otp_email = _loopback_deliver(app)
+        try:
+            await _run("loopback", client, requests, concurrency)
+        finally:
+            users.deliver_otp_email = in_process_deliver
+        await _run("in-process", client, requests, concurrency)
+
+    await email_outbox.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--cheap-hash", action="store_true", help="replace bcrypt with sha256")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.cheap_hash))
@@ -0,0 +1,157 @@
+"""
+Concurrent wallet debits: read-modify-write vs the conditional-UPDATE ledger.
+
+This funds one wallet and then fires a mix of debits and credits at it from many
+sessions at once. It runs two ways:
+
+- "read-modify-write" mirrors the old deduct_funds: it SELECTs the wallet, checks the
+  balance in Python, assigns the new balance and commits.
+- "ledger" goes through app.utils.ledger: one conditional UPDATE ... RETURNING, with
+  the transaction row written in the same statement.
+
+After each run it checks these invariants against the database:
+    final balance == opening balance + credits recorded - debits recorded
+    final balance >= 0
+    transaction rows == operations reported as successful
+
+Run it against a migrated database (the one app.database points at). The wallet it
+creates is deleted afterwards.
+
+Example (500 operations, concurrency 20, local SQLite):
+    read-modify-write   185 ops/s   500 applied   invariants VIOLATED: balance 2600 != 5000 + 5000 - 40000 (lost updates)
+    ledger              191 ops/s   200 applied   invariants OK
+
+Usage:
+    python -m benchmarks.wallet_ledger [--operations 2000] [--concurrency 50] [--opening-balance 5000]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.future import select
+
+from app.database import async_engine
+from app.enums import WalletTransactionEnum
+from app.models import Transaction, Wallet
+from app.utils import ledger
+
+
+DEBIT_MINOR = 100
+CREDIT_MINOR = 50
+# Every CREDIT_EVERY-th operation is a credit; the rest are debits
+CREDIT_EVERY = 5
+
+Session = async_sessionmaker(async_engine, expire_on_commit=False)
+
+
+async def _read_modify_write(wallet_id: int, amount_minor: int, is_credit: bool) -> bool:
+    async with Session() as db:
+        wallet = (await db.execute(select(Wallet).filter(Wallet.id == wallet_id))).scalars().first()
+        if not is_credit and wallet.balance_minor < amount_minor:
+            return False
+        wallet.balance_minor += amount_minor if is_credit else -amount_minor
+        db.add(Transaction(
+            wallet_id=wallet_id,
+            amount_minor=amount_minor,
+            transaction_type=WalletTransactionEnum.CREDIT if is_credit else WalletTransactionEnum.DEBIT,
+        ))
+        await db.commit()
+        return True
+
+
+async def _ledger(wallet_id: int, amount_minor: int, is_credit: bool) -> bool:
+    async with Session() as db:
+        try:
+            if is_credit:
+                await ledger.credit_wallet(db, amount_minor, wallet_id=wallet_id)
+            else:
+                await ledger.debit_wallet(db, amount_minor, wallet_id=wallet_id)
+        except HTTPException:
+            return False
+        await db.commit()
+        return True
+
+
+async def _create_wallet(opening_balance_minor: int) -> int:
+    async with Session() as db:
+        wallet = Wallet(account_number=f"BENCH-{uuid.uuid4().hex[:10]}", balance_minor=opening_balance_minor)
+        db.add(wallet)
+        await db.commit()
+        return wallet.id
+
+
+async def _drop_wallet(wallet_id: int):
+    async with Session() as db:
+        await db.execute(delete(Transaction).where(Transaction.wallet_id == wallet_id))
+        await db.execute(delete(Wallet).where(Wallet.id == wallet_id))
+        await db.commit()
+
+
+async def _check_invariants(wallet_id: int, opening_balance_minor: int, succeeded: int) -> list:
+    async with Session() as db:
+        final = (await db.execute(select(Wallet.balance_minor).where(Wallet.id == wallet_id))).scalar_one()
+        totals = dict((await db.execute(
+            select(Transaction.transaction_type, func.coalesce(func.sum(Transaction.amount_minor), 0))
+            .where(Transaction.wallet_id == wallet_id)
+            .group_by(Transaction.transaction_type)
+        )).all())
+        rows = (await db.execute(
+            select(func.count()).select_from(Transaction).where(Transaction.wallet_id == wallet_id)
+        )).scalar_one()
+
+    credits = totals.get(WalletTransactionEnum.CREDIT, 0)
+    debits = totals.get(WalletTransactionEnum.DEBIT, 0)
+    violations = []
+    if final != opening_balance_minor + credits - debits:
+        violations.append(f"balance {final} != {opening_balance_minor} + {credits} - {debits} (lost updates)")
+    if final < 0:
+        violations.append(f"balance {final} is negative (overdraft)")
+    if rows != succeeded:
+        violations.append(f"{rows} transaction rows for {succeeded} successful operations")
+    return violations
+
+
+async def _run(label: str, apply, operations: int, concurrency: int, opening_balance_minor: int):
+    wallet_id = await _create_wallet(opening_balance_minor)
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def one(index: int):
+        is_credit = index % CREDIT_EVERY == 0
+        async with semaphore:
+            try:
+                results.append(await apply(wallet_id, CREDIT_MINOR if is_credit else DEBIT_MINOR, is_credit))
+            except Exception as e:
+                # The check constraint rejecting an overdraft lands here
+                results.append(False)
+                print(f"  {label}: {type(e).__name__}: {str(e).splitlines()[0]}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(operations)))
+    elapsed = time.perf_counter() - started
+
+    succeeded = sum(results)
+    violations = await _check_invariants(wallet_id, opening_balance_minor, succeeded)
+    await _drop_wallet(wallet_id)
+
+    status = "OK" if not violations else "VIOLATED: " + "; ".join(violations)
+    print(f"{label:<18} {operations / elapsed:>8.0f} ops/s   {succeeded:>5} applied   invariants {status}")
+
+
+async def main(operations: int, concurrency: int, opening_balance_minor: int):
+    await _run("read-modify-write", _read_modify_write, operations, concurrency, opening_balance_minor)
+    await _run("ledger", _ledger, operations, concurrency, opening_balance_minor)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operations", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--opening-balance", type=int, default=5000, help="Opening balance in minor units")
+    args = parser.parse_args()
+    asyncio.run(main(args.operations, args.concurrency, args.opening_balance))
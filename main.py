@@ -1,4 +1,4 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, APIRouter, Depends, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, APIRouter, Depends, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_utils.tasks import repeat_every
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -6,14 +6,34 @@ from sqlalchemy.future import select
 from sqlalchemy import delete
 from datetime import datetime, timedelta
 import logging
-from app.routers import auth, users, rides, wallet, chatMessage, pushNotifications,coordinates
+from app.routers import auth, users, rides, wallet, chatMessage, pushNotifications,coordinates, photos
 
 from app.database import Base, async_engine, get_async_db
 from app.models import Ride, ChatMessage, CallLog
 from app.utils.connection_manager import ConnectionManager, CallConnectionManager, DriverConnectionManager
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from app.utils.otp_delete_test import delete_expired_otps
+from apscheduler.triggers.cron import CronTrigger
+from app.utils.temp_photo_sweeper import sweep_expired_temporary_photos
+from app.utils.notification_dispatcher import notification_dispatcher
+from app.utils.email_outbox import email_outbox
+from app.utils.sendchamp_gateway import get_sendchamp_gateway
+from app.utils.otp_store import get_otp_store
+from app.utils.otp import delete_expired_otp_records
+from app.utils.referral_codes import referral_code_service
+from app.utils.wallet_history import create_balance_checkpoints
+from app.utils.settlement_queue import settlement_queue
+from app.utils.driver_profile_cache import driver_profile_cache
+from app.utils.rider_profile_cache import rider_profile_cache
+from app.utils.quote_store import quote_store
+from app.utils.credential_filter import credential_filter
+from app.utils.route_distance import get_route_provider
+from app.utils.eta import eta_estimator
+from app.utils.surge import surge_tracker
+from app.utils.query_budget import QUERY_BUDGET_MODE, QueryBudgetMiddleware, install_query_budget
+from app.utils.observability import (
+    CONTENT_TYPE, MetricsMiddleware, collect_websocket_managers, instrument_engine, instrument_scheduler, registry
+)
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -30,32 +50,106 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Per-route latency, SQL and WebSocket metrics, served at /metrics
+app.add_middleware(MetricsMiddleware)
+instrument_engine(async_engine.sync_engine)
+
+# Statement budgets per request, enforced in tests and staging (QUERY_BUDGET_MODE)
+if QUERY_BUDGET_MODE != "off":
+    app.add_middleware(QueryBudgetMiddleware)
+    install_query_budget(async_engine.sync_engine)
+
 # WebSocket Connection Manager
 manager = ConnectionManager()
 call_manager = CallConnectionManager()
 driver_manager = DriverConnectionManager()
 # Set up the scheduler
 scheduler = AsyncIOScheduler()
+instrument_scheduler(scheduler)
+
+# Component counters and live connection counts, read when /metrics is scraped
+registry.add_stats("email_outbox", email_outbox.metrics)
+registry.add_stats("settlement_queue", settlement_queue.metrics)
+registry.add_stats("driver_profile_cache", driver_profile_cache.metrics)
+registry.add_stats("rider_profile_cache", rider_profile_cache.metrics)
+registry.add_stats("credential_filter", credential_filter.metrics)
+registry.add_stats("quote_store", quote_store.metrics)
+registry.add_stats("availability_limiter", users.availability_limiter.metrics)
+registry.add_stats("surge", surge_tracker.metrics)
+registry.add_stats("route_provider", lambda: getattr(get_route_provider(), "metrics", dict)())
+registry.add_collector(collect_websocket_managers({
+    "chat": lambda: len(manager.active_connections),
+    "call": lambda: len(call_manager.active_connections),
+    "driver": lambda: len(driver_manager.active_drivers),
+}))
 
 @app.on_event("startup")
 async def start_scheduler():
     """
-    Start the scheduler to periodically delete expired OTPs.
+    Start the scheduler for periodic cleanup jobs.
     """
-    logger.info("Starting scheduler for OTP cleanup...")
+    logger.info("Starting scheduler...")
+
+    # Sweep expired OTP audit and password reset rows
+    scheduler.add_job(
+        delete_expired_otp_records,
+        trigger=IntervalTrigger(minutes=5),
+        id="otp_cleanup",
+        name="Delete expired OTP records",
+        replace_existing=True
+    )
+
+    # Reclaim expired temporary photos (rows and files) every hour
+    scheduler.add_job(
+        sweep_expired_temporary_photos,
+        trigger=IntervalTrigger(hours=1),
+        id="temp_photo_cleanup",
+        name="Delete expired temporary photos",
+        replace_existing=True
+    )
+
+    # Keep the referral code pool topped up, starting with a fill at boot
+    scheduler.add_job(
+        referral_code_service.refill_pool,
+        trigger=IntervalTrigger(minutes=10),
+        id="referral_code_pool_refill",
+        name="Refill referral code pool",
+        next_run_time=datetime.now(),
+        replace_existing=True
+    )
 
-    # Schedule the OTP cleanup task to run every 2 minutes
+    # Checkpoint wallet balances up to midnight, once the day's stragglers have landed
     scheduler.add_job(
-        delete_expired_otps,  # Function to run
-        trigger=IntervalTrigger(minutes=2),  # Every 2 minutes
-        id="otp_cleanup",  # Job id
-        name="Delete expired OTPs",  # Job name
-        replace_existing=True  # Replace the job if it already exists
+        create_balance_checkpoints,
+        trigger=CronTrigger(hour=1, minute=15, timezone="UTC"),
+        id="wallet_balance_checkpoints",
+        name="Write wallet balance checkpoints",
+        replace_existing=True
+    )
+
+    # Reload the taken credential filter at boot, then hourly to pick up other instances' sign-ups
+    scheduler.add_job(
+        credential_filter.rebuild,
+        trigger=IntervalTrigger(hours=1),
+        id="taken_credential_filter",
+        name="Rebuild taken credential filter",
+        next_run_time=datetime.now(),
+        replace_existing=True
+    )
+
+    # Relearn ETA speed profiles from recent trips nightly, and load them at boot
+    scheduler.add_job(
+        eta_estimator.rebuild,
+        trigger=CronTrigger(hour=2, minute=30, timezone="UTC"),
+        id="eta_speed_profiles",
+        name="Rebuild ETA speed profiles",
+        next_run_time=datetime.now(),
+        replace_existing=True
     )
 
     # Start the scheduler
     scheduler.start()
-    logger.info("OTP cleanup task scheduled.")
+    logger.info("Cleanup tasks scheduled.")
 
 @app.on_event("shutdown")
 async def shutdown_scheduler():
@@ -72,12 +166,68 @@ async def shutdown_scheduler():
 
     logger.info("Scheduler stopped.")
 
+@app.on_event("startup")
+async def start_outbound_workers():
+    """
+    Open the pooled OneSignal, SendGrid and Sendchamp clients and start their workers.
+    """
+    await notification_dispatcher.start()
+    await email_outbox.start()
+    await get_sendchamp_gateway().start()
+
+@app.on_event("shutdown")
+async def stop_outbound_workers():
+    """
+    Flush queued notifications and emails and close the pooled clients.
+    """
+    await notification_dispatcher.stop()
+    await email_outbox.stop()
+    await get_sendchamp_gateway().stop()
+
+@app.on_event("startup")
+async def start_settlement_queue():
+    """
+    Start the ride settlement workers.
+    """
+    await settlement_queue.start()
+
+@app.on_event("shutdown")
+async def stop_settlement_queue():
+    """
+    Stop the ride settlement workers; unsettled jobs are picked up on the next start.
+    """
+    await settlement_queue.stop()
+
+@app.on_event("shutdown")
+async def close_otp_store():
+    """
+    Close the OTP store's connection, if it has one.
+    """
+    await get_otp_store().close()
+
+@app.on_event("shutdown")
+async def close_route_provider():
+    """
+    Close the routing API client, if one was opened.
+    """
+    await get_route_provider().close()
+
 # Optional root endpoint to test the app
 @app.get("/")
 async def read_root():
     return {"message": "OTP Cleanup Service is running!"}
 
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Prometheus scrape endpoint: per-route latency and SQL, pool, WebSocket, scheduler
+    and process metrics, plus the outbox, settlement queue, cache, credential filter,
+    quote store, rate limiter, surge and routing counters.
+    """
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+
 # WebSocket endpoint for chat within rides
 @app.websocket("/ws/chat/{ride_id}/{user_id}")
 async def websocket_endpoint(
@@ -301,5 +451,6 @@ app.include_router(wallet.router, prefix="/wallet", tags=["Wallet"])
 app.include_router(chatMessage.router, prefix="/chatMessage", tags=["ChatMessage"])
 app.include_router(pushNotifications.router, prefix="/pushNotifications", tags=["pushNotifications"])
 app.include_router(coordinates.router, prefix="/coordinates", tags=["coordinates"])
+app.include_router(photos.router, prefix="/photos", tags=["Photos"])
 
 
@@ -0,0 +1,11 @@
+import os
+
+import pytest
+
+# Query budgets are read at import time; overruns fail the test that causes them
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.utils.notification_dispatcher import NotificationDispatcher
+
+
+pytestmark = pytest.mark.anyio
+
+
+class StubOneSignal:
+    """Answers like OneSignal, failing any request that targets an id in fail_ids."""
+
+    def __init__(self, fail_ids=(), fail_first=0):
+        self.fail_ids = set(fail_ids)
+        self.fail_first = fail_first
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        self.requests.append(payload)
+        if len(self.requests) <= self.fail_first:
+            return httpx.Response(503, text="unavailable")
+        ids = payload.get("include_external_user_ids", [])
+        if self.fail_ids.intersection(ids):
+            return httpx.Response(400, text="bad recipients")
+        return httpx.Response(200, json={"id": f"notification-{len(self.requests)}", "recipients": len(ids)})
+
+
+@pytest.fixture
+async def dispatcher_for():
+    dispatchers = []
+
+    async def build(server: StubOneSignal, **kwargs):
+        dispatcher = NotificationDispatcher(api_key="test", backoff_base=0, **kwargs)
+        dispatcher.client = httpx.AsyncClient(transport=httpx.MockTransport(server))
+        await dispatcher.start()
+        dispatchers.append(dispatcher)
+        return dispatcher
+
+    yield build
+    for dispatcher in dispatchers:
+        await dispatcher.stop()
+
+
+async def test_same_content_is_merged_and_chunked(dispatcher_for):
+    server = StubOneSignal()
+    dispatcher = await dispatcher_for(server, max_external_ids=2)
+
+    first = dispatcher.enqueue("Ride", "Your driver is here", external_ids=["a", "b"])
+    second = dispatcher.enqueue("Ride", "Your driver is here", external_ids=["b", "c"])
+    other = dispatcher.enqueue("Promo", "10% off", external_ids=["a"])
+
+    first, second, other = await asyncio.gather(first, second, other)
+
+    sent = sorted(tuple(payload["include_external_user_ids"]) for payload in server.requests)
+    assert sent == [("a",), ("a", "b"), ("c",)]
+    # Each caller gets the response for the chunk holding its recipients
+    assert first["recipients"] == 2
+    assert second["recipients"] == 1
+    assert other["recipients"] == 1
+
+
+async def test_failed_chunk_only_fails_its_callers(dispatcher_for):
+    server = StubOneSignal(fail_ids={"c"})
+    dispatcher = await dispatcher_for(server, max_external_ids=2)
+
+    ok = dispatcher.enqueue("Ride", "Arriving", external_ids=["a", "b"])
+    failed = dispatcher.enqueue("Ride", "Arriving", external_ids=["c"])
+
+    assert (await ok)["recipients"] == 2
+    with pytest.raises(HTTPException) as error:
+        await failed
+    assert error.value.status_code == 400
+
+
+async def test_retries_server_errors(dispatcher_for):
+    server = StubOneSignal(fail_first=2)
+    dispatcher = await dispatcher_for(server)
+
+    response = await dispatcher.send("Ride", "Arriving", segment="Subscribed Users")
+
+    assert len(server.requests) == 3
+    assert server.requests[-1]["included_segments"] == ["Subscribed Users"]
+    assert response["id"] == "notification-3"
+
+
+async def test_enqueue_requires_a_target(dispatcher_for):
+    dispatcher = await dispatcher_for(StubOneSignal())
+
+    with pytest.raises(HTTPException) as error:
+        dispatcher.enqueue("Ride", "Arriving")
+    assert error.value.status_code == 400
@@ -0,0 +1,72 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine, text
+
+from app.utils.query_budget import QUERY_BUDGET_MODE, QueryBudgetExceeded, QueryBudgetMiddleware, install_query_budget, query_budget
+
+
+pytestmark = pytest.mark.anyio
+
+engine = create_engine("sqlite://")
+install_query_budget(engine)
+
+
+def run_queries(count: int):
+    with engine.connect() as connection:
+        for _ in range(count):
+            connection.execute(text("SELECT 1"))
+
+
+app = FastAPI()
+app.add_middleware(QueryBudgetMiddleware, default_budget=2)
+
+
+@app.get("/declared/{count}")
+@query_budget(2)
+async def declared(count: int):
+    run_queries(count)
+    return {"queries": count}
+
+
+@app.get("/undeclared/{count}")
+async def undeclared(count: int):
+    run_queries(count)
+    return {"queries": count}
+
+
+@pytest.fixture
+async def client():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+def test_tests_run_in_raise_mode():
+    assert QUERY_BUDGET_MODE == "raise"
+
+
+@pytest.mark.parametrize("path", ["/declared/2", "/undeclared/2"])
+async def test_endpoint_within_budget(client, path):
+    response = await client.get(path)
+    assert response.status_code == 200
+
+
+async def test_endpoint_over_its_own_budget_fails(client):
+    with pytest.raises(QueryBudgetExceeded) as error:
+        await client.get("/declared/3")
+    assert "3 statements, budget 2" in str(error.value)
+
+
+async def test_endpoint_over_the_default_budget_fails(client):
+    with pytest.raises(QueryBudgetExceeded) as error:
+        await client.get("/undeclared/3")
+    assert "GET /undeclared/{count}" in str(error.value)
+
+
+def test_nested_blocks_count_against_every_budget():
+    with pytest.raises(QueryBudgetExceeded) as error:
+        with query_budget(2, "outer"):
+            with query_budget(1, "inner"):
+                run_queries(1)
+            run_queries(2)
+    assert "outer: 3 statements" in str(error.value)
@@ -0,0 +1,82 @@
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.utils import sendchamp_gateway as gateway_module
+from app.utils.otp_delivery import deliver_otp_sms
+from app.utils.sendchamp_errors import Error
+from app.utils.sendchamp_gateway import FakeSendchampGateway, SendchampGateway, set_sendchamp_gateway
+from app.utils.sendchampservices import Sendchamp
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def install_gateway():
+    original = gateway_module.sendchamp_gateway
+
+    def install(gateway: SendchampGateway) -> SendchampGateway:
+        set_sendchamp_gateway(gateway)
+        return gateway
+
+    yield install
+    set_sendchamp_gateway(original)
+
+
+async def test_otp_sms_goes_through_the_gateway(install_gateway):
+    gateway = install_gateway(FakeSendchampGateway())
+
+    await deliver_otp_sms("+2348012345678", "4821")
+
+    assert len(gateway.sent_sms) == 1
+    assert gateway.sent_sms[0]["to"] == ["+2348012345678"]
+    assert "4821" in gateway.sent_sms[0]["message"]
+
+
+async def test_otp_sms_failure_is_a_400(install_gateway):
+    install_gateway(FakeSendchampGateway(fail_with=Error(code=401, message="Invalid key", status="error")))
+
+    with pytest.raises(HTTPException) as error:
+        await deliver_otp_sms("+2348012345678", "4821")
+    assert error.value.status_code == 400
+
+
+async def test_bulk_sms_is_split_into_chunks():
+    gateway = FakeSendchampGateway(recipients_per_request=2)
+
+    data, errors = await gateway.send_sms(["1", "2", "3", "4", "5"], "Hello")
+
+    assert errors == []
+    assert len(data) == 3
+    assert [payload["to"] for payload in gateway.sent_sms] == [["1", "2"], ["3", "4"], ["5"]]
+
+
+async def test_email_wrapper_uses_the_gateway(install_gateway):
+    gateway = install_gateway(FakeSendchampGateway())
+
+    data, error = await Sendchamp().email.send_email({
+        "to": [{"email": "rider@example.com", "name": "Rider"}],
+        "from": {"email": "support@delevia.com"},
+        "message_body": {"type": "html", "value": "<p>Hi</p>"},
+        "subject": "Welcome",
+    })
+
+    assert error is None
+    assert gateway.sent_emails[0]["subject"] == "Welcome"
+    assert gateway.sent_emails[0]["from"] == {"email": "support@delevia.com", "name": "Delevia"}
+
+
+async def test_rejected_request_becomes_an_error():
+    def sendchamp(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(422, json={"message": "Invalid phone number", "status": "error"})
+
+    gateway = SendchampGateway(public_key="test")
+    gateway.client = httpx.AsyncClient(transport=httpx.MockTransport(sendchamp))
+    try:
+        data, errors = await gateway.send_sms(["not-a-number"], "Hello")
+    finally:
+        await gateway.stop()
+
+    assert data == []
+    assert [(error.code, error.message) for error in errors] == [(422, "Invalid phone number")]